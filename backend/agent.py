@@ -1,41 +1,161 @@
 
 
-import base64, io, os, re
+import startup
+import asyncio, contextvars, copy, functools, hashlib, io, os, threading, time
 from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from typing import NamedTuple, Optional
 import pandas as pd
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
-import seaborn as sns
 from dotenv import load_dotenv
 
-from langchain_huggingface import HuggingFaceEndpoint
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+import bitmap_index
+import dataset_loader
+import metrics
+import tracing
+from answer_cache import AnswerCache, normalize_question
+from chart_cache import ChartCache
+from chart_specs import bar_spec, box_spec, histogram_spec
+from dataset_registry import DatasetRegistry
+from dataset_watcher import DatasetWatcher, detect_change, source_info
+from intent_matcher import Classification, FuzzyRouter, IntentMatcher
+from llm_guard import LLMGuard
+from plot_store import PlotStore
+from query_plan import QueryPlanner
+import query_plan
+from render_pool import RenderPool
+from stats import StatsSnapshot
+import streaming
+
+_import_started = startup.PROCESS_START
 
 load_dotenv()
 
 CSV_PATH = os.path.join(os.path.dirname(__file__), "titanic.csv")
-df = pd.read_csv(CSV_PATH)
-df.columns = [c.strip().lower() for c in df.columns]
+DATASET_PATH = os.getenv("DATASET_PATH") or CSV_PATH
+DEFAULT_DATASET = "titanic"
+# "memory" loads the whole table; "stream" aggregates it in chunks and keeps no rows.
+DATASET_MODE = os.getenv("DATASET_MODE", "memory")
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", str(streaming.DEFAULT_CHUNK_ROWS)))
+DATASET_MEMORY_BUDGET_MB = float(os.getenv("DATASET_MEMORY_BUDGET_MB", "1024"))
+CHART_CACHE_SIZE = int(os.getenv("CHART_CACHE_SIZE", "64"))
+CHART_CACHE_DIR = os.getenv("CHART_CACHE_DIR") or None
+# Seconds between checks of loaded dataset files for changes; 0 turns hot reload off.
+DATASET_WATCH_INTERVAL = float(os.getenv("DATASET_WATCH_INTERVAL", "2"))
+# Columns with at most this many distinct values get bitmap indexes at load time; 0 turns them off.
+BITMAP_INDEX_MAX_VALUES = int(os.getenv("BITMAP_INDEX_MAX_VALUES", str(bitmap_index.DEFAULT_MAX_VALUES)))
+
+
+class Dataset(NamedTuple):
+    df: Optional[pd.DataFrame]  # None in stream mode
+    version: str
+    stats: StatsSnapshot
+    name: str = DEFAULT_DATASET
+    charts: ChartCache = None
+    source: dict = None  # dataset_watcher.source_info of the file it came from
+    aggregator: streaming.Aggregator = None  # stream mode only
+    index: bitmap_index.BitmapIndex = None  # memory mode only
+
+
+_active_dataset = contextvars.ContextVar("active_dataset", default=None)
+
+
+def _dataset_bytes(ds: Dataset) -> int:
+    if ds.df is None:
+        return 0
+    return int(ds.df.memory_usage(deep=True).sum()) + (ds.index.nbytes if ds.index is not None else 0)
+
+
+def _make_dataset(name: str, frame: Optional[pd.DataFrame], version: str, stats: StatsSnapshot = None,
+                  source: dict = None, aggregator: streaming.Aggregator = None) -> Dataset:
+    """Bundle a dataset with its stats snapshot and its own chart cache.
+
+    Pass ``stats`` (and no frame) for a dataset that was only ever aggregated.
+    """
+    if frame is not None:
+        frame.columns = [c.strip().lower() for c in frame.columns]
+    charts = ChartCache(
+        max_entries=CHART_CACHE_SIZE,
+        disk_dir=os.path.join(CHART_CACHE_DIR, name) if CHART_CACHE_DIR else None,
+    )
+    stats = stats if stats is not None else StatsSnapshot.from_frame(frame)
+    index = bitmap_index.build(frame, BITMAP_INDEX_MAX_VALUES)
+    return Dataset(frame, version, stats, name, charts, source, aggregator, index)
+
+
+def _read_dataset(name: str, path: str) -> Dataset:
+    """Registry loader for the dataset stored at ``path``."""
+    stamp = dataset_loader._source_stamp(path)
+    if DATASET_MODE == "stream":
+        agg = streaming.aggregate_file(path, STREAM_CHUNK_ROWS)
+        frame, version, stats = None, f"stream-{stamp['size']:x}-{stamp['mtime_ns']:x}", StatsSnapshot.from_aggregator(agg)
+    else:
+        agg, stats = None, None
+        frame, version = dataset_loader.load_versioned(path)
+    source = source_info(path)
+    if (source["size"], source["mtime_ns"]) != (stamp["size"], stamp["mtime_ns"]):
+        source["tail"] = None  # the file changed while loading: the next check reloads it in full
+    return _make_dataset(name, frame, version, stats, source, agg)
+
+
+datasets = DatasetRegistry(_read_dataset, _dataset_bytes, DATASET_MEMORY_BUDGET_MB * (1 << 20))
+datasets.register(DEFAULT_DATASET, DATASET_PATH)
+# Extra datasets as "name=path,name=path"; requests pick one by name.
+for _entry in filter(None, os.getenv("DATASETS", "").split(",")):
+    _name, _, _path = _entry.partition("=")
+    datasets.register(_name.strip(), _path.strip())
+
+
+def ensure_dataset(name: str = None) -> Dataset:
+    """The dataset called ``name`` (default: titanic), loaded on first use.
+
+    Raises KeyError for a name that was never registered.
+    """
+    name = name or DEFAULT_DATASET
+    if name == DEFAULT_DATASET and "dataset_load" not in startup.phases and datasets.peek(name) is None:
+        with startup.phase("dataset_load"):
+            return datasets.get(name)
+    return datasets.get(name)
+
+
+def current_dataset() -> Dataset:
+    """The dataset pinned for this request, or the default one."""
+    return _active_dataset.get() or ensure_dataset()
+
+PLOT_FORMAT = "png"
+PLOT_DPI = 110
+SPEC_FORMAT = "spec"
+CHART_HANDLERS = {}
+CHART_COLUMNS = {}
+render_pool = RenderPool(int(os.getenv("RENDER_WORKERS", str(min(4, os.cpu_count() or 1)))))
+plot_store = PlotStore(
+    max_entries=int(os.getenv("PLOT_STORE_SIZE", "256")),
+    disk_dir=os.getenv("PLOT_STORE_DIR") or None,
+)
 
 HF_MODEL = os.getenv("HF_MODEL", "mistralai/Mistral-7B-Instruct-v0.3")
 HF_TOKEN = os.getenv("HUGGINGFACEHUB_API_TOKEN", "")
-LLM_TIMEOUT = 15  
-try:
-    llm = HuggingFaceEndpoint(
-        repo_id=HF_MODEL,
-        huggingfacehub_api_token=HF_TOKEN,
-        temperature=0.1,
-        max_new_tokens=256,
-        timeout=LLM_TIMEOUT,
-    )
-except Exception as e:
-    print("Warning: HuggingFaceEndpoint init failed:", e)
-    llm = None
+# A dedicated inference endpoint (or perf/fake_hf_server.py) used instead of HF_MODEL when set.
+HF_ENDPOINT_URL = os.getenv("HF_ENDPOINT_URL", "")
+# Polishing waits at most LLM_TIMEOUT; once latencies are known, the guard's adaptive timeout.
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "15"))
+LLM_TIMEOUT_MIN = float(os.getenv("LLM_TIMEOUT_MIN", "1"))
+# Wall-clock seconds a request may take in total; polishing only gets what is left.
+REQUEST_BUDGET = float(os.getenv("REQUEST_BUDGET", "20"))
+MIN_POLISH_SECONDS = 0.25
+COMPUTE_WORKERS = int(os.getenv("COMPUTE_WORKERS", "4"))
+_compute_pool = ThreadPoolExecutor(max_workers=COMPUTE_WORKERS, thread_name_prefix="compute")
+_llm_pool = ThreadPoolExecutor(max_workers=COMPUTE_WORKERS, thread_name_prefix="llm")
+answer_cache = AnswerCache(
+    max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", "86400")),
+    db_path=os.getenv("ANSWER_CACHE_PATH", os.path.join(os.path.dirname(__file__), "answer_cache.sqlite3")) or None,
+)
+llm = None
+response_chain = None
+_chain_lock = threading.Lock()
+_chain_built = False
+_chain_thread = None
 
-RESPONSE_PROMPT = PromptTemplate.from_template(
-    """You are a friendly Titanic dataset analyst chatbot. The user asked a question
+RESPONSE_PROMPT_TEMPLATE = """You are a friendly Titanic dataset analyst chatbot. The user asked a question
 and you have already computed the answer. Restate the result clearly and concisely
 in 1-3 sentences. Do not add information you are not given.
 
@@ -46,172 +166,345 @@ User question: {question}
 Computed result: {result}
 
 Your response:"""
+
+
+def build_response_chain():
+    """Import langchain and build ``llm`` and ``response_chain`` once.
+
+    Deferred until first use or a background warm-up, because importing
+    langchain dominates cold-start time. Safe to call from any thread.
+    """
+    global llm, response_chain, _chain_built
+    with _chain_lock:
+        if _chain_built:
+            return response_chain
+        with startup.phase("llm_chain"):
+            try:
+                from langchain_huggingface import HuggingFaceEndpoint
+                from langchain_core.prompts import PromptTemplate
+                from langchain_core.output_parsers import StrOutputParser
+            except Exception as e:
+                print("Warning: langchain import failed:", e)
+                _chain_built = True
+                return None
+            try:
+                target = {"endpoint_url": HF_ENDPOINT_URL} if HF_ENDPOINT_URL else {"repo_id": HF_MODEL}
+                llm = HuggingFaceEndpoint(
+                    **target,
+                    huggingfacehub_api_token=HF_TOKEN,
+                    temperature=0.1,
+                    max_new_tokens=256,
+                    timeout=LLM_TIMEOUT,
+                )
+            except Exception as e:
+                print("Warning: HuggingFaceEndpoint init failed:", e)
+                llm = None
+            if llm is not None:
+                try:
+                    response_chain = PromptTemplate.from_template(RESPONSE_PROMPT_TEMPLATE) | llm | StrOutputParser()
+                except Exception as e:
+                    print("Warning: response_chain construction failed:", e)
+                    response_chain = None
+        _chain_built = True
+    return response_chain
+
+
+def _probe_llm(timeout: float):
+    chain = response_chain
+    if chain is None:
+        raise RuntimeError("response_chain not available")
+    future = _llm_pool.submit(chain.invoke, {"question": "How many passengers were aboard?",
+                                             "result": "891 passengers were aboard."})
+    try:
+        future.result(timeout=timeout)
+    except FuturesTimeout:
+        future.cancel()
+        raise
+
+
+llm_guard = LLMGuard(
+    _probe_llm,
+    max_timeout=LLM_TIMEOUT,
+    min_timeout=LLM_TIMEOUT_MIN,
+    failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+    cooldown=float(os.getenv("LLM_BREAKER_COOLDOWN", "30")),
 )
 
-response_chain = None
-if llm is not None:
+
+def _chart(*columns):
+    """Register a handler returning (text, chart spec) and serve it through the dataset's chart cache.
+
+    ``columns`` are the dataset columns the chart and its text are computed
+    from. The wrapper returns (text, spec) for ``fmt="spec"`` and (text, image
+    bytes) otherwise. Both are cached per dataset version, so each chart is
+    built once and drawn once per format and dpi.
+    """
+    def register(handler):
+        @functools.wraps(handler)
+        def wrapper(fmt=PLOT_FORMAT, dpi=PLOT_DPI):
+            ds = current_dataset()
+            if fmt == SPEC_FORMAT:
+                return ds.charts.get_or_render((handler.__name__, ds.version, SPEC_FORMAT),
+                                               lambda: _timed_stage("compute", handler))
+            text, spec = wrapper(SPEC_FORMAT)
+            return ds.charts.get_or_render(
+                (handler.__name__, ds.version, fmt, dpi), lambda: (text, render_pool.render(spec, fmt, dpi))
+            )
+        CHART_HANDLERS[handler.__name__] = wrapper
+        CHART_COLUMNS[handler.__name__] = frozenset(columns)
+        return wrapper
+    return register
+
+
+def _publish_plot(handler_name: str, content: bytes) -> str:
+    ds = current_dataset()
+    with tracing.span("publish"):
+        digest = plot_store.put(handler_name, ds.version, PLOT_FORMAT, PLOT_DPI, content, dataset=ds.name)
+    return f"/plots/{digest}"
+
+
+def render_plot(digest: str, fmt: str = None, dpi: int = None):
+    """Bytes of a published plot in ``fmt`` at ``dpi``; None if it is unknown or stale.
+
+    The stored rendering is returned as is; other variants are rendered by
+    the same chart handler, provided the dataset has not changed since.
+    """
+    stored = plot_store.get(digest)
+    if stored is None:
+        return None
+    fmt, dpi = fmt or stored.fmt, dpi or stored.dpi
+    if (fmt, dpi) == (stored.fmt, stored.dpi):
+        return stored.content
+    handler = CHART_HANDLERS.get(stored.handler)
+    name = stored.dataset or DEFAULT_DATASET
+    ds = datasets.get(name) if name in datasets else None
+    if handler is None or ds is None or ds.version != stored.version:
+        return None
+    token = _active_dataset.set(ds)
     try:
-        response_chain = RESPONSE_PROMPT | llm | StrOutputParser()
-    except Exception as e:
-        print("Warning: response_chain construction failed:", e)
-        response_chain = None
+        return handler(fmt=fmt, dpi=dpi)[1]
+    finally:
+        _active_dataset.reset(token)
+
+
+async def arender_plot(digest: str, fmt: str = None, dpi: int = None):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_compute_pool, render_plot, digest, fmt, dpi)
+
+
+def warm_chart_cache(fmt=PLOT_FORMAT, dpi=PLOT_DPI, dataset: str = None):
+    """Render every chart handler once, in parallel, so the first chart questions are cache hits."""
+    ds = ensure_dataset(dataset)
+
+    def warm(handler):
+        token = _active_dataset.set(ds)
+        try:
+            handler(fmt=fmt, dpi=dpi)
+        except Exception as e:
+            print(f"Chart warm-up for {handler.__name__} failed:", e)
+        finally:
+            _active_dataset.reset(token)
+
+    list(_compute_pool.map(warm, CHART_HANDLERS.values()))
+
+
+def _changed_columns(old: Dataset, new: Dataset):
+    """Columns whose values differ between two versions; None when unknown (no rows kept)."""
+    if old.df is None or new.df is None or len(old.df) != len(new.df):
+        return None
+    changed = set(old.df.columns) ^ set(new.df.columns)
+    for col in set(old.df.columns) & set(new.df.columns):
+        before = pd.util.hash_pandas_object(old.df[col], index=False).to_numpy()
+        after = pd.util.hash_pandas_object(new.df[col], index=False).to_numpy()
+        if not (before == after).all():
+            changed.add(col)
+    return changed
+
+
+def _carry_charts(old: Dataset, new: Dataset, changed) -> int:
+    """Re-key cached charts that read none of the ``changed`` columns to the new version."""
+    if changed is None:
+        return 0
+    carried = 0
+    for key, value in old.charts.items():
+        handler, version, *variant = key
+        if version == old.version and not CHART_COLUMNS.get(handler, changed) & changed:
+            new.charts.put((handler, new.version, *variant), value)
+            carried += 1
+    return carried
+
+
+def _csv_columns(path):
+    return [c.strip().lower() for c in pd.read_csv(path, nrows=0).columns]
+
+
+def _appended(old: Dataset, data: bytes, source: dict):
+    """``old`` with the CSV rows in ``data`` added; None if they cannot be applied incrementally."""
+    rows = pd.read_csv(io.BytesIO(data), header=None, names=_csv_columns(source["path"]))
+    version = hashlib.sha256(old.version.encode() + data).hexdigest()[:16]
+    if old.aggregator is not None:
+        for col, (lo, hi) in old.aggregator.ranges.items():
+            values = rows[col].dropna()
+            if len(values) and (values.min() < lo or values.max() > hi):
+                return None  # outside the fine-histogram range: re-aggregate from scratch
+        agg = copy.deepcopy(old.aggregator).update(rows)
+        return _make_dataset(old.name, None, version, StatsSnapshot.from_aggregator(agg), source, agg)
+    rows = dataset_loader.to_typed(rows)
+    frame = dataset_loader.to_typed(pd.concat([old.df, rows], ignore_index=True))
+    return _make_dataset(old.name, frame, version, old.stats.extend(rows, frame), source)
+
+
+def refresh_dataset(name: str):
+    """Pick up changes to a loaded dataset's file; returns "append", "reload" or None.
+
+    Appended rows are folded into the running aggregates. Any other change
+    reloads the file, and cached charts built only from unchanged columns
+    carry over. Answers need no invalidation: the answer cache is keyed by
+    the computed result, so an answer is reused exactly when its result did
+    not change. The new version is swapped in with one registry update;
+    requests already running finish on the version they pinned.
+    """
+    old = datasets.peek(name)
+    if old is None or old.source is None:
+        return None
+    change = detect_change(old.source)
+    if change is None:
+        return None
+    kind, data, source = change
+    new = _appended(old, data, source) if kind == "append" else None
+    if new is None:
+        kind, new = "reload", _read_dataset(name, old.source["path"])
+    carried = _carry_charts(old, new, _changed_columns(old, new) if kind == "reload" else None)
+    datasets.put(name, new)
+    print(f"Dataset '{name}': {kind} {old.version} -> {new.version} "
+          f"({new.stats.total} rows, {carried} cached chart(s) kept).")
+    return kind
 
 
-def _fig_to_base64(fig) -> str:
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png", dpi=110, bbox_inches="tight",
-                facecolor="#f8f9fa", edgecolor="none")
-    plt.close(fig)
-    buf.seek(0)
-    return base64.b64encode(buf.read()).decode()
+def refresh_datasets():
+    for name in datasets.names():
+        refresh_dataset(name)
 
 
-def _styled_fig(figsize=(9, 5)):
-    sns.set_theme(style="whitegrid", palette="muted")
-    return plt.subplots(figsize=figsize)
+watcher = DatasetWatcher(refresh_datasets, DATASET_WATCH_INTERVAL)
 
 
 def _male_percentage():
-    pct = df["sex"].value_counts(normalize=True)["male"] * 100
+    pct = current_dataset().stats.share("sex", "male") * 100
     return f"{pct:.2f}% of passengers were male.", None
 
 def _female_percentage():
-    pct = df["sex"].value_counts(normalize=True)["female"] * 100
+    pct = current_dataset().stats.share("sex", "female") * 100
     return f"{pct:.2f}% of passengers were female.", None
 
 def _avg_fare():
-    avg = df["fare"].mean()
-    return f"The average ticket fare was £{avg:.2f}. Median fare was £{df['fare'].median():.2f}.", None
+    stats = current_dataset().stats
+    avg = stats.summary("fare", "mean")
+    return f"The average ticket fare was £{avg:.2f}. Median fare was £{stats.summary('fare', 'median'):.2f}.", None
 
 def _avg_age():
-    avg = df["age"].dropna().mean()
-    return f"The average passenger age was {avg:.1f} years (median {df['age'].dropna().median():.1f}).", None
+    stats = current_dataset().stats
+    avg = stats.summary("age", "mean")
+    return f"The average passenger age was {avg:.1f} years (median {stats.summary('age', 'median'):.1f}).", None
 
 def _survival_count():
-    survived = df["survived"].sum()
-    total = len(df)
+    stats = current_dataset().stats
+    survived = stats.count("survived", 1)
+    total = stats.total
     rate = survived / total * 100
     return f"{survived} out of {total} passengers survived ({rate:.1f}% survival rate).", None
 
 def _total_passengers():
-    return f"There were {len(df)} total passengers on the Titanic.", None
+    return f"There were {current_dataset().stats.total} total passengers on the Titanic.", None
 
+@_chart("age")
 def _age_histogram():
-    fig, ax = _styled_fig()
-    sns.histplot(df["age"].dropna(), bins=30, kde=True, color="#4e79a7", ax=ax)
-    ax.set_title("Distribution of Passenger Ages", fontsize=14, fontweight="bold")
-    ax.set_xlabel("Age")
-    ax.set_ylabel("Count")
-    plt.tight_layout()
-    avg = df["age"].dropna().mean()
+    ds = current_dataset()
+    spec = histogram_spec("Distribution of Passenger Ages", "Age", "Count",
+                          *ds.stats.histogram("age"), "#4e79a7")
+    avg = ds.stats.summary("age", "mean")
     text = (f"Here's the age distribution. Average age: {avg:.1f} years, "
-            f"youngest: {df['age'].min():.1f}, oldest: {df['age'].max():.1f}.")
-    return text, _fig_to_base64(fig)
+            f"youngest: {ds.stats.summary('age', 'min'):.1f}, oldest: {ds.stats.summary('age', 'max'):.1f}.")
+    return text, spec
 
+@_chart("fare")
 def _fare_histogram():
-    fig, ax = _styled_fig()
-    sns.histplot(df["fare"].dropna(), bins=40, kde=True, color="#e15759", ax=ax)
-    ax.set_title("Distribution of Ticket Fares", fontsize=14, fontweight="bold")
-    ax.set_xlabel("Fare (£)")
-    ax.set_ylabel("Count")
-    plt.tight_layout()
-    return (f"Here's the fare distribution. Average fare: £{df['fare'].mean():.2f}, "
-            f"max: £{df['fare'].max():.2f}."), _fig_to_base64(fig)
+    ds = current_dataset()
+    spec = histogram_spec("Distribution of Ticket Fares", "Fare (£)", "Count",
+                          *ds.stats.histogram("fare"), "#e15759")
+    return (f"Here's the fare distribution. Average fare: £{ds.stats.summary('fare', 'mean'):.2f}, "
+            f"max: £{ds.stats.summary('fare', 'max'):.2f}."), spec
 
+@_chart("embark_town")
 def _embark_chart():
-    fig, ax = _styled_fig()
-    counts = df["embark_town"].value_counts()
-    colors = ["#4e79a7", "#f28e2b", "#e15759"]
-    counts.plot(kind="bar", ax=ax, color=colors)
-    ax.set_title("Passengers by Embarkation Port", fontsize=14, fontweight="bold")
-    ax.set_xlabel("Port")
-    ax.set_ylabel("Number of Passengers")
-    ax.set_xticklabels(ax.get_xticklabels(), rotation=0)
-    plt.tight_layout()
+    counts = current_dataset().stats.value_counts("embark_town")
+    spec = bar_spec("Passengers by Embarkation Port", "Port", "Number of Passengers", counts)
     lines = ["Passengers by embarkation port:"]
     for port, count in counts.items():
         lines.append(f"  • {port}: {count}")
-    return "\n".join(lines), _fig_to_base64(fig)
+    return "\n".join(lines), spec
 
+@_chart("class")
 def _class_chart():
-    fig, ax = _styled_fig()
-    counts = df["class"].value_counts()
-    colors = ["#4e79a7", "#f28e2b", "#e15759"]
-    counts.plot(kind="bar", ax=ax, color=colors)
-    ax.set_title("Passengers by Class", fontsize=14, fontweight="bold")
-    ax.set_xlabel("Class")
-    ax.set_ylabel("Count")
-    ax.set_xticklabels(ax.get_xticklabels(), rotation=0)
-    plt.tight_layout()
+    counts = current_dataset().stats.value_counts("class")
+    spec = bar_spec("Passengers by Class", "Class", "Count", counts)
     lines = ["Passengers by class:"]
     for cls, count in counts.items():
         lines.append(f"  • {cls}: {count}")
-    return "\n".join(lines), _fig_to_base64(fig)
+    return "\n".join(lines), spec
 
+@_chart("sex", "survived")
 def _survival_by_gender():
-    fig, ax = _styled_fig()
-    rates = df.groupby("sex")["survived"].mean() * 100
-    colors = ["#4e79a7", "#e15759"]
-    rates.plot(kind="bar", ax=ax, color=colors)
-    ax.set_title("Survival Rate by Gender", fontsize=14, fontweight="bold")
-    ax.set_xlabel("Gender")
-    ax.set_ylabel("Survival Rate (%)")
-    ax.set_xticklabels(ax.get_xticklabels(), rotation=0)
-    plt.tight_layout()
+    rates = current_dataset().stats.group("sex", "survived") * 100
+    spec = bar_spec("Survival Rate by Gender", "Gender", "Survival Rate (%)", rates,
+                    colors=["#4e79a7", "#e15759"])
     lines = ["Survival rate by gender:"]
     for gender, rate in rates.items():
         lines.append(f"  • {gender}: {rate:.1f}%")
-    return "\n".join(lines), _fig_to_base64(fig)
+    return "\n".join(lines), spec
 
+@_chart("class", "survived")
 def _survival_by_class():
-    fig, ax = _styled_fig()
-    rates = df.groupby("class")["survived"].mean() * 100
-    colors = ["#4e79a7", "#f28e2b", "#e15759"]
-    rates.plot(kind="bar", ax=ax, color=colors)
-    ax.set_title("Survival Rate by Class", fontsize=14, fontweight="bold")
-    ax.set_xlabel("Class")
-    ax.set_ylabel("Survival Rate (%)")
-    ax.set_xticklabels(ax.get_xticklabels(), rotation=0)
-    plt.tight_layout()
+    rates = current_dataset().stats.group("class", "survived") * 100
+    spec = bar_spec("Survival Rate by Class", "Class", "Survival Rate (%)", rates)
     lines = ["Survival rate by class:"]
     for cls, rate in rates.items():
         lines.append(f"  • {cls}: {rate:.1f}%")
-    return "\n".join(lines), _fig_to_base64(fig)
+    return "\n".join(lines), spec
 
+@_chart("class", "age")
 def _age_by_class():
-    fig, ax = _styled_fig()
-    sns.boxplot(data=df, x="class", y="age", palette="muted", ax=ax)
-    ax.set_title("Age Distribution by Class", fontsize=14, fontweight="bold")
-    plt.tight_layout()
-    means = df.groupby("class")["age"].mean()
+    ds = current_dataset()
+    spec = box_spec("Age Distribution by Class", "class", "age", ds.stats.box("class", "age"))
+    means = ds.stats.group("class", "age")
     lines = ["Average age by class:"]
     for cls, avg in means.items():
         lines.append(f"  • {cls}: {avg:.1f} years")
-    return "\n".join(lines), _fig_to_base64(fig)
+    return "\n".join(lines), spec
 
+@_chart("class", "fare")
 def _fare_by_class():
-    fig, ax = _styled_fig()
-    sns.boxplot(data=df, x="class", y="fare", palette="muted", ax=ax)
-    ax.set_title("Fare Distribution by Class", fontsize=14, fontweight="bold")
-    plt.tight_layout()
-    means = df.groupby("class")["fare"].mean()
+    ds = current_dataset()
+    spec = box_spec("Fare Distribution by Class", "class", "fare", ds.stats.box("class", "fare"))
+    means = ds.stats.group("class", "fare")
     lines = ["Average fare by class:"]
     for cls, avg in means.items():
         lines.append(f"  • {cls}: £{avg:.2f}")
-    return "\n".join(lines), _fig_to_base64(fig)
+    return "\n".join(lines), spec
 
 def _general_stats():
     """Fallback: provide a general dataset overview."""
-    survived = df["survived"].sum()
-    total = len(df)
+    stats = current_dataset().stats
+    survived = stats.count("survived", 1)
+    total = stats.total
     text = (
         f"Titanic Dataset Overview ({total} passengers):\n"
         f"  • Survived: {survived} ({survived/total*100:.1f}%)\n"
-        f"  • Male: {(df['sex']=='male').sum()}, Female: {(df['sex']=='female').sum()}\n"
-        f"  • Average age: {df['age'].dropna().mean():.1f} years\n"
-        f"  • Average fare: £{df['fare'].mean():.2f}\n"
-        f"  • Embarked from: {', '.join(f'{k} ({v})' for k, v in df['embark_town'].value_counts().items())}\n"
-        f"  • Classes: {', '.join(f'{k} ({v})' for k, v in df['class'].value_counts().items())}"
+        f"  • Male: {stats.count('sex', 'male')}, Female: {stats.count('sex', 'female')}\n"
+        f"  • Average age: {stats.summary('age', 'mean'):.1f} years\n"
+        f"  • Average fare: £{stats.summary('fare', 'mean'):.2f}\n"
+        f"  • Embarked from: {', '.join(f'{k} ({v})' for k, v in stats.value_counts('embark_town').items())}\n"
+        f"  • Classes: {', '.join(f'{k} ({v})' for k, v in stats.value_counts('class').items())}"
     )
     return text, None
 
@@ -234,55 +527,206 @@ INTENT_MAP = [
     (["total", "passenger"], [], _total_passengers),
 ]
 
+# Example phrasings per handler for the fuzzy router, which catches typos and
+# wordings the keyword rules above miss.
+INTENT_EXAMPLES = {
+    _age_histogram: ["histogram of passenger ages", "age distribution", "show ages", "how old were the passengers",
+                     "plot passenger age", "spread of ages on board"],
+    _fare_histogram: ["fare distribution", "histogram of ticket prices", "what did tickets cost",
+                      "plot fares", "spread of ticket prices"],
+    _embark_chart: ["passengers per embarkation port", "where did passengers board", "boarding town counts",
+                    "how many boarded at southampton cherbourg queenstown"],
+    _class_chart: ["passengers in each class", "how many passengers per class", "count by ticket class",
+                   "number of first second third class passengers", "cabin tier counts"],
+    _survival_by_gender: ["survival rate by gender", "did women survive more than men", "survival odds for ladies",
+                          "survival of men and women", "who survived more male or female"],
+    _survival_by_class: ["survival rate by class", "did first class passengers survive more",
+                         "survival odds per ticket class", "survival by cabin tier"],
+    _age_by_class: ["age by class", "compare passenger ages across classes", "how old were first class passengers",
+                    "ages per cabin tier"],
+    _fare_by_class: ["fare by class", "ticket prices by class", "ticket prices by cabin tier",
+                     "how much did first class tickets cost", "compare fares across classes"],
+    _male_percentage: ["percentage of male passengers", "share of men on board", "what fraction were men"],
+    _female_percentage: ["percentage of female passengers", "share of women on board", "what fraction were women"],
+    _avg_fare: ["average fare", "mean ticket price", "typical ticket cost", "how much was a ticket"],
+    _avg_age: ["average age", "mean passenger age", "typical passenger age", "how old was the average passenger"],
+    _survival_count: ["how many survived", "number of survivors", "how many people lived", "survivor count"],
+    _total_passengers: ["total passengers", "how many passengers were on board", "how many people were aboard"],
+    _general_stats: ["tell me about the dataset", "dataset overview", "summarize the data", "general statistics"],
+}
+
+
+OUT_OF_SCOPE_KEYWORDS = {
+    "alien", "aliens", "ufo", "unicorn", "dog", "dogs", "cat", "cats",
+    "gdp", "weather", "stock", "stocks", "bitcoin", "president", "prime minister",
+    "population", "currency", "vacation", "concert", "score", "match",
+    "netflix", "movie", "who won", "who is", "married", "marriage", "birth", "death (year)",
+    "mars", "moon", "dinosaurs", "planet", "spacecraft", "covid", "pandemic"
+}
+# Questions built on a false premise get a dedicated answer rather than the generic refusal.
+ASSUMPTION_KEYWORDS = ("alien", "aliens", "ufo", "unicorn", "dinosaurs")
+
+FUZZY_THRESHOLD = float(os.getenv("FUZZY_THRESHOLD", "0.5"))
+_router = FuzzyRouter(
+    [(handler, text) for handler, texts in INTENT_EXAMPLES.items() for text in texts], threshold=FUZZY_THRESHOLD
+)
+_matcher = IntentMatcher(INTENT_MAP, OUT_OF_SCOPE_KEYWORDS, ASSUMPTION_KEYWORDS, router=_router)
+
+# Filter/group-by/aggregate questions no single handler answers go to the query planner, which caches
+# parsed templates by question shape. It takes over an intent a keyword rule matched only when the question
+# filters or groups, so "survival rate" still gets the gender chart. A plan a handler answers goes to that handler.
+_planner = QueryPlanner(int(os.getenv("PLAN_CACHE_SIZE", "256")))
+PLAN_HANDLERS = {
+    _planner.plan(question): handler for handler, question in (
+        (_avg_fare, "average fare"), (_avg_age, "average age"), (_survival_count, "how many survived"),
+        (_total_passengers, "how many passengers"), (_male_percentage, "percentage of male passengers"),
+        (_female_percentage, "percentage of female passengers"), (_class_chart, "number of passengers by class"),
+        (_embark_chart, "number of passengers by port"), (_survival_by_gender, "survival rate by gender"),
+        (_survival_by_class, "survival rate by class"), (_age_by_class, "average age by class"),
+        (_fare_by_class, "average fare by class"),
+    )
+}
+
+
+def _out_of_scope_text(term: str) -> str:
+    return (
+        f"Sorry — that question appears unrelated to the Titanic passenger dataset (found term '{term}'). "
+        "I can answer data questions about passengers (columns like age, sex, survived, pclass, fare, embarked, class, etc.). "
+        "Try: 'What percentage of passengers were male?' or 'Show me a histogram of passenger ages'."
+    )
 
-def _detect_and_run(question: str):
-    q = question.lower()
 
-    OUT_OF_SCOPE_KEYWORDS = {
-        "alien", "aliens", "ufo", "unicorn", "dog", "dogs", "cat", "cats",
-        "gdp", "weather", "stock", "stocks", "bitcoin", "president", "prime minister",
-        "population", "currency", "vacation", "concert", "score", "match",
-        "netflix", "movie", "who won", "who is", "married", "marriage", "birth", "death (year)",
-        "mars", "moon", "dinosaurs", "planet", "spacecraft", "covid", "pandemic"
+def _response(answer: str, plot=None, mode: str = "image") -> dict:
+    """``plot`` is a /plots URL in "image" mode and a chart spec in "spec" mode."""
+    return {
+        "answer": answer,
+        "plot_url": plot if mode == "image" else None,
+        "chart": plot if mode == "spec" else None,
     }
-    for term in OUT_OF_SCOPE_KEYWORDS:
-        if term in q:
-            return (
-                f"Sorry — that question appears unrelated to the Titanic passenger dataset (found term '{term}'). "
-                "I can answer data questions about passengers (columns like age, sex, survived, pclass, fare, embarked, class, etc.). "
-                "Try: 'What percentage of passengers were male?' or 'Show me a histogram of passenger ages'.",
-                None,
-            )
 
-    for kw_all, kw_any, handler in INTENT_MAP:
+
+# Part of every answer ETag; bump it after changing handlers or prompts so clients drop their cached answers.
+ANSWER_REVISION = os.getenv("ANSWER_REVISION", "1")
+
+
+def answer_etag(question: str, mode: str = "image", dataset: str = None) -> str:
+    """A weak ETag for the answer to ``question``, known before any compute.
+
+    It covers the normalized question, the dataset version, the response
+    mode and ANSWER_REVISION. It is weak because the polished wording may
+    differ between runs that mean the same thing.
+    """
+    version = ensure_dataset(dataset).version
+    key = "\0".join((normalize_question(question or ""), dataset or DEFAULT_DATASET, version, mode, ANSWER_REVISION))
+    return f'W/"{hashlib.sha256(key.encode()).hexdigest()[:32]}"'
+
+
+def _rejection(match: Classification):
+    """The final response for questions refused before any compute or LLM work."""
+    if match.kind == "assumption":
+        return _response("That question appears to assume facts outside this dataset (e.g., 'aliens'). I can only answer questions about the Titanic passenger dataset. Try asking about age, fare, sex, survival, class, or embarkation.")
+    if match.kind == "out_of_scope":
+        return _response(_out_of_scope_text(match.term))
+    return None
+
+
+def _unknown_dataset(name):
+    if name is None or name in datasets:
+        return None
+    return _response(f"Unknown dataset '{name}'. Available datasets: {', '.join(datasets.names())}.")
+
+
+def _timed_stage(stage, fn):
+    with metrics.STAGE_SECONDS.labels(stage).time(), tracing.span(stage):
+        return fn()
+
+
+def _plan_or_match(question: str) -> Classification:
+    match = _matcher.classify(question)
+    if match.kind not in ("intent", "fallback"):
+        return match
+    plan = _planner.plan(question)
+    if plan is None:
+        return match
+    if match.kind == "intent" and match.score is None and not (plan.filters or plan.group_by):
+        return match  # a keyword rule matched and the plan adds nothing it would ignore: keep its chart
+    handler = PLAN_HANDLERS.get(plan)
+    if handler is None:
+        return match._replace(kind="plan", plan=plan)
+    return match if match.handler is handler else Classification("intent", handler=handler)
+
+
+def _classify(question: str) -> Classification:
+    return _timed_stage("match", lambda: _plan_or_match(question))
+
+
+def _observe_handler(name: str, started: float):
+    elapsed = time.perf_counter() - started
+    metrics.HANDLER_SECONDS.labels(name).observe(elapsed)
+    if name not in CHART_HANDLERS:  # chart handlers time their own compute, which cache hits skip
+        metrics.STAGE_SECONDS.labels("compute").observe(elapsed)
+
+
+def _detect_and_run(question: str, match: Classification = None, mode: str = "image", dataset: str = None):
+    if match is None:
+        match = _classify(question)
+    token = _active_dataset.set(ensure_dataset(dataset))
+    try:
+        with tracing.span("_detect_and_run"):
+            return _run_match(match, mode)
+    finally:
+        _active_dataset.reset(token)
+
+
+def _run_match(match: Classification, mode: str = "image"):
+    if match.kind in ("assumption", "out_of_scope"):
+        return _out_of_scope_text(match.term), None
+
+    started = time.perf_counter()
+    if match.kind == "plan":
+        ds = current_dataset()
+        if ds.df is not None and match.plan.columns() <= set(ds.df.columns):
+            try:
+                with tracing.span("plan"):
+                    return query_plan.run(match.plan, ds.df, ds.index), None
+            except Exception as e:
+                print("Query plan failed:", e)
+                return ("Sorry — I couldn't compute the requested stat due to an internal error.", None)
+            finally:
+                _observe_handler("plan", started)
+        # Stream mode keeps no rows, and other datasets may lack the columns: answer as if unplanned.
+        match = match._replace(kind="intent" if match.handler else "fallback")
+
+    if match.kind == "intent":
+        name = match.handler.__name__
         try:
-            if all(k in q for k in kw_all):
-                if not kw_any or any(k in q for k in kw_any):
-                    try:
-                        return handler()
-                    except Exception as e:
-                        print(f"Handler {handler.__name__} raised:", e)
-                        return (f"Sorry — I couldn't compute the requested chart/stat due to an internal error.", None)
+            with tracing.span(name):
+                if mode == "spec" and name in CHART_HANDLERS:
+                    return match.handler(fmt=SPEC_FORMAT)
+                text, content = match.handler()
+                if content is None:
+                    return text, None
+                return text, _publish_plot(name, content)
         except Exception as e:
-            print("Error during intent check:", e)
+            print(f"Handler {name} raised:", e)
+            return (f"Sorry — I couldn't compute the requested chart/stat due to an internal error.", None)
+        finally:
+            _observe_handler(name, started)
 
     try:
-        return _general_stats()
+        with tracing.span("_general_stats"):
+            return _general_stats()
     except Exception as e:
         print("Error in general_stats:", e)
         return ("Sorry — cannot produce dataset overview due to an internal error.", None)
+    finally:
+        _observe_handler("_general_stats", started)
 
 
-def process_query(question: str) -> dict:
-    """Answer a natural-language question about the Titanic dataset.
-
-    Returns {"answer": str, "plot": str | None}
-    """
-    if not question or not isinstance(question, str):
-        return {"answer": "Please ask a clear question about the Titanic dataset.", "plot": None}
-
+def _compute(question: str, match: Classification = None, mode: str = "image", dataset: str = None):
+    """Run the matched handler for ``question``; always returns (str, plot URL / chart spec / None)."""
     try:
-        raw_result, plot = _detect_and_run(question)
+        raw_result, plot = _detect_and_run(question, match, mode, dataset)
     except Exception as e:
         print("Error while running intent detection:", e)
         raw_result, plot = ("Sorry — I encountered an internal error while processing your question.", None)
@@ -291,52 +735,405 @@ def process_query(question: str) -> dict:
         raw_result = "No result computed."
     else:
         raw_result = str(raw_result)
+    return raw_result, plot
 
-    answer = raw_result
+
+def _build_chain_in_background():
+    """Start ``build_response_chain`` on its own thread, once: callers include the event loop,
+    which must not wait for the langchain import."""
+    global _chain_thread
+    if _chain_thread is None:
+        _chain_thread = threading.Thread(target=build_response_chain, daemon=True, name="llm-chain")
+        _chain_thread.start()
+
+
+def _polishing_enabled() -> bool:
+    if not HF_TOKEN:
+        print("Hugging Face token not found — skipping LLM polishing.")
+        return False
+    if response_chain is None and not _chain_built:
+        _build_chain_in_background()
+        print("response_chain still building — skipping LLM polishing.")
+        return False
+    if response_chain is None:
+        print("response_chain not available — skipping LLM polishing.")
+        return False
+    return True
+
+
+def _accept_polished(question: str, polished, raw_result: str) -> str:
+    polished = polished.strip() if isinstance(polished, str) else str(polished).strip()
+    if polished and 10 < len(polished) < 2000:
+        answer_cache.put(question, raw_result, polished)
+        return polished
+    return raw_result
+
+
+def _llm_outcome(outcome: str, started: float = None, calls: int = 1):
+    """Count ``calls`` prompts under ``outcome``; the guard sees it as a single call either way."""
+    metrics.LLM_CALLS.labels(outcome).inc(calls)
+    elapsed = None
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        metrics.STAGE_SECONDS.labels("polish").observe(elapsed)
+        tracing.record(f"response_chain.invoke ({outcome})", elapsed, start=started)
+    if outcome == "ok" and elapsed is not None:
+        llm_guard.success(elapsed)
+    elif outcome in ("timeout", "error"):
+        llm_guard.failure(timed_out=outcome == "timeout")
+
+
+def _polish_timeout(deadline: float = None):
+    """Seconds polishing may wait now, or None to skip it: circuit open or request budget spent."""
+    if not llm_guard.allow():
+        _llm_outcome("circuit_open")
+        return None
+    timeout = llm_guard.timeout()
+    left = None if deadline is None else deadline - time.perf_counter()
+    if left is not None and left < timeout:
+        if left < MIN_POLISH_SECONDS:
+            _llm_outcome("over_budget")
+            return None
+        timeout = left
+    return timeout
+
+
+def _cached_answer(question: str, raw_result: str):
+    cached = answer_cache.get(question, raw_result)
+    if cached is not None:
+        _llm_outcome("cached")
+    return cached
+
+
+async def _off_loop(fn, *args):
+    """Run ``fn`` on the LLM pool: the answer cache locks and may wait on SQLite, which must not stall the loop."""
+    return await asyncio.get_running_loop().run_in_executor(_llm_pool, fn, *args)
+
+
+def _polish(question: str, raw_result: str, deadline: float = None) -> str:
+    if not _polishing_enabled():
+        return raw_result
+    cached = _cached_answer(question, raw_result)
+    if cached is not None:
+        return cached
+    timeout = _polish_timeout(deadline)
+    if timeout is None:
+        return raw_result
+    started = time.perf_counter()
+    future = _llm_pool.submit(response_chain.invoke, {"question": question, "result": raw_result})
+    try:
+        polished = future.result(timeout=timeout)
+        _llm_outcome("ok", started)
+        return _accept_polished(question, polished, raw_result)
+    except FuturesTimeout:
+        future.cancel()
+        _llm_outcome("timeout", started)
+        print("LLM polishing timed out; returning raw computed result.")
+    except Exception as e:
+        _llm_outcome("error", started)
+        print("LLM polishing failed:", e)
+    return raw_result
+
+
+async def _apolish(question: str, raw_result: str, deadline: float = None) -> str:
+    if not _polishing_enabled():
+        return raw_result
+    cached = await _off_loop(_cached_answer, question, raw_result)
+    if cached is not None:
+        return cached
+    timeout = _polish_timeout(deadline)
+    if timeout is None:
+        return raw_result
+    started = time.perf_counter()
     try:
-        if HF_TOKEN and response_chain is not None:
+        polished = await asyncio.wait_for(
+            response_chain.ainvoke({"question": question, "result": raw_result}),
+            timeout=timeout,
+        )
+        _llm_outcome("ok", started)
+        return await _off_loop(_accept_polished, question, polished, raw_result)
+    except asyncio.TimeoutError:
+        _llm_outcome("timeout", started)
+        print("LLM polishing timed out; returning raw computed result.")
+    except Exception as e:
+        _llm_outcome("error", started)
+        print("LLM polishing failed:", e)
+    return raw_result
+
+
+def process_query(question: str, mode: str = "image", dataset: str = None) -> dict:
+    """Answer a natural-language question about the Titanic dataset.
+
+    Returns {"answer": str, "plot_url": str | None, "chart": dict | None}.
+    In "image" mode charts are published at ``plot_url`` (GET /plots/{hash});
+    in "spec" mode ``chart`` holds the chart spec for the client to draw.
+    ``dataset`` names a registered dataset; the default is titanic.
+    """
+    deadline = time.perf_counter() + REQUEST_BUDGET
+    if not question or not isinstance(question, str):
+        return _response("Please ask a clear question about the Titanic dataset.")
+    unknown = _unknown_dataset(dataset)
+    if unknown is not None:
+        return unknown
+
+    match = _classify(question)
+    rejected = _rejection(match)
+    if rejected is not None:
+        return rejected
+
+    raw_result, plot = _compute(question, match, mode, dataset)
+    return _response(_polish(question, raw_result, deadline), plot, mode)
+
+
+async def aprocess_query(question: str, mode: str = "image", dataset: str = None) -> dict:
+    """Async variant of ``process_query`` for the event loop.
+
+    Pandas and matplotlib work runs on the bounded compute pool and the LLM
+    call is awaited with a deadline, so no worker thread waits on the network.
+    """
+    deadline = time.perf_counter() + REQUEST_BUDGET
+    if not question or not isinstance(question, str):
+        return _response("Please ask a clear question about the Titanic dataset.")
+    unknown = _unknown_dataset(dataset)
+    if unknown is not None:
+        return unknown
+
+    match = _classify(question)
+    rejected = _rejection(match)
+    if rejected is not None:
+        return rejected
+
+    loop = asyncio.get_running_loop()
+    with tracing.span("compute_pool"):
+        raw_result, plot = await loop.run_in_executor(
+            _compute_pool, tracing.bind(_compute), question, match, mode, dataset
+        )
+    return _response(await _apolish(question, raw_result, deadline), plot, mode)
+
+
+async def _apolish_batch(pairs, deadline: float = None):
+    """Polish (question, raw result) pairs with one ``abatch`` call; falls back per item."""
+    answers = [raw for _, raw in pairs]
+    if not pairs or not _polishing_enabled():
+        return answers
+
+    pending = {}
+    cached_answers = await _off_loop(lambda: [_cached_answer(q, raw) for q, raw in pairs])
+    for i, ((question, raw_result), cached) in enumerate(zip(pairs, cached_answers)):
+        if cached is not None:
+            answers[i] = cached
+        else:
+            pending.setdefault((normalize_question(question), raw_result), []).append(i)
+    if not pending:
+        return answers
+
+    timeout = _polish_timeout(deadline)
+    if timeout is None:
+        return answers
+    groups = list(pending.values())
+    inputs = [{"question": pairs[idx[0]][0], "result": pairs[idx[0]][1]} for idx in groups]
+    started = time.perf_counter()
+    try:
+        polished = await asyncio.wait_for(
+            response_chain.abatch(inputs, return_exceptions=True), timeout=timeout
+        )
+    except asyncio.TimeoutError:
+        _llm_outcome("timeout", started, len(inputs))
+        print("LLM batch polishing timed out; returning raw computed results.")
+        return answers
+    except Exception as e:
+        _llm_outcome("error", started, len(inputs))
+        print("LLM batch polishing failed:", e)
+        return answers
+
+    failed = sum(isinstance(result, Exception) for result in polished)
+    if failed == len(inputs):
+        _llm_outcome("error", started, failed)
+    else:
+        _llm_outcome("ok", started, len(inputs) - failed)
+        metrics.LLM_CALLS.labels("error").inc(failed)
+    accepted = []
+    for idx, result in zip(groups, polished):
+        if isinstance(result, Exception):
+            print("LLM polishing failed:", result)
+        else:
+            accepted.append((idx, pairs[idx[0]][0], result, pairs[idx[0]][1]))
+    polished_answers = await _off_loop(lambda: [_accept_polished(q, result, raw) for _, q, result, raw in accepted])
+    for (idx, *_), answer in zip(accepted, polished_answers):
+        for i in idx:
+            answers[i] = answer
+    return answers
+
+
+async def abatch_query(questions, mode: str = "image", dataset: str = None) -> list:
+    """Answer several questions together.
+
+    Questions that resolve to the same intent share a single handler run,
+    distinct intents run in parallel on the compute pool, and every answer
+    that needs polishing goes to the LLM in one batch. Each result carries
+    the matched intent and per-stage timings in milliseconds.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = time.perf_counter() + REQUEST_BUDGET
+    unknown = _unknown_dataset(dataset)
+    if unknown is not None:
+        return [{"question": q, "intent": None, "timings": {}, **unknown} for q in questions]
+    results, groups = [], {}
+    for question in questions:
+        t0 = time.perf_counter()
+        if question and isinstance(question, str):
+            match = _classify(question)
+            rejected = _rejection(match)
+        else:
+            match, rejected = None, _response("Please ask a clear question about the Titanic dataset.")
+        result = {"question": question, "intent": None,
+                  "timings": {"match_ms": (time.perf_counter() - t0) * 1000}}
+        if rejected is not None:
+            result.update(rejected, intent=match.kind if match else None)
+        else:
+            if match.kind == "plan":
+                key, result["intent"] = match.plan, "plan"
+            else:
+                key = result["intent"] = match.handler.__name__ if match.kind == "intent" else "_general_stats"
+            groups.setdefault(key, (match, []))[1].append(len(results))
+        results.append(result)
+
+    async def run(match):
+        t0 = time.perf_counter()
+        raw_result, plot = await loop.run_in_executor(_compute_pool, _compute, "", match, mode, dataset)
+        return raw_result, plot, (time.perf_counter() - t0) * 1000
+
+    computed = await asyncio.gather(*(run(match) for match, _ in groups.values()))
+    pairs, owners = [], []
+    for (match, members), (raw_result, plot, elapsed) in zip(groups.values(), computed):
+        for i in members:
+            results[i].update(_response(raw_result, plot, mode))
+            results[i]["timings"]["compute_ms"] = elapsed
+            results[i]["shared"] = len(members) > 1
+            pairs.append((results[i]["question"], raw_result))
+            owners.append(i)
+
+    t0 = time.perf_counter()
+    answers = await _apolish_batch(pairs, deadline)
+    polish_ms = (time.perf_counter() - t0) * 1000
+    for i, answer in zip(owners, answers):
+        results[i]["answer"] = answer
+        results[i]["timings"]["polish_ms"] = polish_ms
+    for result in results:
+        timings = result["timings"]
+        timings["total_ms"] = sum(timings.values())
+    return results
+
+
+async def astream_query(question: str, mode: str = "image", dataset: str = None):
+    """Yield (event, payload) pairs for a streamed answer.
+
+    Events, in order: "raw" with the computed result as soon as it exists,
+    "token" for each polished chunk from the LLM, "answer" with the final
+    text (the raw result if polishing fails or times out), then "plot" with
+    the chart URL ("image" mode) or "chart" with the chart spec ("spec"
+    mode) when the handler drew one. Refused questions only produce "answer".
+    """
+    deadline = time.perf_counter() + REQUEST_BUDGET
+    if not question or not isinstance(question, str):
+        yield "answer", {"text": "Please ask a clear question about the Titanic dataset."}
+        return
+    unknown = _unknown_dataset(dataset)
+    if unknown is not None:
+        yield "answer", {"text": unknown["answer"]}
+        return
+
+    match = _classify(question)
+    rejected = _rejection(match)
+    if rejected is not None:
+        yield "answer", {"text": rejected["answer"]}
+        return
+
+    loop = asyncio.get_running_loop()
+    raw_result, plot = await loop.run_in_executor(_compute_pool, _compute, question, match, mode, dataset)
+    yield "raw", {"text": raw_result}
+
+    answer = raw_result
+    if _polishing_enabled():
+        cached = await _off_loop(_cached_answer, question, raw_result)
+        if cached is not None:
+            answer = cached
+        elif (timeout := _polish_timeout(deadline)) is not None:
+            started = time.perf_counter()
+            # A deadline per chunk rather than asyncio.timeout(): the latter
+            # would also cancel the consumer while this generator is suspended.
+            stop_at = loop.time() + timeout
+            stream = response_chain.astream({"question": question, "result": raw_result}).__aiter__()
+            chunks = []
             try:
-                with ThreadPoolExecutor(max_workers=1) as pool:
-                    future = pool.submit(
-                        response_chain.invoke,
-                        {"question": question, "result": raw_result},
-                    )
-                    polished = future.result(timeout=LLM_TIMEOUT)
-                    if isinstance(polished, str):
-                        polished = polished.strip()
-                    else:
-                        polished = str(polished).strip()
-
-                if polished and 10 < len(polished) < 2000:
-                    answer = polished
-                else:
-                    answer = raw_result
-
-            except FuturesTimeout:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(stream.__anext__(), stop_at - loop.time())
+                    except StopAsyncIteration:
+                        break
+                    chunks.append(str(chunk))
+                    yield "token", {"text": str(chunk)}
+                _llm_outcome("ok", started)
+                answer = await _off_loop(_accept_polished, question, "".join(chunks), raw_result)
+            except asyncio.TimeoutError:
+                _llm_outcome("timeout", started)
                 print("LLM polishing timed out; returning raw computed result.")
-                answer = raw_result
             except Exception as e:
+                _llm_outcome("error", started)
                 print("LLM polishing failed:", e)
-                answer = raw_result
-        else:
-            if not HF_TOKEN:
-                print("Hugging Face token not found — skipping LLM polishing.")
-            if response_chain is None:
-                print("response_chain not available — skipping LLM polishing.")
-            answer = raw_result
+            finally:
+                await stream.aclose()
 
-    except Exception as e:
-        print("Unexpected error during LLM polishing:", e)
-        answer = raw_result
+    yield "answer", {"text": answer}
+    if plot is not None and mode == "spec":
+        yield "chart", plot
+    elif plot is not None:
+        yield "plot", {"url": plot}
 
-    try:
-        low = question.lower()
-        if any(w in low for w in ["alien", "aliens", "ufo", "unicorn", "dinosaurs"]):
-            return {
-                "answer": "That question appears to assume facts outside this dataset (e.g., 'aliens'). I can only answer questions about the Titanic passenger dataset. Try asking about age, fare, sex, survival, class, or embarkation.",
-                "plot": None,
-            }
-    except Exception:
-        pass
-
-    return {"answer": answer, "plot": plot}
\ No newline at end of file
+
+def _cache_metrics():
+    loaded = [ds for ds in map(datasets.peek, datasets.names()) if ds is not None]
+    answers = answer_cache.stats()
+    caches = {
+        "chart": (sum(ds.charts.hits for ds in loaded), sum(ds.charts.misses for ds in loaded),
+                  sum(len(ds.charts) for ds in loaded)),
+        "answer": (answers["hits"], answers["misses"], answers["entries"]),
+        "plan": (_planner.hits, _planner.misses, len(_planner)),
+    }
+    registry = datasets.stats()
+    return [
+        ("titanic_cache_hits_total", "counter", "Cache lookups that hit.",
+         [({"cache": name}, hits) for name, (hits, _, _) in caches.items()]),
+        ("titanic_cache_misses_total", "counter", "Cache lookups that missed.",
+         [({"cache": name}, misses) for name, (_, misses, _) in caches.items()]),
+        ("titanic_cache_hit_ratio", "gauge", "Hits over lookups since start-up.",
+         [({"cache": name}, hits / (hits + misses) if hits + misses else 0.0)
+          for name, (hits, misses, _) in caches.items()]),
+        ("titanic_cache_entries", "gauge", "Entries held in memory.",
+         [({"cache": name}, entries) for name, (_, _, entries) in caches.items()]),
+        ("titanic_dataset_bytes", "gauge", "Memory held by each loaded dataset.",
+         [({"dataset": entry["name"]}, entry["bytes"]) for entry in registry["loaded"]]),
+        ("titanic_dataset_loads_total", "counter", "Datasets loaded by the registry.", [({}, registry["loads"])]),
+        ("titanic_dataset_evictions_total", "counter", "Datasets evicted to stay within the memory budget.",
+         [({}, registry["evictions"])]),
+        ("titanic_llm_circuit_open", "gauge", "1 while LLM polishing is short-circuited.", [({}, int(llm_guard.is_open))]),
+        ("titanic_llm_timeout_seconds", "gauge", "Current adaptive LLM polishing timeout.", [({}, llm_guard.timeout())]),
+    ]
+
+
+metrics.register_collector(_cache_metrics)
+
+
+def warm_up(charts: bool = True):
+    """Do every deferred start-up step now: dataset, LLM chain, render pool, chart cache."""
+    ensure_dataset()
+    if HF_TOKEN:
+        build_response_chain()
+    with startup.phase("render_pool"):
+        render_pool.start()
+    if charts:
+        with startup.phase("chart_warmup"):
+            warm_chart_cache()
+
+
+startup.record("imports", _import_started)
@@ -0,0 +1,97 @@
+import hashlib, re, sqlite3, threading, time
+from collections import OrderedDict
+
+
+def normalize_question(question: str) -> str:
+    q = re.sub(r"\s+", " ", question.lower()).strip()
+    return q.rstrip("?!. ")
+
+
+class AnswerCache:
+    """LLM-polished answers keyed by normalized question and computed result.
+
+    Entries live in an in-memory LRU and, when ``db_path`` is set, in a SQLite
+    file so they survive restarts and are shared between uvicorn workers.
+    Entries older than ``ttl`` seconds are treated as misses.
+    """
+
+    def __init__(self, max_entries=256, ttl=86400, db_path=None):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl)
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, answer TEXT, created REAL)"
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                print("Answer cache: SQLite backing disabled:", e)
+                self._db = None
+
+    @staticmethod
+    def key(question: str, raw_result: str) -> str:
+        payload = f"{normalize_question(question)}\0{raw_result}"
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _fresh(self, created):
+        return self.ttl <= 0 or time.time() - created < self.ttl
+
+    def _remember(self, key, answer, created):
+        self._entries[key] = (answer, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, question: str, raw_result: str):
+        key = self.key(question, raw_result)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT answer, created FROM answers WHERE key = ?", (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    print("Answer cache: lookup failed:", e)
+                    row = None
+                if row is not None:
+                    entry = (row[0], row[1])
+                    self._remember(key, *entry)
+            if entry is not None and self._fresh(entry[1]):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+    def put(self, question: str, raw_result: str, answer: str):
+        key = self.key(question, raw_result)
+        created = time.time()
+        with self._lock:
+            self._remember(key, answer, created)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO answers (key, answer, created) VALUES (?, ?, ?)",
+                        (key, answer, created),
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print("Answer cache: write failed:", e)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+        }
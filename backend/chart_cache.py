@@ -0,0 +1,96 @@
+import hashlib, os, pickle, threading
+from collections import OrderedDict
+
+
+class ChartCache:
+    """Size-bounded LRU store for rendered chart results.
+
+    Keys are tuples such as (handler name, dataset version, format, dpi).
+    When ``disk_dir`` is set, entries are also written there so a restarted
+    process can serve charts without re-rendering them.
+    """
+
+    def __init__(self, max_entries=64, disk_dir=None):
+        self.max_entries = max(1, int(max_entries))
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _path(self, key):
+        digest = hashlib.sha256(repr(key).encode()).hexdigest()
+        return os.path.join(self.disk_dir, f"{digest}.pkl")
+
+    def _load(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._path(key), "rb") as fh:
+                stored_key, value = pickle.load(fh)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print("Chart cache: unreadable disk entry:", e)
+            return None
+        return value if stored_key == key else None
+
+    def _store(self, key, value):
+        if not self.disk_dir:
+            return
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as fh:
+                pickle.dump((key, value), fh)
+            os.replace(tmp, path)
+        except Exception as e:
+            print("Chart cache: could not persist entry:", e)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        value = self._load(key)
+        if value is not None:
+            self._remember(key, value)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def put(self, key, value):
+        self._remember(key, value)
+        self._store(key, value)
+
+    def get_or_render(self, key, render):
+        value = self.get(key)
+        if value is None:
+            value = render()
+            self.put(key, value)
+        return value
+
+    def items(self):
+        """A snapshot of the in-memory entries, least recently used first."""
+        with self._lock:
+            return list(self._entries.items())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
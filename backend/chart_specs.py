@@ -0,0 +1,132 @@
+"""Compact, JSON-serialisable chart descriptions.
+
+Chart handlers build one of these specs; ``renderer.render_spec`` draws it on
+the server, and clients that ask for ``mode="spec"`` draw it themselves.
+"""
+import numpy as np
+
+PALETTE = ["#4e79a7", "#f28e2b", "#e15759"]
+MUTED = ["#4878d0", "#ee854a", "#6acc64", "#d65f5f", "#956cb4"]
+KDE_POINTS = 64
+
+
+def _r(values, ndigits=3):
+    return [round(float(v), ndigits) for v in values]
+
+
+def bar_spec(title, x_label, y_label, series, colors=PALETTE):
+    """``series`` is a pandas Series (or mapping) of label -> value, drawn in order."""
+    items = list(series.items())
+    return {
+        "type": "bar",
+        "title": title,
+        "x_label": x_label,
+        "y_label": y_label,
+        "labels": [str(k) for k, _ in items],
+        "values": _r(v for _, v in items),
+        "colors": list(colors[: len(items)]),
+    }
+
+
+def _kde_from_bins(edges, counts):
+    """Gaussian KDE (Scott's rule) over bin centres, scaled to bin counts."""
+    centers = (edges[:-1] + edges[1:]) / 2
+    n = counts.sum()
+    if n < 2:
+        return None
+    mean = np.average(centers, weights=counts)
+    std = np.sqrt(np.average((centers - mean) ** 2, weights=counts))
+    if std == 0:
+        return None
+    bw = std * n ** (-1 / 5)
+    xs = np.linspace(edges[0], edges[-1], KDE_POINTS)
+    z = (xs[:, None] - centers[None, :]) / bw
+    density = (np.exp(-0.5 * z ** 2) * counts[None, :]).sum(axis=1) / (n * bw * np.sqrt(2 * np.pi))
+    return {"x": _r(xs, 2), "y": _r(density * n * (edges[1] - edges[0]), 2)}
+
+
+def histogram_spec(title, x_label, y_label, edges, counts, color):
+    edges = np.asarray(edges, dtype=float)
+    counts = np.asarray(counts, dtype=float)
+    return {
+        "type": "histogram",
+        "title": title,
+        "x_label": x_label,
+        "y_label": y_label,
+        "edges": _r(edges),
+        "counts": [int(c) for c in counts],
+        "kde": _kde_from_bins(edges, counts),
+        "color": color,
+    }
+
+
+def box_stats(values):
+    """Tukey box-plot statistics (1.5 IQR whiskers) as plain floats."""
+    values = np.sort(np.asarray(values, dtype=float))
+    q1, med, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    fliers = values[(values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)]
+    return {
+        "q1": round(float(q1), 3),
+        "med": round(float(med), 3),
+        "q3": round(float(q3), 3),
+        "whislo": round(float(inside.min()), 3),
+        "whishi": round(float(inside.max()), 3),
+        "fliers": _r(np.unique(fliers), 2),
+    }
+
+
+def histogram_quantiles(edges, counts, qs):
+    """Quantiles estimated from binned counts by linear interpolation inside a bin."""
+    edges = np.asarray(edges, dtype=float)
+    counts = np.asarray(counts, dtype=float)
+    cum = np.cumsum(counts)
+    n = cum[-1] if len(cum) else 0
+    out = []
+    for q in qs:
+        if n == 0:
+            out.append(float("nan"))
+            continue
+        target = q * n
+        i = min(int(np.searchsorted(cum, target, side="left")), len(counts) - 1)
+        before = cum[i] - counts[i]
+        frac = (target - before) / counts[i] if counts[i] else 0.0
+        out.append(float(edges[i] + frac * (edges[i + 1] - edges[i])))
+    return out
+
+
+def box_stats_from_histogram(edges, counts, lo, hi, max_fliers=50):
+    """Approximate ``box_stats`` for data only available as a histogram.
+
+    Whiskers and fliers snap to bin centres, clamped to the exact ``lo``/``hi``.
+    """
+    edges = np.asarray(edges, dtype=float)
+    counts = np.asarray(counts)
+    q1, med, q3 = histogram_quantiles(edges, counts, [0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    centers = np.clip((edges[:-1] + edges[1:]) / 2, lo, hi)
+    occupied = centers[counts > 0]
+    inside = occupied[(occupied >= q1 - 1.5 * iqr) & (occupied <= q3 + 1.5 * iqr)]
+    fliers = occupied[(occupied < q1 - 1.5 * iqr) | (occupied > q3 + 1.5 * iqr)]
+    return {
+        "q1": round(q1, 3),
+        "med": round(med, 3),
+        "q3": round(q3, 3),
+        "whislo": round(float(inside.min() if len(inside) else lo), 3),
+        "whishi": round(float(inside.max() if len(inside) else hi), 3),
+        "fliers": _r(fliers[:max_fliers], 2),
+    }
+
+
+def box_spec(title, x_label, y_label, groups, colors=MUTED):
+    """``groups`` maps a label to its ``box_stats`` dict, one box per label."""
+    boxes = [{"label": str(label), **stats} for label, stats in groups.items()]
+    return {
+        "type": "box",
+        "title": title,
+        "x_label": x_label,
+        "y_label": y_label,
+        "boxes": boxes,
+        "colors": list(colors[: len(boxes)]),
+    }
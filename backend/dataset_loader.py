@@ -1,19 +1,168 @@
-import seaborn as sns
-import os
+import hashlib, json, os
+import numpy as np
 import pandas as pd
 
-def load_dataset():
+DEFAULT_CSV = os.path.join(os.path.dirname(__file__), "titanic.csv")
+CACHE_ROOT = os.getenv("DATASET_CACHE_DIR") or os.path.join(os.path.dirname(__file__), ".columnar_cache")
+CACHE_FORMAT = 1
+
+CATEGORICAL_COLUMNS = ("sex", "class", "embark_town", "who", "deck", "embarked", "alive")
+SMALL_INT_COLUMNS = {"survived": "int8", "pclass": "int8", "sibsp": "int8", "parch": "int8"}
+BOOL_COLUMNS = ("adult_male", "alone")
+
+
+def _read_csv(csv_path):
+    df = pd.read_csv(csv_path)
+    df.columns = [c.strip().lower() for c in df.columns]
+    return df
+
+
+def to_typed(df: pd.DataFrame) -> pd.DataFrame:
+    """Compact dtypes: categoricals for labels, int8 for small counts, bool flags."""
+    df = df.copy()
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    for col, dtype in SMALL_INT_COLUMNS.items():
+        if col in df.columns and not df[col].isna().any():
+            df[col] = df[col].astype(dtype)
+    for col in BOOL_COLUMNS:
+        if col in df.columns and not df[col].isna().any():
+            df[col] = df[col].astype(bool)
+    return df
+
+
+def _cache_dir(csv_path):
+    """One directory per CSV path: two files with the same name never share a cache."""
+    path = os.path.abspath(csv_path)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(CACHE_ROOT, f"{stem}-{hashlib.sha256(path.encode()).hexdigest()[:12]}")
+
+
+def _source_stamp(csv_path):
+    st = os.stat(csv_path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _file_version(csv_path):
+    h = hashlib.sha256()
+    with open(csv_path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()[:16]
+
+
+def write_cache(df: pd.DataFrame, cache_dir: str, meta: dict):
+    """Store each column as a .npy file (categoricals as codes) plus meta.json.
+
+    Column files are named after ``meta["version"]`` and only ever created,
+    never rewritten: frames read from an older version memory-map its files,
+    and keep their inodes (and contents) after they are unlinked here.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    prefix = meta.get("version", "data")
+    columns = []
+    for i, col in enumerate(df.columns):
+        series = df[col]
+        entry = {"name": col, "file": f"{prefix}-{i}.npy"}
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            entry["categories"] = [str(c) for c in series.cat.categories]
+            values = series.cat.codes.to_numpy()
+        elif series.dtype == object:
+            entry["strings"] = True
+            values = series.astype(str).to_numpy(dtype=str)
+        else:
+            values = series.to_numpy()
+        path = os.path.join(cache_dir, entry["file"])
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as fh:
+            np.save(fh, values, allow_pickle=False)
+        os.replace(tmp, path)
+        columns.append(entry)
+    meta_tmp = os.path.join(cache_dir, f"meta.json.{os.getpid()}.tmp")
+    with open(meta_tmp, "w") as fh:
+        json.dump({**meta, "format": CACHE_FORMAT, "rows": len(df), "columns": columns}, fh)
+    # meta.json appears last, so a half-written cache is never read.
+    os.replace(meta_tmp, os.path.join(cache_dir, "meta.json"))
+    current = {entry["file"] for entry in columns}
+    for name in os.listdir(cache_dir):
+        if name.endswith(".npy") and name not in current:
+            os.remove(os.path.join(cache_dir, name))
+
+
+def read_cache(cache_dir: str):
+    """Memory-map a cache written by ``write_cache``; returns (DataFrame, meta) or None."""
+    try:
+        with open(os.path.join(cache_dir, "meta.json")) as fh:
+            meta = json.load(fh)
+    except (FileNotFoundError, ValueError):
+        return None
+    if meta.get("format") != CACHE_FORMAT:
+        return None
+    data = {}
+    for entry in meta["columns"]:
+        values = np.load(os.path.join(cache_dir, entry["file"]), mmap_mode="r", allow_pickle=False)
+        if "categories" in entry:
+            data[entry["name"]] = pd.Categorical.from_codes(values, entry["categories"])
+        elif entry.get("strings"):
+            data[entry["name"]] = np.asarray(values, dtype=object)
+        else:
+            data[entry["name"]] = values
+    return pd.DataFrame(data, copy=False), meta
+
+
+def load_versioned(csv_path=DEFAULT_CSV, use_cache=True):
+    """Load ``csv_path`` with compact dtypes; returns (DataFrame, version).
+
+    The first load converts the CSV into a columnar cache; later loads
+    memory-map it for as long as the CSV's size and mtime are unchanged.
+    The version is a content hash of the CSV.
+    """
+    stamp = _source_stamp(csv_path)
+    cache_dir = _cache_dir(csv_path)
+    if use_cache:
+        cached = read_cache(cache_dir)
+        if cached is not None and cached[1].get("source") == stamp:
+            return cached[0], cached[1]["version"]
+
+    version = _file_version(csv_path)
+    df = to_typed(_read_csv(csv_path))
+    if use_cache:
+        try:
+            write_cache(df, cache_dir, {"source": stamp, "version": version})
+            cached = read_cache(cache_dir)
+            if cached is not None:
+                df = cached[0]
+        except OSError as e:
+            print("Dataset cache: could not write columnar cache:", e)
+    return df, version
+
+
+def load_dataset(csv_path=DEFAULT_CSV):
     """
     Loads seaborn titanic dataset and saves to titanic.csv if not present.
     Returns the DataFrame.
     """
-    csv_path = "titanic.csv"
     if not os.path.exists(csv_path):
+        import seaborn as sns
         df = sns.load_dataset("titanic")
         df = df.copy()
         df.to_csv(csv_path, index=False)
         print("Created titanic.csv from seaborn dataset.")
-    else:
-        df = pd.read_csv(csv_path)
-    df.columns = [c.lower() for c in df.columns]
-    return df
\ No newline at end of file
+    return load_versioned(csv_path)[0]
+
+
+def memory_report(csv_path=DEFAULT_CSV) -> dict:
+    """Bytes held by the default CSV parse versus the typed columnar load."""
+    default = int(_read_csv(csv_path).memory_usage(deep=True).sum())
+    typed = int(load_versioned(csv_path)[0].memory_usage(deep=True).sum())
+    return {
+        "csv_default_bytes": default,
+        "typed_bytes": typed,
+        "saved_bytes": default - typed,
+        "saved_pct": round((default - typed) / default * 100, 1) if default else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(memory_report(), indent=2))
@@ -0,0 +1,102 @@
+import threading
+from collections import OrderedDict
+
+
+class DatasetRegistry:
+    """Named datasets, loaded on first use and evicted least-recently-used under a memory budget.
+
+    ``loader(name, source)`` builds a dataset from its registered source and
+    ``sizeof(dataset)`` reports the bytes it holds. Whenever the loaded
+    datasets exceed ``budget_bytes``, the idle ones are dropped oldest-first,
+    together with everything hanging off them (stats snapshot, chart cache);
+    the dataset just requested is never evicted. A request that already holds
+    an evicted dataset keeps using it until it finishes.
+    """
+
+    def __init__(self, loader, sizeof, budget_bytes):
+        self._loader = loader
+        self._sizeof = sizeof
+        self.budget_bytes = int(budget_bytes)
+        self._sources = {}
+        self._loaded = OrderedDict()  # name -> (dataset, bytes), least recently used first
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self.loads = 0
+        self.evictions = 0
+
+    def register(self, name: str, source):
+        with self._lock:
+            self._sources[name] = source
+            self._load_locks.setdefault(name, threading.Lock())
+
+    def __contains__(self, name):
+        return name in self._sources
+
+    def names(self):
+        return list(self._sources)
+
+    def peek(self, name):
+        """The loaded dataset called ``name``, or None; never loads and does not count as a use."""
+        entry = self._loaded.get(name)
+        return entry[0] if entry else None
+
+    def _touch(self, name):
+        with self._lock:
+            if name not in self._loaded:
+                return None
+            self._loaded.move_to_end(name)
+            return self._loaded[name][0]
+
+    def get(self, name):
+        """The dataset called ``name``, loading it if needed. Raises KeyError for unknown names."""
+        dataset = self._touch(name)
+        if dataset is not None:
+            return dataset
+        if name not in self._sources:
+            raise KeyError(name)
+        # One load per name at a time; other names keep being served meanwhile.
+        with self._load_locks[name]:
+            dataset = self._touch(name)
+            if dataset is not None:
+                return dataset
+            dataset = self._loader(name, self._sources[name])
+            self.loads += 1
+            return self.put(name, dataset)
+
+    def put(self, name, dataset):
+        """Install ``dataset`` as ``name`` (replacing any loaded version), then enforce the budget."""
+        size = int(self._sizeof(dataset))
+        with self._lock:
+            self._load_locks.setdefault(name, threading.Lock())
+            self._loaded[name] = (dataset, size)
+            self._loaded.move_to_end(name)
+            self._evict_over_budget(keep=name)
+        return dataset
+
+    def used_bytes(self) -> int:
+        return sum(size for _, size in self._loaded.values())
+
+    def _evict_over_budget(self, keep):
+        while self.used_bytes() > self.budget_bytes:
+            victim = next((name for name in self._loaded if name != keep), None)
+            if victim is None:
+                print(f"Dataset registry: '{keep}' alone exceeds the memory budget.")
+                return
+            self._loaded.pop(victim)
+            self.evictions += 1
+            print(f"Dataset registry: evicted '{victim}' to stay within the memory budget.")
+
+    def stats(self) -> dict:
+        with self._lock:
+            loaded = [
+                {"name": name, "bytes": size, "version": getattr(dataset, "version", None)}
+                for name, (dataset, size) in self._loaded.items()
+            ]
+        return {
+            "budget_bytes": self.budget_bytes,
+            "used_bytes": sum(entry["bytes"] for entry in loaded),
+            "registered": self.names(),
+            "loaded": loaded,
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,81 @@
+"""Notice when a dataset file changes, and tell appends apart from rewrites.
+
+A loaded dataset remembers ``source_info`` for its file: how many bytes it
+consumed plus a hash of the last few KB of them. ``detect_change`` compares
+that against the file as it is now. If the old bytes are untouched and only
+complete new lines follow, the change is an append and just the new bytes
+are returned. Anything else is a rewrite and needs a full reload.
+"""
+import hashlib, os, threading
+
+TAIL_BYTES = 4096
+
+
+def _tail_hash(fh, end):
+    fh.seek(max(0, end - TAIL_BYTES))
+    return hashlib.sha256(fh.read(end - max(0, end - TAIL_BYTES))).hexdigest()
+
+
+def source_info(path, size=None) -> dict:
+    """Fingerprint of the first ``size`` bytes of ``path`` (default: the whole file)."""
+    st = os.stat(path)
+    size = st.st_size if size is None else size
+    with open(path, "rb") as fh:
+        fh.seek(max(0, size - 1))
+        ends_with_newline = size == 0 or fh.read(1) == b"\n"
+        return {
+            "path": path,
+            "size": size,
+            "mtime_ns": st.st_mtime_ns,
+            "tail": _tail_hash(fh, size),
+            "line_end": ends_with_newline,
+        }
+
+
+def detect_change(info: dict):
+    """None if unchanged, ("append", new bytes, new info) or ("rewrite", None, None)."""
+    path = info["path"]
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None  # mid-replace, or removed: keep serving what is loaded
+    if st.st_size == info["size"] and st.st_mtime_ns == info["mtime_ns"]:
+        return None
+    if st.st_size <= info["size"] or not info["line_end"]:
+        return "rewrite", None, None
+    with open(path, "rb") as fh:
+        if _tail_hash(fh, info["size"]) != info["tail"]:
+            return "rewrite", None, None
+        fh.seek(info["size"])
+        data = fh.read(st.st_size - info["size"])
+    # A writer may be half-way through a line; take whole lines only and pick up the rest later.
+    data = data[: data.rfind(b"\n") + 1]
+    if not data.strip():
+        return None
+    return "append", data, source_info(path, info["size"] + len(data))
+
+
+class DatasetWatcher:
+    """Background thread that calls ``check()`` every ``interval`` seconds until stopped."""
+
+    def __init__(self, check, interval: float):
+        self._check = check
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True, name="dataset-watcher")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self._check()
+            except Exception as e:
+                print("Dataset watcher: check failed:", e)
@@ -0,0 +1,283 @@
+import math, re
+from collections import Counter, deque
+from typing import Callable, NamedTuple, Optional
+
+import numpy as np
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton that finds every keyword occurring in a text in one pass.
+
+    Matching is by substring, like ``keyword in text``, so "surviv" matches
+    "survival" and "cat" matches "category".
+    """
+
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+        self._goto = [{}]
+        self._out = [[]]
+        for idx, keyword in enumerate(self.keywords):
+            node = 0
+            for ch in keyword:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto.append({})
+                    self._out.append([])
+                    self._goto[node][ch] = nxt
+                node = nxt
+            self._out[node].append(idx)
+
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def iter_matches(self, text):
+        """Yield (start, keyword index) for every occurrence, in order of end position."""
+        goto, fail, out, keywords = self._goto, self._fail, self._out, self.keywords
+        node = 0
+        for pos, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for idx in out[node]:
+                yield pos - len(keywords[idx]) + 1, idx
+
+
+def char_ngrams(text: str, sizes=(3, 4)) -> Counter:
+    """Counts of the character n-grams of each word, padded with spaces so word edges count."""
+    words = re.sub(r"[^a-z0-9%£]+", " ", text.lower()).split()
+    grams = Counter()
+    for word in words:
+        padded = f" {word} "
+        for n in sizes:
+            grams.update(padded[i:i + n] for i in range(max(len(padded) - n + 1, 1)))
+    return grams
+
+
+class FuzzyRouter:
+    """Scores a question against example phrasings of every intent by char n-gram TF-IDF cosine.
+
+    The phrasing x n-gram matrix is built once and kept in two CSR layouts:
+    n-gram-major (``_col_ptr`` slicing ``_col_rows`` and ``_col_weights``)
+    and phrasing-major (``_row_ptr`` slicing ``_row_cols`` and
+    ``_row_weights``). A question touches only the columns of its own
+    n-grams, so scoring is one gather plus one ``np.bincount``. Typos and
+    rewordings still share most n-grams with some example, which the
+    keyword rules cannot tolerate.
+
+    With more than ``exhaustive_rows`` phrasings, n-grams that many of them
+    share (filler such as "passenger") make that gather long. ``route``
+    then scores with the question's rare n-grams only, those in at most
+    ``rare_share`` of the phrasings, and rescores the ``candidates`` best
+    phrasings exactly through the phrasing-major layout.
+
+    A question is routed only if its best intent scores at least
+    ``threshold`` and beats the runner-up by ``margin``. Single words are
+    not routed: a bare "class" is as close to "age by class" as to "fare by
+    class", and should not be guessed at.
+    """
+
+    def __init__(self, examples, threshold: float = 0.5, margin: float = 0.05, sizes=(3, 4),
+                 exhaustive_rows: int = 2048, rare_share: float = 0.01, candidates: int = 64):
+        """``examples`` is an iterable of (intent, phrasing); intents may be any hashable."""
+        self.threshold = threshold
+        self.margin = margin
+        self.sizes = sizes
+        self.exhaustive_rows = exhaustive_rows
+        self.candidates = candidates
+        by_intent = {}
+        for intent, text in examples:
+            by_intent.setdefault(intent, []).append(text)
+        self.intents = list(by_intent)
+        phrasings = [(i, text) for i, texts in enumerate(by_intent.values()) for text in texts]
+        self._n_rows = len(phrasings)
+        self._rare_df = max(32, int(rare_share * self._n_rows))
+        # Phrasings are grouped by intent, so per-intent maxima are one reduceat.
+        self._owners = np.fromiter((i for i, _ in phrasings), dtype=np.int64, count=self._n_rows)
+        first = np.r_[True, self._owners[1:] != self._owners[:-1]] if self._n_rows else np.zeros(0, bool)
+        self._starts = np.flatnonzero(first)
+        # Among this many top phrasings at least two intents are represented.
+        self._top = int(np.diff(np.r_[self._starts, self._n_rows]).max()) + 1 if self._n_rows else 0
+
+        vocab, cols, rows, tf = {}, [], [], []
+        for row, (_, text) in enumerate(phrasings):
+            for gram, count in char_ngrams(text, sizes).items():
+                cols.append(vocab.setdefault(gram, len(vocab)))
+                rows.append(row)
+                tf.append(1 + math.log(count))
+        self._vocab = vocab
+        cols = np.array(cols, dtype=np.int64)
+        rows = np.array(rows, dtype=np.int64)
+        df = np.bincount(cols, minlength=len(vocab))
+        self._idf = np.log((1 + max(self._n_rows, 1)) / (1 + df)) + 1
+        self._unseen_idf = math.log(1 + max(self._n_rows, 1)) + 1
+        weights = np.array(tf, dtype=np.float64) * self._idf[cols]
+        if len(weights):
+            weights /= np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=self._n_rows))[rows]
+
+        # ``rows`` is already sorted, so the phrasing-major layout is the build order.
+        self._row_cols = cols.astype(np.int32)
+        self._row_weights = weights.astype(np.float32)
+        self._row_ptr = np.r_[0, np.cumsum(np.bincount(rows, minlength=self._n_rows))].astype(np.int64)
+        order = np.argsort(cols, kind="stable")
+        self._col_rows = rows[order].astype(np.int32)
+        self._col_weights = weights[order].astype(np.float32)
+        self._col_ptr = np.r_[0, np.cumsum(df)].astype(np.int64)
+
+    def __len__(self):
+        return len(self.intents)
+
+    def _query(self, question: str):
+        """(n-gram columns, L2-normalised TF-IDF weights) of ``question``; None if no n-gram is known."""
+        grams = char_ngrams(question, self.sizes)
+        known = [(self._vocab[g], 1 + math.log(c)) for g, c in grams.items() if g in self._vocab]
+        if not known:
+            return None
+        cols = np.array([c for c, _ in known], dtype=np.int64)
+        q = np.array([w for _, w in known]) * self._idf[cols]
+        # n-grams no example has still count toward the question's length.
+        unseen = sum((1 + math.log(c)) ** 2 for g, c in grams.items() if g not in self._vocab)
+        q /= math.sqrt(float(q @ q) + unseen * self._unseen_idf ** 2)
+        return cols, q
+
+    @staticmethod
+    def _slices(ptr, keys):
+        """Positions of the CSR slices ``ptr`` gives each of ``keys``, concatenated, and their lengths."""
+        starts = ptr[keys]
+        lengths = ptr[keys + 1] - starts
+        return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum()), lengths
+
+    def _phrasing_scores(self, cols, q) -> np.ndarray:
+        at, lengths = self._slices(self._col_ptr, cols)
+        return np.bincount(self._col_rows[at], weights=self._col_weights[at] * np.repeat(q, lengths),
+                           minlength=self._n_rows)
+
+    def _candidate_scores(self, cols, q):
+        """(phrasings, their exact scores) for the phrasings ``route`` has to consider."""
+        rare = self._col_ptr[cols + 1] - self._col_ptr[cols] <= self._rare_df
+        if self._n_rows <= self.exhaustive_rows or not rare.any():
+            scores = self._phrasing_scores(cols, q)
+            rows = np.flatnonzero(scores)
+            return rows, scores[rows]
+        at, lengths = self._slices(self._col_ptr, cols[rare])
+        partial = np.bincount(self._col_rows[at], weights=self._col_weights[at] * np.repeat(q[rare], lengths),
+                              minlength=self._n_rows)
+        candidates = np.flatnonzero(partial)  # mostly zeros, which argpartition handles badly
+        if len(candidates) > self.candidates:
+            candidates = candidates[np.argpartition(partial[candidates], -self.candidates)[-self.candidates:]]
+        query = np.zeros(len(self._vocab), dtype=np.float32)
+        query[cols] = q
+        at, lengths = self._slices(self._row_ptr, candidates)
+        scores = np.bincount(np.repeat(np.arange(len(candidates)), lengths),
+                             weights=self._row_weights[at] * query[self._row_cols[at]], minlength=len(candidates))
+        return candidates, scores
+
+    def scores(self, question: str) -> np.ndarray:
+        """Best cosine similarity of ``question`` to any phrasing of each intent."""
+        query = self._query(question) if self._n_rows else None
+        if query is None:
+            return np.zeros(len(self.intents))
+        return np.maximum.reduceat(self._phrasing_scores(*query), self._starts)
+
+    def route(self, question: str):
+        """(intent, score) for the best intent, or (None, score) if it is not a confident pick."""
+        if not self.intents or len(question.split()) < 2:
+            return None, 0.0
+        query = self._query(question)
+        if query is None:
+            return None, 0.0
+        rows, scores = self._candidate_scores(*query)
+        if not len(rows):
+            return None, 0.0
+        # Only the top few phrasings matter, so skip the per-intent reduction over all of them.
+        top = np.argpartition(scores, -self._top)[-self._top:] if len(scores) > self._top else np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        owners = self._owners[rows[top]]
+        others = scores[top][owners != owners[0]]
+        score = round(min(float(scores[top[0]]), 1.0), 4)
+        confident = score - (float(others[0]) if len(others) else 0.0) >= self.margin
+        return (self.intents[owners[0]] if confident and score >= self.threshold else None), score
+
+
+class Classification(NamedTuple):
+    kind: str  # "assumption", "out_of_scope", "intent", "plan" or "fallback"
+    term: Optional[str] = None
+    handler: Optional[Callable] = None
+    score: Optional[float] = None  # set when the fuzzy router picked the intent
+    plan: Optional[tuple] = None  # a query_plan.Plan when kind is "plan"
+
+
+class IntentMatcher:
+    """Classifies a question against scope keywords and an ordered intent table.
+
+    ``intents`` uses the ``INTENT_MAP`` shape: (all-of keywords, any-of
+    keywords, handler); the first intent whose rule holds wins. All keywords
+    are compiled into one automaton, so a question is scanned once and only
+    the intents that mention a keyword found in it are checked.
+
+    ``router`` (a ``FuzzyRouter`` over handlers) answers only when no rule
+    holds, so questions the rules match route exactly as they always have.
+    """
+
+    def __init__(self, intents, out_of_scope=(), assumptions=(), router: FuzzyRouter = None):
+        self.router = router
+        ids = {}
+
+        def kw_id(keyword):
+            return ids.setdefault(keyword, len(ids))
+
+        self._assumptions = frozenset(kw_id(k) for k in assumptions)
+        self._out_of_scope = frozenset(kw_id(k) for k in out_of_scope)
+        self._intents = []
+        self._by_keyword = {}
+        self._unconditional = None
+        for pos, (kw_all, kw_any, handler) in enumerate(intents):
+            all_ids = frozenset(kw_id(k) for k in kw_all)
+            any_ids = frozenset(kw_id(k) for k in kw_any)
+            self._intents.append((all_ids, any_ids, handler))
+            if not all_ids and not any_ids:
+                if self._unconditional is None:
+                    self._unconditional = pos
+                continue
+            for k in all_ids | any_ids:
+                self._by_keyword.setdefault(k, []).append(pos)
+        self._automaton = KeywordAutomaton(ids)
+
+    def classify(self, question: str) -> Classification:
+        q = question.lower()
+        found = set()
+        first_assumption = first_out_of_scope = None
+        for start, idx in self._automaton.iter_matches(q):
+            found.add(idx)
+            if idx in self._assumptions and (first_assumption is None or start < first_assumption[0]):
+                first_assumption = (start, idx)
+            if idx in self._out_of_scope and (first_out_of_scope is None or start < first_out_of_scope[0]):
+                first_out_of_scope = (start, idx)
+
+        keywords = self._automaton.keywords
+        if first_assumption is not None:
+            return Classification("assumption", keywords[first_assumption[1]])
+        if first_out_of_scope is not None:
+            return Classification("out_of_scope", keywords[first_out_of_scope[1]])
+
+        candidates = {pos for idx in found for pos in self._by_keyword.get(idx, ())}
+        if self._unconditional is not None:
+            candidates.add(self._unconditional)
+        for pos in sorted(candidates):
+            all_ids, any_ids, handler = self._intents[pos]
+            if all_ids <= found and (not any_ids or not any_ids.isdisjoint(found)):
+                return Classification("intent", handler=handler)
+        if self.router is not None:
+            routed, score = self.router.route(question)
+            if routed is not None:
+                return Classification("intent", handler=routed, score=score)
+        return Classification("fallback")
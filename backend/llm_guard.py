@@ -0,0 +1,106 @@
+"""Circuit breaker and adaptive timeout for LLM polishing.
+
+Polishing is optional: the raw computed answer is always a valid reply. So
+when the endpoint is failing, requests should skip it at once rather than
+each wait out a timeout. ``LLMGuard`` opens after ``failure_threshold``
+consecutive timeouts or errors. While open, ``allow()`` is False and a
+background thread probes the endpoint every ``cooldown`` seconds; the first
+successful probe closes it again, so no user request is spent on finding
+out whether the endpoint recovered.
+
+The timeout follows observed latency: ``headroom`` times the ``percentile``
+of recent calls, clamped to [min_timeout, max_timeout]. A call that timed
+out counts as a ``max_timeout`` sample, so a slowing endpoint pushes the
+timeout back up instead of being cut off at a bound learned while it was
+fast. Until ``min_samples`` calls have been seen it is ``max_timeout``.
+"""
+import threading, time
+from collections import deque
+
+import numpy as np
+
+
+class LLMGuard:
+    def __init__(self, probe, max_timeout: float, min_timeout: float = 1.0, failure_threshold: int = 5,
+                 cooldown: float = 30.0, percentile: float = 99, headroom: float = 1.5,
+                 window: int = 200, min_samples: int = 20):
+        self.probe = probe  # raises unless the endpoint answered
+        self.max_timeout = float(max_timeout)
+        self.min_timeout = min(float(min_timeout), self.max_timeout)
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.cooldown = float(cooldown)
+        self.percentile = percentile
+        self.headroom = headroom
+        self.min_samples = min_samples
+        self.failures = 0
+        self.opened = 0
+        self.probes = 0
+        self._latencies = deque(maxlen=window)
+        self._timeout = self.max_timeout
+        self._open = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._prober = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._open
+
+    def allow(self) -> bool:
+        return not self._open
+
+    def timeout(self) -> float:
+        return self._timeout
+
+    def success(self, seconds: float):
+        with self._lock:
+            self.failures = 0
+            self._observe(seconds)
+
+    def failure(self, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self._observe(self.max_timeout)
+            self.failures += 1
+            if self._open or self.failures < self.failure_threshold:
+                return
+            self._open = True
+            self.opened += 1
+            if self._prober is None or not self._prober.is_alive():
+                self._prober = threading.Thread(target=self._probe_until_closed, daemon=True, name="llm-probe")
+                self._prober.start()
+        print(f"LLM circuit opened after {self.failure_threshold} consecutive failures; polishing paused.")
+
+    def _observe(self, seconds: float):
+        self._latencies.append(seconds)
+        if len(self._latencies) >= self.min_samples:
+            observed = float(np.percentile(self._latencies, self.percentile)) * self.headroom
+            self._timeout = min(max(observed, self.min_timeout), self.max_timeout)
+
+    def _probe_until_closed(self):
+        while not self._stop.wait(self.cooldown):
+            self.probes += 1
+            started = time.perf_counter()
+            try:
+                self.probe(self.max_timeout)
+            except Exception as e:
+                print("LLM probe failed; circuit stays open:", e)
+                continue
+            self.success(time.perf_counter() - started)
+            with self._lock:
+                self._open = False
+            print("LLM probe succeeded; circuit closed.")
+            return
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> dict:
+        return {
+            "open": self._open,
+            "timeout_s": round(self._timeout, 3),
+            "consecutive_failures": self.failures,
+            "times_opened": self.opened,
+            "probes": self.probes,
+            "samples": len(self._latencies),
+        }
@@ -1,12 +1,56 @@
-from fastapi import FastAPI
+import startup
+import json, os, threading, time
+from contextlib import asynccontextmanager
+
+from typing import List, Literal, Optional
+
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
-from agent import process_query
+from agent import (
+    abatch_query, answer_etag, aprocess_query, arender_plot, astream_query, datasets, llm_guard, render_pool, warm_up,
+    watcher,
+)
+import metrics
+import tracing
+from plot_store import MEDIA_TYPES
 
 load_dotenv()
 
-app = FastAPI(title="Titanic Chat Agent")
+# "lazy" starts answering at once and warms up in the background;
+# "eager" finishes every warm-up step before the first request.
+STARTUP_MODE = os.getenv("STARTUP_MODE", "eager")
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "3000"))
+# Where ``profile=folded`` requests write their flamegraph input.
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# How long browsers and CDNs may reuse a GET /chat answer before revalidating it.
+CHAT_MAX_AGE = int(os.getenv("CHAT_MAX_AGE", "60"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    charts = os.getenv("CHART_CACHE_WARM", "1") != "0"
+    if STARTUP_MODE == "lazy":
+        threading.Thread(target=warm_up, args=(charts,), daemon=True, name="warm-up").start()
+    else:
+        warm_up(charts)
+    startup.mark("ready")
+    report = startup.report(STARTUP_BUDGET_MS)
+    print("Startup phases (ms):", report["phases_ms"], "ready at", report["marks_ms"]["ready"])
+    if not report["within_budget"]:
+        print(f"Warning: startup exceeded the {STARTUP_BUDGET_MS:.0f} ms budget.")
+    watcher.start()
+    yield
+    watcher.stop()
+    llm_guard.stop()
+    render_pool.shutdown()
+
+
+app = FastAPI(title="Titanic Chat Agent", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -16,11 +60,192 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    with metrics.IN_FLIGHT.track():
+        response = await call_next(request)
+    # Label by route template so /plots/{digest} stays one series; streamed bodies count until headers are sent.
+    route = request.scope.get("route")
+    metrics.HTTP_SECONDS.labels(route.path if route else "unmatched").observe(time.perf_counter() - started)
+    startup.mark("first_response")
+    return response
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Latency histograms, LLM outcomes and cache hit rates in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/startup")
+async def startup_report():
+    """Start-up phase timings and whether the server was ready within STARTUP_BUDGET_MS."""
+    return startup.report(STARTUP_BUDGET_MS)
+
+
 class Question(BaseModel):
     question: str
+    mode: Literal["image", "spec"] = "image"
+    dataset: Optional[str] = None
+
+
+class QuestionBatch(BaseModel):
+    questions: List[str] = Field(..., min_length=1, max_length=int(os.getenv("BATCH_MAX_QUESTIONS", "100")))
+    mode: Literal["image", "spec"] = "image"
+    dataset: Optional[str] = None
+
+
+def _check_dataset(name: Optional[str]):
+    if name is not None and name not in datasets:
+        raise HTTPException(status_code=404, detail=f"Unknown dataset '{name}'")
+
+
+@app.get("/datasets")
+async def dataset_list():
+    """Registered datasets, which of them are loaded, and memory use against the budget."""
+    return datasets.stats()
+
+
+def _profile_mode(request: Request) -> Optional[str]:
+    """None, "tree" or "folded", from the ``profile`` query parameter or the X-Profile header."""
+    value = (request.query_params.get("profile") or request.headers.get("x-profile", "")).strip().lower()
+    if value in ("", "0", "false", "no", "off"):
+        return None
+    return "folded" if value == "folded" else "tree"
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match against ``etag``, with the weak comparison RFC 9110 prescribes for it."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+def _precondition(request: Request, etag: str, headers: dict) -> Optional[Response]:
+    """The response If-None-Match calls for, or None to go ahead: 304 for GET and HEAD,
+    412 for any other method (RFC 9110 section 13.1.2)."""
+    if not _etag_matches(request, etag):
+        return None
+    if request.method in ("GET", "HEAD"):
+        return Response(status_code=304, headers=headers)
+    return Response(status_code=412, headers=headers)
+
+
+async def _answer(question: str, mode: str, dataset: Optional[str], request: Request, cache_control: str):
+    _check_dataset(dataset)
+    profile = _profile_mode(request)
+    if profile is not None:
+        with tracing.trace(f"{request.method} /chat") as root:
+            result = await aprocess_query(question, mode, dataset)
+        result["profile"] = root.to_dict()
+        if profile == "folded":
+            result["profile"]["folded_path"] = tracing.dump_folded(root, PROFILE_DIR)
+        return JSONResponse(jsonable_encoder(result), headers={"Cache-Control": "no-store"})
+
+    etag = await run_in_threadpool(answer_etag, question, mode, dataset)  # may load the dataset
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "X-Profile"}
+    precondition = _precondition(request, etag, headers)
+    if precondition is not None:
+        if precondition.status_code == 304:
+            metrics.CHAT_NOT_MODIFIED.labels(request.method).inc()
+        return precondition
+    return JSONResponse(jsonable_encoder(await aprocess_query(question, mode, dataset)), headers=headers)
 
 
 @app.post("/chat")
-def chat(q: Question):
-    result = process_query(q.question)
-    return result
+async def chat(q: Question, request: Request):
+    """Answer a question. The ETag covers the question, dataset version and mode; revalidate
+    with GET /chat and If-None-Match to get a 304 without the pipeline running (a POST whose
+    If-None-Match matches gets 412, as HTTP requires for unsafe methods).
+
+    With ``?profile=1`` (or ``X-Profile: 1``) the response carries a timing tree of the request
+    instead; ``profile=folded`` also writes it to PROFILE_DIR as folded stacks."""
+    return await _answer(q.question, q.mode, q.dataset, request, "private, no-cache")
+
+
+@app.get("/chat")
+async def chat_get(request: Request, question: str, mode: Literal["image", "spec"] = "image",
+                   dataset: Optional[str] = None):
+    """/chat for GET, so browsers and CDNs can cache answers for CHAT_MAX_AGE seconds and then revalidate."""
+    return await _answer(question, mode, dataset, request, f"public, max-age={CHAT_MAX_AGE}")
+
+
+@app.post("/chat/batch")
+async def chat_batch(b: QuestionBatch):
+    _check_dataset(b.dataset)
+    return {"results": await abatch_query(b.questions, b.mode, b.dataset)}
+
+
+@app.post("/chat/stream")
+async def chat_stream(q: Question):
+    """Server-Sent Events version of /chat: raw, token*, answer, plot or chart, done."""
+    _check_dataset(q.dataset)
+    etag = await run_in_threadpool(answer_etag, q.question, q.mode, q.dataset)
+
+    async def events():
+        async for event, payload in astream_query(q.question, q.mode, q.dataset):
+            yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # The ETag lets a client keep the streamed answer and revalidate it later with GET /chat.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "ETag": etag},
+    )
+
+
+# Smallest payload first: the tie-break among formats the client accepts equally.
+_FORMAT_PREFERENCE = ("webp", "png", "svg")
+
+
+def _negotiate_format(accept: str) -> str:
+    """The format with the highest q-value in ``accept``; equal q-values go by size, webp before png
+    before svg. An exact media type beats ``image/*``, which beats ``*/*``. png when nothing matches."""
+    quality = {}
+    for part in accept.lower().split(","):
+        media, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if media:
+            quality[media] = max(q, quality.get(media, 0.0))
+
+    def q_for(fmt):
+        media = MEDIA_TYPES[fmt]
+        return quality.get(media, quality.get("image/*", quality.get("*/*", 0.0)))
+
+    (q, _), fmt = max(((q_for(fmt), -rank), fmt) for rank, fmt in enumerate(_FORMAT_PREFERENCE))
+    return fmt if q > 0 else "png"
+
+
+@app.get("/plots/{digest}")
+async def plot(digest: str, request: Request, format: Optional[str] = None, dpi: Optional[int] = None):
+    """A published chart; ``format`` (png, webp, svg) or the Accept header picks the encoding."""
+    fmt = (format or _negotiate_format(request.headers.get("accept", ""))).lower()
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported format '{fmt}'.")
+    if dpi is not None:
+        dpi = min(max(dpi, 50), 300)
+
+    etag = f'"{digest}-{fmt}-{dpi or 0}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Vary": "Accept",
+    }
+    precondition = _precondition(request, etag, headers)
+    if precondition is not None:
+        return precondition
+
+    content = await arender_plot(digest, fmt, dpi)
+    if content is None:
+        raise HTTPException(status_code=404, detail="Plot not found.")
+    return Response(content, media_type=MEDIA_TYPES[fmt], headers=headers)
@@ -0,0 +1,199 @@
+"""Process-wide counters, gauges and histograms in the Prometheus text format.
+
+Recording is a dict lookup plus a few additions under a per-series lock, so
+it is cheap enough for the request path. Everything is formatted only when
+/metrics is scraped. Values that already live elsewhere (cache hit counts,
+dataset sizes) are read at scrape time through ``register_collector`` rather
+than mirrored on every request.
+"""
+import bisect, threading, time
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BYTES_BUCKETS = (1024, 4096, 16384, 32768, 65536, 131072, 262144, 524288, 1048576)
+
+_metrics = []
+_collectors = []
+
+
+def _escape(value) -> str:
+    """A label value as the text format needs it: backslash, double quote and newline escaped."""
+    return str(value).replace("\\", r"\\").replace('"', r'\"').replace("\n", r"\n")
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _header(self, name=None):
+        name = name or self.name
+        return [f"# HELP {name} {self.help}", f"# TYPE {name} {self.kind}"]
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+    _new_child = _Value
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def render(self):
+        lines = self._header(f"{self.name}_total")
+        for values, child in list(self._children.items()):
+            lines.append(f"{self.name}_total{_format_labels(self.labelnames, values)} {_format_value(child.value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    @contextmanager
+    def track(self, *values):
+        child = self.labels(*values)
+        child.inc()
+        try:
+            yield
+        finally:
+            child.dec()
+
+    def render(self):
+        lines = self._header()
+        for values, child in list(self._children.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}")
+        return lines
+
+
+class _Buckets:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self):
+        return _Buckets(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def render(self):
+        lines = self._header()
+        for values, child in list(self._children.items()):
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def register_collector(collect):
+    """``collect()`` returns [(name, kind, help, [(labels dict, value), ...]), ...] at scrape time."""
+    _collectors.append(collect)
+
+
+def render() -> str:
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for collect in _collectors:
+        try:
+            families = collect()
+        except Exception as e:
+            print("Metrics collector failed:", e)
+            continue
+        for name, kind, help, samples in families:
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels, labels.values())} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+HTTP_SECONDS = Histogram("titanic_http_request_duration_seconds", "HTTP request latency by route.", ("route",))
+IN_FLIGHT = Gauge("titanic_requests_in_flight", "HTTP requests currently being served.")
+HANDLER_SECONDS = Histogram("titanic_handler_duration_seconds", "Intent handler latency, chart cache hits included.",
+                            ("handler",))
+STAGE_SECONDS = Histogram("titanic_stage_duration_seconds",
+                          "Pipeline stage latency: match, compute, render, encode, polish.", ("stage",))
+LLM_CALLS = Counter("titanic_llm_calls",
+                    "LLM polishing attempts by outcome: ok, cached, timeout, error, circuit_open, over_budget.",
+                    ("outcome",))
+CHAT_NOT_MODIFIED = Counter("titanic_chat_not_modified", "/chat answers revalidated with a 304 instead of recomputed.",
+                            ("method",))
+PLOT_BYTES = Histogram("titanic_plot_bytes", "Size of rendered charts.", ("format",), buckets=BYTES_BUCKETS)
@@ -0,0 +1,123 @@
+"""Bitmap indexes against pandas boolean masks for filtered aggregates.
+
+For each row count, a typed frame is built: the real 891 rows, or
+synthetic rows from ``perf.synth_titanic`` for the larger sizes. The
+benchmark then answers conjunctions of one to four equality filters both
+ways:
+- mask: ``(df[col] == value)`` per filter, ANDed, then ``sum()`` for the
+  count and ``nansum`` of the fares under the mask;
+- bitmap: AND of the index bitsets, popcount for the count, and a dot
+  product of the unpacked bitset with the fares for the sum.
+It also times whole ``query_plan.run`` answers with and without the
+index, and reports index build time and size next to the frame's.
+
+    python -m perf.bench_bitmap --rows 891,100000,1000000,5000000 --out bench_bitmap.json
+"""
+import argparse, json, time
+import numpy as np
+import pandas as pd
+
+import bitmap_index
+import dataset_loader
+import query_plan
+from perf.synth_titanic import synth_chunks
+
+CONJUNCTIONS = (
+    (("sex", "female"),),
+    (("sex", "female"), ("class", "Third")),
+    (("sex", "female"), ("class", "Third"), ("embark_town", "Southampton")),
+    (("sex", "male"), ("class", "First"), ("embark_town", "Cherbourg"), ("alone", True)),
+)
+QUESTIONS = (
+    "how many women in 3rd class survived",
+    "average fare of women in 3rd class who embarked at southampton",
+    "survival rate of children by class",
+    "number of men travelling alone by port",
+)
+
+
+def frame(rows, seed=0):
+    if rows == 891:
+        return dataset_loader.load_dataset()
+    # Typing each chunk first keeps the strings of millions of rows from all being alive at once.
+    chunks = [dataset_loader.to_typed(chunk) for chunk in synth_chunks(rows, seed)]
+    return dataset_loader.to_typed(pd.concat(chunks, ignore_index=True))
+
+
+def _median_us(fn, repeats):
+    fn()
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return round(float(np.median(samples)) * 1e6, 1)
+
+
+def bench(rows, repeats):
+    df = frame(rows)
+    t0 = time.perf_counter()
+    index = bitmap_index.build(df)
+    build = time.perf_counter() - t0
+    fare = df["fare"].to_numpy(dtype=float, na_value=np.nan)
+
+    def mask(pairs):
+        out = np.ones(len(df), dtype=bool)
+        for column, value in pairs:
+            out &= (df[column] == value).to_numpy(dtype=bool)
+        return out
+
+    conjunctions = []
+    for pairs in CONJUNCTIONS:
+        expected = int(mask(pairs).sum())
+        assert index.count(index.select(pairs)) == expected
+        conjunctions.append({
+            "filters": len(pairs),
+            "matches": expected,
+            "mask_count_us": _median_us(lambda: int(mask(pairs).sum()), repeats),
+            "bitmap_count_us": _median_us(lambda: index.count(index.select(pairs)), repeats),
+            "mask_sum_us": _median_us(lambda: float(np.nansum(fare[mask(pairs)])), repeats),
+            "bitmap_sum_us": _median_us(lambda: index.sum(index.select(pairs), "fare"), repeats),
+        })
+
+    planner, plans = query_plan.QueryPlanner(), []
+    for question in QUESTIONS:
+        plan = planner.plan(question)
+        assert query_plan.run(plan, df) == query_plan.run(plan, df, index)
+        plans.append({
+            "question": question,
+            "frame_us": _median_us(lambda: query_plan.run(plan, df), repeats),
+            "index_us": _median_us(lambda: query_plan.run(plan, df, index), repeats),
+        })
+    return {
+        "rows": rows,
+        "frame_mb": round(df.memory_usage(deep=True).sum() / 2 ** 20, 2),
+        "index_mb": round(index.nbytes / 2 ** 20, 3),
+        "indexed_columns": index.stats()["columns"],
+        "build_ms": round(build * 1000, 2),
+        "conjunctions": conjunctions,
+        "plans": plans,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark bitmap indexes against pandas masks.")
+    parser.add_argument("--rows", default="891,100000,1000000", help="comma-separated row counts")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--out", default="bench_bitmap.json")
+    args = parser.parse_args()
+
+    report = []
+    for rows in [int(x) for x in args.rows.split(",")]:
+        result = bench(rows, args.repeats)
+        report.append(result)
+        print(f"{rows:>9,d} rows  frame {result['frame_mb']:8.2f} MB  index {result['index_mb']:7.3f} MB  "
+              f"build {result['build_ms']:8.2f} ms")
+        for c in result["conjunctions"]:
+            print(f"    {c['filters']} filters  count: mask {c['mask_count_us']:9.1f} us  bitmap {c['bitmap_count_us']:9.1f} us"
+                  f"   +fare sum: mask {c['mask_sum_us']:9.1f} us  bitmap {c['bitmap_sum_us']:9.1f} us")
+        for p in result["plans"]:
+            print(f"    plan  frame {p['frame_us']:9.1f} us  index {p['index_us']:9.1f} us  {p['question']}")
+    with open(args.out, "w") as fh:
+        json.dump(report, fh, indent=2)
+    print("Wrote", args.out)
@@ -0,0 +1,214 @@
+"""Micro-benchmarks for every intent handler, with the LLM stubbed out.
+
+For each handler in INTENT_MAP plus the ``_general_stats`` fallback this
+times the pipeline phases separately:
+- match: intent classification;
+- compute: the handler itself, which builds the text and chart spec;
+- render: drawing the chart;
+- encode: PNG encoding plus JSON encoding of the response.
+It also times ``_detect_and_run`` and ``process_query`` end to end, both
+with cold caches and with warm ones. A separate pass under tracemalloc
+records peak memory and allocations. Results are written as JSON; pass
+``--compare`` with an earlier file to flag regressions.
+
+    python -m perf.bench_handlers --out bench.json
+    python -m perf.bench_handlers --out new.json --compare bench.json
+"""
+import os
+
+os.environ.setdefault("RENDER_WORKERS", "0")  # render in-process so render time is measurable
+os.environ.setdefault("ANSWER_CACHE_PATH", "")
+os.environ.setdefault("CHART_CACHE_WARM", "0")
+
+import argparse, json, platform, sys, time, tracemalloc
+import matplotlib
+import numpy as np
+import pandas
+
+import agent
+import renderer
+from answer_cache import AnswerCache
+from intent_matcher import Classification
+
+# One representative question per handler; the JSON records where each one is actually routed.
+QUESTIONS = {
+    "_age_histogram": "Show me a histogram of passenger ages",
+    "_fare_histogram": "Show the fare distribution",
+    "_embark_chart": "How many passengers embarked from each port?",
+    "_class_chart": "How many passengers were in each class?",
+    "_survival_by_gender": "What was the survival rate by gender?",
+    "_survival_by_class": "Survival by class",
+    "_age_by_class": "Compare age across each class",
+    "_fare_by_class": "Compare fare across each class",
+    "_male_percentage": "What percentage of passengers were male?",
+    "_female_percentage": "What percentage of passengers were female?",
+    "_avg_fare": "What was the average fare?",
+    "_avg_age": "What was the average age?",
+    "_survival_count": "How many passengers survived?",
+    "_total_passengers": "Total passengers",
+    "_general_stats": "Tell me about the dataset",
+}
+PERCENTILES = (50, 95, 99)
+
+
+class StubChain:
+    """Stands in for the LangChain response chain: a fixed delay, then an echo."""
+
+    def __init__(self, delay_ms=0.0):
+        self.delay = delay_ms / 1000
+
+    def invoke(self, inputs):
+        if self.delay:
+            time.sleep(self.delay)
+        return f"Here is what the data says: {inputs['result']}"
+
+
+def _summary(samples_ms):
+    arr = np.asarray(samples_ms, dtype=float)
+    out = {f"p{p}": round(float(np.percentile(arr, p)), 4) for p in PERCENTILES}
+    out["mean"] = round(float(arr.mean()), 4)
+    return out
+
+
+def _timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - t0) * 1000
+
+
+def _cold():
+    """Forget every cached chart and polished answer."""
+    agent.current_dataset().charts.clear()
+    agent.answer_cache = AnswerCache(db_path=None)
+
+
+def _pinned(fn, *args):
+    token = agent._active_dataset.set(agent.current_dataset())
+    try:
+        return fn(*args)
+    finally:
+        agent._active_dataset.reset(token)
+
+
+def _handlers():
+    handlers = {h.__name__: h for _, _, h in agent.INTENT_MAP}
+    handlers["_general_stats"] = agent._general_stats
+    return handlers
+
+
+def bench_handler(name, handler, question, iterations):
+    if name == "_general_stats":
+        match = Classification("fallback", None, None)
+    else:
+        match = Classification("intent", None, handler)
+    raw = getattr(handler, "__wrapped__", handler)  # chart handlers: bypass the chart cache
+    phases = {"match": [], "compute": [], "render": [], "encode": []}
+    detect_cold, process_cold, process_warm = [], [], []
+    payload = {}
+
+    for _ in range(iterations):
+        phases["match"].append(_timed(agent._matcher.classify, question)[1])
+        (text, spec), ms = _timed(_pinned, raw)
+        phases["compute"].append(ms)
+        png = b""
+        if spec is not None:
+            fig, ms = _timed(renderer.draw_spec, spec)
+            phases["render"].append(ms)
+            png, png_ms = _timed(renderer._fig_to_bytes, fig, agent.PLOT_FORMAT, agent.PLOT_DPI)
+        else:
+            png_ms = 0.0
+        body, json_ms = _timed(json.dumps, agent._response(text, "/plots/" + "0" * 32 if png else None))
+        phases["encode"].append(png_ms + json_ms)
+        payload = {"json_bytes": len(body), "png_bytes": len(png),
+                   "spec_bytes": len(json.dumps(spec)) if spec is not None else 0}
+
+        _cold()
+        detect_cold.append(_timed(agent._detect_and_run, question, match)[1])
+        _cold()
+        process_cold.append(_timed(agent.process_query, question)[1])
+        process_warm.append(_timed(agent.process_query, question)[1])
+
+    _cold()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    agent.process_query(question)
+    after = tracemalloc.take_snapshot()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    grown = [s for s in after.compare_to(before, "filename") if s.size_diff > 0]
+
+    routed = agent._matcher.classify(question)
+    return {
+        "question": question,
+        "routed_to": routed.handler.__name__ if routed.handler else "_general_stats",
+        "phases_ms": {phase: _summary(s) for phase, s in phases.items() if s},
+        "detect_and_run_cold_ms": _summary(detect_cold),
+        "process_query_cold_ms": _summary(process_cold),
+        "process_query_warm_ms": _summary(process_warm),
+        "peak_memory_kb": round(peak / 1024, 1),
+        "allocated_kb": round(sum(s.size_diff for s in grown) / 1024, 1),
+        "allocated_blocks": sum(max(s.count_diff, 0) for s in grown),
+        "payload": payload,
+    }
+
+
+def run(iterations, llm_ms):
+    agent.ensure_dataset()
+    agent.HF_TOKEN = agent.HF_TOKEN or "benchmark"
+    agent.response_chain, agent._chain_built = StubChain(llm_ms), True
+    renderer.warm_up()
+    handlers = _handlers()
+    results = {}
+    for name, question in QUESTIONS.items():
+        results[name] = bench_handler(name, handlers[name], question, iterations)
+        print(f"{name:22s} cold p50 {results[name]['process_query_cold_ms']['p50']:8.2f} ms   "
+              f"warm p50 {results[name]['process_query_warm_ms']['p50']:6.3f} ms")
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "iterations": iterations,
+            "llm_stub_ms": llm_ms,
+            "dataset_version": agent.current_dataset().version,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pandas.__version__,
+            "matplotlib": matplotlib.__version__,
+            "machine": platform.machine(),
+        },
+        "handlers": results,
+    }
+
+
+def compare(current, baseline, threshold, min_delta_ms):
+    """Print p50s that grew by more than ``threshold`` (a fraction) and ``min_delta_ms``; returns the count."""
+    regressions = 0
+    for name, result in current["handlers"].items():
+        old = baseline.get("handlers", {}).get(name)
+        if old is None:
+            continue
+        for metric in ("process_query_cold_ms", "process_query_warm_ms", "detect_and_run_cold_ms"):
+            before, now = old[metric]["p50"], result[metric]["p50"]
+            if before and now > before * (1 + threshold) and now - before > min_delta_ms:
+                regressions += 1
+                print(f"REGRESSION {name} {metric}: p50 {before:.3f} -> {now:.3f} ms")
+    print(f"{regressions} regression(s) beyond {threshold:.0%}.")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every intent handler with the LLM stubbed.")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--llm-ms", type=float, default=0.0, help="simulated LLM latency per call")
+    parser.add_argument("--out", default="bench_handlers.json")
+    parser.add_argument("--compare", help="earlier results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--min-delta-ms", type=float, default=0.5, help="ignore smaller p50 changes as noise")
+    args = parser.parse_args()
+
+    report = run(args.iterations, args.llm_ms)
+    with open(args.out, "w") as fh:
+        json.dump(report, fh, indent=2)
+    print("Wrote", args.out)
+    if args.compare:
+        with open(args.compare) as fh:
+            sys.exit(1 if compare(report, json.load(fh), args.threshold, args.min_delta_ms) else 0)
@@ -0,0 +1,137 @@
+"""Routing latency and accuracy of the fuzzy intent router at scale.
+
+Builds a ``FuzzyRouter`` over thousands of synthetic intents. Each one has
+a few topic words from a generated vocabulary of ``--vocab`` pseudo-words,
+and its phrasings mix those with filler from a short list of dataset words
+that every intent shares. It then routes typo-laden variants of the
+phrasings: one dropped, doubled, swapped or replaced letter per word, with
+probability ``--typo-rate``. Reports build time, matrix size,
+per-question latency percentiles and top-1 accuracy for each intent count,
+plus the latency of the app's own router on its real examples.
+
+    python -m perf.bench_router --intents 1000,5000,10000 --out bench_router.json
+"""
+import os
+
+os.environ.setdefault("ANSWER_CACHE_PATH", "")
+
+import argparse, json, random, string, time
+import numpy as np
+
+from intent_matcher import FuzzyRouter
+
+WORDS = (
+    "passenger fare ticket price class cabin deck age survival survived rate count average mean median share "
+    "percentage women men children crew port embark town southampton cherbourg queenstown sibling spouse parent "
+    "alone family size group compare distribution histogram chart plot total number first second third tier "
+    "lifeboat night voyage cost paid oldest youngest adult infant title name boarding ratio odds"
+).split()
+
+
+def _typo(word, rng):
+    if len(word) < 3:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    kind = rng.choice(("drop", "double", "swap", "replace"))
+    if kind == "drop":
+        return word[:i] + word[i + 1:]
+    if kind == "double":
+        return word[:i] + word[i] + word[i:]
+    if kind == "swap":
+        return word[:i - 1] + word[i] + word[i - 1] + word[i + 1:]
+    return word[:i] + rng.choice(string.ascii_lowercase) + word[i + 1:]
+
+
+def pseudo_words(n, rng):
+    consonants, vowels = "bcdfghklmnprstvz", "aeiou"
+    words = set()
+    while len(words) < n:
+        words.add("".join(rng.choice(consonants) + rng.choice(vowels) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def synthetic_examples(n_intents, per_intent, vocab, rng):
+    """(intent id, phrasing) pairs; each intent has topic words its phrasings share, plus common filler."""
+    topics = pseudo_words(vocab, rng)
+    examples = []
+    for intent in range(n_intents):
+        topic = rng.sample(topics, 2) + rng.sample(WORDS, 1)
+        for _ in range(per_intent):
+            words = topic + rng.sample(WORDS, rng.randint(1, 3))
+            rng.shuffle(words)
+            examples.append((intent, " ".join(words)))
+    return examples
+
+
+def _percentiles_us(samples):
+    arr = np.asarray(samples) * 1e6
+    return {f"p{p}": round(float(np.percentile(arr, p)), 1) for p in (50, 95, 99)}
+
+
+def bench(n_intents, per_intent, vocab, queries, typo_rate, threshold, rng):
+    examples = synthetic_examples(n_intents, per_intent, vocab, rng)
+    t0 = time.perf_counter()
+    router = FuzzyRouter(examples, threshold=threshold, margin=0.0)
+    build = time.perf_counter() - t0
+
+    latencies, correct, routed = [], 0, 0
+    for intent, text in rng.sample(examples, min(queries, len(examples))):
+        question = " ".join(_typo(w, rng) if rng.random() < typo_rate else w for w in text.split())
+        t0 = time.perf_counter()
+        picked, _ = router.route(question)
+        latencies.append(time.perf_counter() - t0)
+        routed += picked is not None
+        # Synthetic intents can share phrasings word for word, so count a tie with the true intent as correct.
+        if picked is not None:
+            scores = router.scores(question)
+            correct += scores[router.intents.index(intent)] >= scores.max() - 1e-6
+    return {
+        "intents": n_intents,
+        "phrasings": len(examples),
+        "vocabulary": len(router._vocab),
+        "matrix_nonzeros": int(len(router._col_rows)),
+        "matrix_mb": round(sum(a.nbytes for a in (router._col_rows, router._col_weights, router._col_ptr, router._row_cols,
+                                                  router._row_weights, router._row_ptr)) / 2 ** 20, 2),
+        "build_s": round(build, 3),
+        "route_us": _percentiles_us(latencies),
+        "routed_share": round(routed / len(latencies), 4),
+        "top1_accuracy": round(correct / max(routed, 1), 4),
+    }
+
+
+def bench_app_router(repeats):
+    import agent
+    questions = [text for texts in agent.INTENT_EXAMPLES.values() for text in texts]
+    latencies = []
+    for _ in range(repeats):
+        for question in questions:
+            t0 = time.perf_counter()
+            agent._router.route(question)
+            latencies.append(time.perf_counter() - t0)
+    return {"intents": len(agent._router), "phrasings": len(questions), "route_us": _percentiles_us(latencies)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the fuzzy intent router with many intents.")
+    parser.add_argument("--intents", default="1000,5000,10000", help="comma-separated intent counts")
+    parser.add_argument("--per-intent", type=int, default=4, help="phrasings per intent")
+    parser.add_argument("--vocab", type=int, default=5000, help="distinct topic words across all intents")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--typo-rate", type=float, default=0.3)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_router.json")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    report = {"app": bench_app_router(20), "synthetic": []}
+    print(f"app router: {report['app']['intents']} intents, p50 {report['app']['route_us']['p50']} us")
+    for n in [int(x) for x in args.intents.split(",")]:
+        result = bench(n, args.per_intent, args.vocab, args.queries, args.typo_rate, args.threshold, rng)
+        report["synthetic"].append(result)
+        print(f"{n:6d} intents  build {result['build_s']:6.2f} s  route p50 {result['route_us']['p50']:7.1f} us  "
+              f"p99 {result['route_us']['p99']:7.1f} us  routed {result['routed_share']:.1%}  "
+              f"top-1 {result['top1_accuracy']:.1%}")
+    with open(args.out, "w") as fh:
+        json.dump(report, fh, indent=2)
+    print("Wrote", args.out)
@@ -0,0 +1,111 @@
+"""A local stand-in for the HuggingFace text-generation endpoint.
+
+Speaks the text-generation protocol ``HuggingFaceEndpoint`` uses when it is
+given an ``endpoint_url``: POST {"inputs", "parameters", "stream"} and get
+back [{"generated_text"}], or server-sent token events when streaming.
+Latency, jitter, error rate and the share of requests that hang past any
+sane timeout are configurable, so /chat can be load-tested offline.
+
+    python -m perf.fake_hf_server --port 8010 --latency-ms 800 --error-rate 0.02 --hang-rate 0.01
+    HF_ENDPOINT_URL=http://127.0.0.1:8010 HUGGINGFACEHUB_API_TOKEN=fake uvicorn main:app
+
+GET /stats returns request, error and hang counts.
+"""
+import argparse, asyncio, json, random, re
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class FakeConfig:
+    latency_ms = 500.0
+    jitter_ms = 100.0
+    error_rate = 0.0
+    hang_rate = 0.0
+    hang_seconds = 120.0
+    tokens_per_second = 40.0
+
+
+config = FakeConfig()
+counters = {"requests": 0, "streamed": 0, "errors": 0, "hangs": 0, "completed": 0}
+app = FastAPI(title="Fake HF text-generation endpoint")
+
+
+def _reply(prompt: str) -> str:
+    """Echo the computed result the prompt carries, the way the real model restates it."""
+    match = re.search(r"Computed result:\s*(.*?)\s*Your response:", prompt, re.S)
+    result = match.group(1) if match else "the computed result"
+    return f"Based on the Titanic data, {result[0].lower() + result[1:] if result else result}"
+
+
+async def _delay():
+    jitter = random.uniform(-config.jitter_ms, config.jitter_ms)
+    await asyncio.sleep(max(0.0, config.latency_ms + jitter) / 1000)
+
+
+@app.get("/stats")
+async def stats():
+    return counters
+
+
+@app.post("/reset")
+async def reset():
+    for key in counters:
+        counters[key] = 0
+    return counters
+
+
+@app.post("/{path:path}")
+async def generate(request: Request, path: str = ""):
+    body = await request.json()
+    counters["requests"] += 1
+    roll = random.random()
+    if roll < config.hang_rate:
+        counters["hangs"] += 1
+        await asyncio.sleep(config.hang_seconds)
+    elif roll < config.hang_rate + config.error_rate:
+        counters["errors"] += 1
+        await _delay()
+        return JSONResponse({"error": "Model is overloaded"}, status_code=503)
+
+    text = _reply(body.get("inputs", ""))
+    if not body.get("stream"):
+        await _delay()
+        counters["completed"] += 1
+        return [{"generated_text": text}]
+
+    counters["streamed"] += 1
+    tokens = re.findall(r"\S+\s*", text)
+
+    async def events():
+        await _delay()  # time to first token
+        for i, token in enumerate(tokens):
+            last = i == len(tokens) - 1
+            yield "data:" + json.dumps({
+                "index": i,
+                "token": {"id": i, "text": token, "logprob": 0.0, "special": False},
+                "generated_text": text if last else None,
+                "details": None,
+            }) + "\n\n"
+            await asyncio.sleep(1 / config.tokens_per_second)
+        counters["completed"] += 1
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake HuggingFace text-generation endpoint.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--latency-ms", type=float, default=config.latency_ms, help="mean time to first token")
+    parser.add_argument("--jitter-ms", type=float, default=config.jitter_ms)
+    parser.add_argument("--error-rate", type=float, default=config.error_rate, help="share of requests answered 503")
+    parser.add_argument("--hang-rate", type=float, default=config.hang_rate, help="share of requests that never answer in time")
+    parser.add_argument("--hang-seconds", type=float, default=config.hang_seconds)
+    parser.add_argument("--tokens-per-second", type=float, default=config.tokens_per_second)
+    args = parser.parse_args()
+    for name in ("latency_ms", "jitter_ms", "error_rate", "hang_rate", "hang_seconds", "tokens_per_second"):
+        setattr(config, name, getattr(args, name))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,157 @@
+"""Open-loop load generator for the chat API.
+
+Requests start at a fixed rate (Poisson arrivals), whether or not earlier ones
+have finished, so queueing shows up in the latencies rather than being
+hidden by a slow client. Each step reports throughput, tail latency and the
+share of requests that errored or hit the client timeout. Run several rates
+in one go to find where latency turns over.
+
+    python -m perf.fake_hf_server --latency-ms 800 --hang-rate 0.02 &
+    HF_ENDPOINT_URL=http://127.0.0.1:8010 HUGGINGFACEHUB_API_TOKEN=fake LLM_TIMEOUT=5 uvicorn main:app &
+    python -m perf.load_test --rates 5,10,20,40 --duration 30 --fake-url http://127.0.0.1:8010
+
+--mix takes a JSON file of {question: weight}; the default mix is below. The
+answer cache serves repeated questions without the LLM; --unique defeats it.
+"""
+import argparse, asyncio, json, random, time
+import httpx
+import numpy as np
+
+DEFAULT_MIX = {
+    "How many passengers survived?": 4,
+    "What was the average fare?": 3,
+    "What percentage of passengers were male?": 3,
+    "What was the survival rate by gender?": 2,
+    "Show me a histogram of passenger ages": 2,
+    "How many passengers were in each class?": 1,
+    "Tell me about the dataset": 1,
+    "Were there aliens on board?": 1,
+}
+
+
+def _percentiles(samples):
+    if not samples:
+        return {}
+    arr = np.asarray(samples) * 1000
+    return {"p50": round(float(np.percentile(arr, 50)), 1), "p95": round(float(np.percentile(arr, 95)), 1),
+            "p99": round(float(np.percentile(arr, 99)), 1), "max": round(float(arr.max()), 1)}
+
+
+async def _one(client, endpoint, question, sent_as, mode, timeout, outcome):
+    t0 = time.perf_counter()
+    try:
+        if endpoint.endswith("/stream"):
+            first = None
+            async with client.stream("POST", endpoint, json={"question": sent_as, "mode": mode},
+                                     timeout=timeout) as resp:
+                async for _ in resp.aiter_bytes():
+                    first = first or time.perf_counter() - t0
+                status = resp.status_code
+            outcome["first_byte"].append(first or time.perf_counter() - t0)
+        else:
+            resp = await client.post(endpoint, json={"question": sent_as, "mode": mode}, timeout=timeout)
+            status = resp.status_code
+        elapsed = time.perf_counter() - t0
+        if status >= 400:
+            outcome["errors"] += 1
+        else:
+            outcome["latency"].append(elapsed)
+            outcome["by_question"].setdefault(question, []).append(elapsed)
+    except httpx.TimeoutException:
+        outcome["timeouts"] += 1
+    except httpx.HTTPError:
+        outcome["errors"] += 1
+
+
+async def run_step(url, endpoint, rate, duration, mix, mode, timeout, max_in_flight, unique=False):
+    questions, weights = list(mix), list(mix.values())
+    outcome = {"latency": [], "first_byte": [], "by_question": {}, "errors": 0, "timeouts": 0, "dropped": 0}
+    limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+    async with httpx.AsyncClient(base_url=url, limits=limits) as client:
+        tasks, in_flight = [], asyncio.Semaphore(max_in_flight)
+        start = time.perf_counter()
+        next_at = start
+        while next_at - start < duration:
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            if in_flight.locked():
+                outcome["dropped"] += 1  # the client itself is saturated; count rather than queue
+            else:
+                question = random.choices(questions, weights)[0]
+                sent_as = f"{question} (request {len(tasks)})" if unique else question
+
+                async def request(question=question, sent_as=sent_as):
+                    async with in_flight:
+                        await _one(client, endpoint, question, sent_as, mode, timeout, outcome)
+
+                tasks.append(asyncio.create_task(request()))
+            next_at += random.expovariate(rate)
+        await asyncio.gather(*tasks)
+        wall = time.perf_counter() - start
+
+    sent = len(tasks)
+    report = {
+        "target_rps": rate,
+        "sent": sent,
+        "completed": len(outcome["latency"]),
+        "throughput_rps": round(len(outcome["latency"]) / wall, 2),
+        "error_rate": round(outcome["errors"] / sent, 4) if sent else 0.0,
+        "timeout_rate": round(outcome["timeouts"] / sent, 4) if sent else 0.0,
+        "dropped_by_client": outcome["dropped"],
+        "latency_ms": _percentiles(outcome["latency"]),
+        "by_question_p50_ms": {q: _percentiles(s)["p50"] for q, s in outcome["by_question"].items()},
+    }
+    if outcome["first_byte"]:
+        report["first_byte_ms"] = _percentiles(outcome["first_byte"])
+    return report
+
+
+async def _fake_server(fake_url, method, path):
+    async with httpx.AsyncClient(base_url=fake_url) as client:
+        return (await client.request(method, path)).json()
+
+
+async def main(args):
+    mix = DEFAULT_MIX
+    if args.mix:
+        with open(args.mix) as fh:
+            mix = json.load(fh)
+    steps = []
+    for rate in [float(r) for r in args.rates.split(",")]:
+        if args.fake_url:
+            await _fake_server(args.fake_url, "POST", "/reset")
+        step = await run_step(args.url, args.endpoint, rate, args.duration, mix, args.mode,
+                              args.timeout, args.max_in_flight, args.unique)
+        if args.fake_url:
+            # Requests the fake LLM hung on are ones the agent answered unpolished after LLM_TIMEOUT.
+            llm = await _fake_server(args.fake_url, "GET", "/stats")
+            step["llm"] = {**llm, "hang_rate": round(llm["hangs"] / llm["requests"], 4) if llm["requests"] else 0.0,
+                           "error_rate": round(llm["errors"] / llm["requests"], 4) if llm["requests"] else 0.0}
+        steps.append(step)
+        lat = step["latency_ms"]
+        print(f"{rate:7.1f} rps target  {step['throughput_rps']:7.2f} rps done  "
+              f"p50 {lat.get('p50', 0):8.1f}  p95 {lat.get('p95', 0):8.1f}  p99 {lat.get('p99', 0):8.1f} ms  "
+              f"errors {step['error_rate']:.2%}  timeouts {step['timeout_rate']:.2%}")
+    report = {"url": args.url, "endpoint": args.endpoint, "mode": args.mode, "duration_s": args.duration,
+              "timeout_s": args.timeout, "mix": mix, "steps": steps}
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump(report, fh, indent=2)
+        print("Wrote", args.out)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive the chat API at fixed request rates.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoint", default="/chat", choices=["/chat", "/chat/stream"])
+    parser.add_argument("--mode", default="image", choices=["image", "spec"])
+    parser.add_argument("--rates", default="5,10,20", help="comma-separated requests per second, one step each")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per step")
+    parser.add_argument("--timeout", type=float, default=30.0, help="client timeout per request, seconds")
+    parser.add_argument("--max-in-flight", type=int, default=256)
+    parser.add_argument("--mix", help="JSON file of {question: weight}")
+    parser.add_argument("--unique", action="store_true",
+                        help="make every question distinct so the answer cache never hits and each one reaches the LLM")
+    parser.add_argument("--fake-url", help="fake HF server to read LLM error and hang counts from")
+    parser.add_argument("--out", help="write the report as JSON")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,52 @@
+"""Synthetic passenger CSVs with the titanic.csv schema, for scale testing.
+
+Rows are resampled from the real dataset with age and fare jittered, so
+distributions and group rates stay realistic. The file is written in chunks,
+so generating 100M rows needs no more memory than generating 1M.
+
+    python -m perf.synth_titanic --rows 10000000 --out /tmp/titanic_10m.csv
+    python streaming.py /tmp/titanic_10m.csv
+"""
+import argparse, os, time
+import numpy as np
+import pandas as pd
+
+import dataset_loader
+
+CHUNK_ROWS = 500_000
+
+
+def synth_chunks(rows, seed=0, chunk_rows=CHUNK_ROWS, source=dataset_loader.DEFAULT_CSV):
+    base = pd.read_csv(source)
+    rng = np.random.default_rng(seed)
+    done = 0
+    while done < rows:
+        n = min(chunk_rows, rows - done)
+        chunk = base.iloc[rng.integers(0, len(base), n)].reset_index(drop=True)
+        age = chunk["age"].to_numpy(dtype=float) + rng.normal(0, 1.5, n)
+        chunk["age"] = np.clip(age, 0.17, 80).round(1)
+        fare = chunk["fare"].to_numpy(dtype=float) * rng.lognormal(0, 0.05, n)
+        chunk["fare"] = np.clip(fare, 0, None).round(4)
+        done += n
+        yield chunk
+
+
+def write_csv(path, rows, seed=0, chunk_rows=CHUNK_ROWS):
+    tmp = path + ".tmp"
+    with open(tmp, "w", newline="") as fh:
+        for i, chunk in enumerate(synth_chunks(rows, seed, chunk_rows)):
+            chunk.to_csv(fh, index=False, header=i == 0)
+    os.replace(tmp, path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000, help="e.g. 1000000, 10000000, 100000000")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    write_csv(args.out, args.rows, args.seed)
+    size_mb = os.path.getsize(args.out) / (1 << 20)
+    print(f"Wrote {args.rows:,} rows ({size_mb:,.0f} MB) to {args.out} in {time.perf_counter() - t0:.1f}s.")
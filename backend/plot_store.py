@@ -0,0 +1,41 @@
+import hashlib
+from typing import NamedTuple
+
+from chart_cache import ChartCache
+
+MEDIA_TYPES = {"png": "image/png", "webp": "image/webp", "svg": "image/svg+xml"}
+
+
+class StoredPlot(NamedTuple):
+    handler: str
+    version: str
+    fmt: str
+    dpi: int
+    content: bytes
+    dataset: str = None
+
+
+class PlotStore:
+    """Rendered charts addressed by the SHA-256 of their bytes.
+
+    Each entry remembers which chart handler, dataset and version produced it,
+    so other formats and resolutions of the same chart can be rendered on
+    demand. Backed by a ChartCache, so ``disk_dir`` lets several workers
+    share published plots.
+    """
+
+    def __init__(self, max_entries=256, disk_dir=None):
+        self._entries = ChartCache(max_entries=max_entries, disk_dir=disk_dir)
+
+    @staticmethod
+    def digest(content: bytes) -> str:
+        return hashlib.sha256(content).hexdigest()[:32]
+
+    def put(self, handler: str, version: str, fmt: str, dpi: int, content: bytes, dataset: str = None) -> str:
+        digest = self.digest(content)
+        if self._entries.get(digest) is None:
+            self._entries.put(digest, StoredPlot(handler, version, fmt, dpi, content, dataset))
+        return digest
+
+    def get(self, digest: str):
+        return self._entries.get(digest)
@@ -0,0 +1,388 @@
+"""Questions as filter -> group-by -> aggregate plans over the passenger frame.
+
+``QueryPlanner.plan`` first reduces a question to its shape: every value it
+recognises (a sex, class, port, deck, survival outcome or number) is
+replaced by a ``{column}`` slot. A shape is parsed into a plan template
+once; later questions with the same shape only bind their values to it.
+So "average fare of women in 3rd class" and "average fare of men in first
+class" share one parse. Shapes that do not parse are cached too.
+
+``run`` evaluates a plan with boolean masks and one groupby, so any
+combination of filters costs the same few vectorised passes; given the
+dataset's bitmap index it ANDs and popcounts bitsets instead.
+"""
+import re, threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class Plan(NamedTuple):
+    aggregate: str                   # count, share, mean, median, sum, min or max
+    measure: Optional[str] = None    # numeric column for mean/median/sum/min/max
+    filters: tuple = ()              # sorted ((column, op, value), ...) restricting the population
+    condition: tuple = ()            # for share: the filters whose share of the population is reported
+    group_by: Optional[str] = None
+
+    def columns(self) -> set:
+        """Every column the plan reads."""
+        used = {column for column, _, _ in self.filters + self.condition}
+        return used | {column for column in (self.measure, self.group_by) if column}
+
+
+# (column, value) -> phrasings; a question mentioning one filters on column == value.
+VALUE_WORDS = {
+    ("sex", "female"): ("female", "females", "women", "woman", "ladies", "lady", "girls"),
+    ("sex", "male"): ("male", "males", "men", "man", "gentlemen"),
+    ("class", "First"): ("first class", "1st class", "first-class", "upper class", "class 1", "pclass 1"),
+    ("class", "Second"): ("second class", "2nd class", "second-class", "middle class", "class 2", "pclass 2"),
+    ("class", "Third"): ("third class", "3rd class", "third-class", "lower class", "steerage", "class 3", "pclass 3"),
+    ("embark_town", "Southampton"): ("southampton",),
+    ("embark_town", "Cherbourg"): ("cherbourg",),
+    ("embark_town", "Queenstown"): ("queenstown",),
+    ("who", "child"): ("children", "child", "kids"),
+    ("alone", True): ("travelling alone", "traveling alone", "alone", "solo"),
+    ("alone", False): ("with family", "with their family", "with relatives"),
+    ("survived", 0): ("did not survive", "didn't survive", "didnt survive", "died", "perished", "victims", "dead"),
+    ("survived", 1): ("survivors", "survivor", "survived", "survive", "lived"),
+}
+_PHRASES = {phrase: key for key, phrases in VALUE_WORDS.items() for phrase in phrases}
+_VALUES = re.compile(
+    r"\bdeck ([a-g])\b|(£?)\b(\d+(?:\.\d+)?)\b|\b("
+    + "|".join(re.escape(p) for p in sorted(_PHRASES, key=len, reverse=True))
+    + r")\b"
+)
+
+_SHARE = re.compile(r"\b(percent|percentage|proportion|share|fraction)\b|%")
+_SURVIVAL_RATE = re.compile(r"\bsurvival (rate|chance|odds|probability)|\b(rate|chance|odds|probability) of surviv")
+_AGGREGATES = (
+    ("median", re.compile(r"\bmedian\b")),
+    ("mean", re.compile(r"\b(average|mean|avg|typical)\b")),
+    ("max", re.compile(r"\b(max|maximum|highest|largest|most expensive|oldest)\b")),
+    ("min", re.compile(r"\b(min|minimum|lowest|smallest|cheapest|youngest)\b")),
+    ("sum", re.compile(r"\b(sum|total|combined)\b(?! number)(?! passengers)")),
+    ("count", re.compile(r"\b(how many|number of|count)\b")),
+)
+_MEASURES = (
+    ("fare", re.compile(r"\b(fares?|ticket prices?|prices?|paid|cost|cheapest|most expensive)\b")),
+    ("age", re.compile(r"\b(ages?|old|oldest|youngest)\b")),
+    ("sibsp", re.compile(r"\b(siblings?|spouses?)\b")),
+    ("parch", re.compile(r"\b(parents?)\b")),
+)
+_COMPARISON = re.compile(
+    r"\b(?:(ages?|aged|fares?|paid|paying|prices?)\s+)?"
+    r"(older than|younger than|cheaper than|more than|greater than|less than|at least|at most|over|above|under|below)"
+    r"\s+(£?)\{num\}(\s+years?(?: old)?|\s+pounds)?"
+)
+_OPS = {"older than": ">", "more than": ">", "greater than": ">", "over": ">", "above": ">", "at least": ">=",
+        "younger than": "<", "cheaper than": "<", "less than": "<", "under": "<", "below": "<", "at most": "<="}
+_GROUP_BY = re.compile(
+    r"\b(?:by|per|for each|for every|in each|across(?: each)?|broken down by|grouped by)\s+"
+    r"(?:passenger |ticket |their )?(class(?:es)?|pclass|gender|sex|ports?|embarkation(?: ports?| towns?)?|"
+    r"towns?|decks?)\b"
+)
+_GROUP_COLUMNS = {"class": "class", "classes": "class", "pclass": "class", "gender": "sex", "sex": "sex",
+                  "port": "embark_town", "ports": "embark_town", "embarkation": "embark_town",
+                  "town": "embark_town", "towns": "embark_town", "deck": "deck", "decks": "deck"}
+
+_COLUMN_WORDS = re.compile(
+    r"\b(class(?:es)?|pclass|gender|sex|ports?|embarkation|towns?|decks?|first|second|third|1st|2nd|3rd)\b"
+)
+
+
+def normalize(question: str):
+    """(shape, values): the question with each recognised value replaced by a ``{column}`` slot."""
+    text = re.sub(r"[^a-z0-9£%.' -]+", " ", question.lower())
+    text = re.sub(r"\s+", " ", text.replace("?", " ")).strip(" .")
+    values, parts, last = [], [], 0
+    for m in _VALUES.finditer(text):
+        if m.group(1):
+            column, value = "deck", m.group(1).upper()
+        elif m.group(3):
+            column, value = "num", float(m.group(3))
+        else:
+            column, value = _PHRASES[m.group(4)]
+        # A pound sign stays in the shape: it is what tells a fare threshold from an age one.
+        parts.append(text[last:m.start()] + (m.group(2) or "") + "{" + column + "}")
+        values.append(value)
+        last = m.end()
+    parts.append(text[last:])
+    return "".join(parts), tuple(values)
+
+
+def _compile(shape: str):
+    """A template for ``shape``: (aggregate, measure, group_by, slot filters, share condition), or None."""
+    slots = re.findall(r"\{(\w+)\}", shape)
+    named = [column for column in slots if column != "num"]
+    if len(named) != len(set(named)):
+        return None  # "men or women", "southampton and cherbourg": a comparison, not one population
+    filters = {}  # slot index -> (column, op)
+    rest = shape
+    for m in _COMPARISON.finditer(shape):
+        word, comparator, pound, unit = m.group(1) or "", m.group(2), m.group(3), m.group(4) or ""
+        if comparator in ("older than", "younger than") or word.startswith("age") or "year" in unit:
+            column = "age"
+        elif pound or comparator == "cheaper than" or "pound" in unit or word[:3] in ("far", "pai", "pri"):
+            column = "fare"
+        else:
+            return None
+        filters[shape[:m.end()].count("{") - 1] = (column, _OPS[comparator])
+        rest = rest.replace(m.group(0), " ", 1)
+    for i, column in enumerate(slots):
+        if column == "num":
+            if i not in filters:
+                return None  # a number that is not a threshold: not a question this engine understands
+        else:
+            filters[i] = (column, "==")
+
+    condition = None
+    if _SURVIVAL_RATE.search(rest):
+        aggregate, condition = "share", ("survived", "==", 1)
+    elif _SHARE.search(rest):
+        categorical = [i for i in sorted(filters) if filters[i][1] == "=="]
+        if not categorical:
+            return None
+        aggregate, condition = "share", categorical[-1]
+    else:
+        aggregate = next((name for name, pattern in _AGGREGATES if pattern.search(rest)), None)
+        if aggregate is None:
+            return None
+
+    measure = None
+    if aggregate not in ("count", "share"):
+        measure = next((column for column, pattern in _MEASURES if pattern.search(rest)), None)
+        if measure is None:
+            return None
+
+    group = _GROUP_BY.search(rest)
+    group_by = _GROUP_COLUMNS[group.group(1).split()[0]] if group else None
+    unslotted = re.sub(r"\{\w+\}", " ", rest[:group.start()] + rest[group.end():] if group else rest)
+    if _COLUMN_WORDS.search(unslotted):
+        return None  # "class count", "first and second class": no single value and no "by"
+    return aggregate, measure, group_by, filters, condition
+
+
+def _bind(template, values) -> Plan:
+    aggregate, measure, group_by, filters, condition = template
+    bound = {i: (column, op, values[i]) for i, (column, op) in filters.items()}
+    if isinstance(condition, int):
+        condition = bound.pop(condition)
+    return Plan(aggregate, measure, tuple(sorted(bound.values(), key=repr)),
+                (condition,) if condition else (), group_by)
+
+
+class QueryPlanner:
+    """Plans questions, caching compiled templates by normalized shape in an LRU."""
+
+    def __init__(self, cache_size: int = 256):
+        self.cache_size = max(1, int(cache_size))
+        self.hits = 0
+        self.misses = 0
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._templates)
+
+    def plan(self, question: str) -> Optional[Plan]:
+        shape, values = normalize(question)
+        with self._lock:
+            if shape in self._templates:
+                self._templates.move_to_end(shape)
+                self.hits += 1
+                template = self._templates[shape]
+            else:
+                self.misses += 1
+                template = None
+        if template is None and shape not in self._templates:
+            template = _compile(shape)
+            with self._lock:
+                self._templates[shape] = template
+                while len(self._templates) > self.cache_size:
+                    self._templates.popitem(last=False)
+        return None if template is None else _bind(template, values)
+
+
+def _mask(df: pd.DataFrame, filters) -> np.ndarray:
+    mask = np.ones(len(df), dtype=bool)
+    for column, op, value in filters:
+        values = df[column]
+        if op == "==":
+            mask &= (values == value).to_numpy(dtype=bool, na_value=False)
+        else:
+            numbers = values.to_numpy(dtype=float, na_value=np.nan)
+            with np.errstate(invalid="ignore"):
+                mask &= {">": np.greater, ">=": np.greater_equal, "<": np.less, "<=": np.less_equal}[op](numbers, value)
+    return mask
+
+
+_NOUN_FILTERS = {("sex", "female"): "female", ("sex", "male"): "male"}
+_QUALIFIERS = {
+    "class": "in {} class",
+    "embark_town": "who embarked at {}",
+    "deck": "on deck {}",
+}
+_PREDICATES = {
+    ("sex", "female"): "were female", ("sex", "male"): "were male", ("who", "child"): "were children",
+    ("survived", 1): "survived", ("survived", 0): "died",
+    ("alone", True): "travelled alone", ("alone", False): "travelled with family",
+}
+_MEASURE_NAMES = {"fare": "fare", "age": "age", "sibsp": "number of siblings/spouses aboard",
+                  "parch": "number of parents/children aboard"}
+_GROUP_NAMES = {"class": "class", "sex": "sex", "embark_town": "port of embarkation", "deck": "deck"}
+_AGGREGATE_NAMES = {"mean": "average", "median": "median", "sum": "total", "min": "lowest", "max": "highest"}
+
+
+def _threshold(column, op, value) -> str:
+    words = {">": "over", ">=": "at least", "<": "under", "<=": "at most"}[op]
+    if column == "fare":
+        return f"who paid {words} £{value:g}"
+    return f"aged {words} {value:g}"
+
+
+def _population(filters) -> str:
+    adjectives, noun, qualifiers = [], "passengers", []
+    for column, op, value in filters:
+        if op != "==":
+            qualifiers.append(_threshold(column, op, value))
+        elif (column, value) in _NOUN_FILTERS:
+            adjectives.append(_NOUN_FILTERS[(column, value)])
+        elif (column, value) == ("who", "child"):
+            noun = "children"
+        elif column in _QUALIFIERS:
+            qualifiers.append(_QUALIFIERS[column].format(value))
+        elif column == "survived":
+            qualifiers.append("who survived" if value else "who died")
+        elif column == "alone":
+            qualifiers.append("travelling alone" if value else "travelling with family")
+        else:
+            qualifiers.append(f"with {column} {value}")
+    return " ".join(adjectives + [noun] + qualifiers)
+
+
+def _predicate(condition) -> str:
+    column, op, value = condition
+    if op != "==":
+        return "were " + _threshold(column, op, value).replace("who ", "")
+    if (column, value) in _PREDICATES:
+        return _PREDICATES[(column, value)]
+    if column in _QUALIFIERS:
+        return ("were " if column != "embark_town" else "") + _QUALIFIERS[column].format(value).replace("who ", "")
+    return f"had {column} {value}"
+
+
+def _format(measure, value) -> str:
+    if measure == "fare":
+        return f"£{value:.2f}"
+    if measure == "age":
+        return f"{value:.1f} years"
+    return f"{value:.2f}"
+
+
+_REDUCERS = {"mean": np.mean, "median": np.median, "sum": np.sum, "min": np.min, "max": np.max}
+
+
+def _frame_results(plan: Plan, df: pd.DataFrame):
+    """(population size, [(group label or None, result)]) computed with masks and groupby."""
+    subset = df[_mask(df, plan.filters)]
+    if not len(subset):
+        return 0, []
+    keys = subset[plan.group_by] if plan.group_by else None
+    if plan.aggregate == "share":
+        hit = pd.Series(_mask(subset, plan.condition), index=subset.index)
+        if keys is None:
+            return len(subset), [(None, (int(hit.sum()), len(subset)))]
+        table = hit.groupby(keys, observed=True).agg(["sum", "count"])
+        return len(subset), [(label, (int(row["sum"]), int(row["count"]))) for label, row in table.iterrows()]
+    if plan.aggregate == "count":
+        if keys is None:
+            return len(subset), [(None, len(subset))]
+        return len(subset), [(label, int(n)) for label, n in subset.groupby(keys, observed=True).size().items()]
+    values = subset[plan.measure]
+    if keys is None:
+        known = values.dropna()
+        return len(subset), [(None, (known.agg(plan.aggregate) if len(known) else None, len(known)))]
+    table = values.groupby(keys, observed=True).agg([plan.aggregate, "count"])
+    return len(subset), [(label, (row[plan.aggregate], int(row["count"]))) for label, row in table.iterrows()]
+
+
+def _select(index, df: pd.DataFrame, filters) -> np.ndarray:
+    words = index.everything()
+    for column, op, value in filters:
+        if op == "==" and column in index:
+            words &= index.bitmap(column, value)
+        else:
+            words &= index.pack(_mask(df, ((column, op, value),)))
+    return words
+
+
+def _index_results(plan: Plan, df: pd.DataFrame, index):
+    """The same as ``_frame_results``, with filters and groups as bitsets: AND, then popcount."""
+    base = _select(index, df, plan.filters)
+    total = index.count(base)
+    if not total:
+        return 0, []
+    groups = [(None, base)] if plan.group_by is None else [
+        (label, base & bits) for label, bits in index.groups(plan.group_by)]
+    sizes = [(label, words, index.count(words)) for label, words in groups]
+    sizes = [entry for entry in sizes if entry[2] or plan.group_by is None]
+    if plan.aggregate == "share":
+        condition = _select(index, df, plan.condition)
+        return total, [(label, (index.count(words & condition), n)) for label, words, n in sizes]
+    if plan.aggregate == "count":
+        return total, [(label, n) for label, _, n in sizes]
+    if plan.aggregate in ("sum", "mean") and plan.measure in index.measures:
+        results = []
+        for label, words, _ in sizes:
+            total_value, known = index.sum(words, plan.measure)
+            value = total_value if plan.aggregate == "sum" else total_value / known if known else None
+            results.append((label, (value if known else None, known)))
+        return total, results
+    values = df[plan.measure].to_numpy(dtype=float, na_value=np.nan)
+    results = []
+    for label, words, _ in sizes:
+        selected = values[index.mask(words)]
+        known = selected[~np.isnan(selected)]
+        results.append((label, (_REDUCERS[plan.aggregate](known) if len(known) else None, len(known))))
+    return total, results
+
+
+def run(plan: Plan, df: pd.DataFrame, index=None) -> str:
+    """The answer to ``plan`` over ``df`` as text.
+
+    With a ``bitmap_index.BitmapIndex`` of ``df`` that covers the group-by
+    column, filters and groups are evaluated on its bitsets instead.
+    """
+    if index is not None and index.rows == len(df) and (plan.group_by is None or plan.group_by in index):
+        total, results = _index_results(plan, df, index)
+    else:
+        total, results = _frame_results(plan, df)
+    population = _population(plan.filters)
+    if not total:
+        return f"No {population} in the dataset."
+
+    if plan.aggregate == "share":
+        predicate = _predicate(plan.condition[0])
+        if plan.group_by is None:
+            hits, n = results[0][1]
+            return f"{hits / n * 100:.1f}% of {population} {predicate} ({hits} of {n})."
+        return "\n".join([f"Share of {population} who {predicate}, by {_GROUP_NAMES[plan.group_by]}:"]
+                         + [f"  • {label}: {hits / n * 100:.1f}% ({hits} of {n})" for label, (hits, n) in results])
+
+    if plan.aggregate == "count":
+        if plan.group_by is None:
+            return f"There were {total} {population}."
+        return "\n".join([f"Number of {population} by {_GROUP_NAMES[plan.group_by]}:"]
+                         + [f"  • {label}: {n}" for label, n in results])
+
+    name = f"{_AGGREGATE_NAMES[plan.aggregate]} {_MEASURE_NAMES[plan.measure]}"
+    if plan.group_by is None:
+        value, known = results[0][1]
+        if not known:
+            return f"No {population} have a recorded {_MEASURE_NAMES[plan.measure]}."
+        return f"The {name} of {population} was {_format(plan.measure, value)} ({known} passengers)."
+    return "\n".join([f"{name[0].upper() + name[1:]} of {population} by {_GROUP_NAMES[plan.group_by]}:"]
+                     + [f"  • {label}: {_format(plan.measure, value)} ({known} passengers)"
+                        for label, (value, known) in results if known])
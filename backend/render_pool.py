@@ -0,0 +1,95 @@
+import multiprocessing, os, threading, time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+import tracing
+
+
+def _init_worker():
+    import renderer
+    renderer.warm_up()
+
+
+def _ping():
+    return os.getpid()
+
+
+def _render(spec, fmt, dpi):
+    """(image bytes, draw seconds, encode seconds)."""
+    import renderer
+    t0 = time.perf_counter()
+    fig = renderer.draw_spec(spec)
+    t1 = time.perf_counter()
+    content = renderer._fig_to_bytes(fig, fmt, dpi)
+    return content, t1 - t0, time.perf_counter() - t1
+
+
+class RenderPool:
+    """Worker processes that turn chart specs into image bytes.
+
+    Each worker imports matplotlib and seaborn, applies the theme and loads
+    fonts once at start-up, so renders run in parallel across cores and never
+    share pyplot state. With ``workers=0``, or before ``start()``, charts are
+    rendered in the calling process under a lock instead.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = max(0, int(workers))
+        self._executor = None
+        self._start_lock = threading.Lock()
+        self._inline_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self.workers == 0 or self._executor is not None:
+                return
+            # spawn rather than fork: the parent already runs threads (compute pool, event loop).
+            executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+            try:
+                pids = {f.result() for f in [executor.submit(_ping) for _ in range(self.workers)]}
+            except Exception as e:
+                print("Render pool failed to start; rendering in-process:", e)
+                executor.shutdown(wait=False, cancel_futures=True)
+                return
+            self._executor = executor
+        print(f"Render pool ready: {len(pids)} worker process(es).")
+
+    def shutdown(self):
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _render_inline(self, spec, fmt, dpi):
+        # pyplot keeps global figure state, so in-process renders must not overlap.
+        with self._inline_lock:
+            return _render(spec, fmt, dpi)
+
+    def _render(self, spec, fmt, dpi):
+        executor = self._executor
+        if executor is None:
+            return self._render_inline(spec, fmt, dpi)
+        try:
+            return executor.submit(_render, spec, fmt, dpi).result()
+        except BrokenProcessPool as e:
+            print("Render pool broke; restarting it and rendering in-process:", e)
+            self.shutdown()
+            threading.Thread(target=self.start, daemon=True).start()
+            return self._render_inline(spec, fmt, dpi)
+
+    def render(self, spec: dict, fmt: str, dpi: int) -> bytes:
+        with tracing.span("render") as span:
+            content, draw_seconds, encode_seconds = self._render(spec, fmt, dpi)
+        if span is not None:
+            # Drawing and encoding may run in a worker process; attach the times it measured.
+            encode_start = span.start + span.seconds - encode_seconds
+            tracing.record("draw_spec", draw_seconds, span, start=encode_start - draw_seconds)
+            tracing.record(f"savefig ({fmt})", encode_seconds, span, start=encode_start)
+        metrics.STAGE_SECONDS.labels("render").observe(draw_seconds)
+        metrics.STAGE_SECONDS.labels("encode").observe(encode_seconds)
+        metrics.PLOT_BYTES.labels(fmt).observe(len(content))
+        return content
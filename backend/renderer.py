@@ -0,0 +1,72 @@
+import io
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import seaborn as sns
+
+PLOT_FORMAT = "png"
+PLOT_DPI = 110
+
+
+def _fig_to_bytes(fig, fmt=PLOT_FORMAT, dpi=PLOT_DPI) -> bytes:
+    buf = io.BytesIO()
+    fig.savefig(buf, format=fmt, dpi=dpi, bbox_inches="tight",
+                facecolor="#f8f9fa", edgecolor="none")
+    plt.close(fig)
+    return buf.getvalue()
+
+
+sns.set_theme(style="whitegrid", palette="muted")
+
+
+def _styled_fig(figsize=(9, 5)):
+    return plt.subplots(figsize=figsize)
+
+
+def _draw_bar(ax, spec):
+    ax.bar(spec["labels"], spec["values"], color=spec["colors"], width=0.5)
+
+
+def _draw_histogram(ax, spec):
+    edges, counts = spec["edges"], spec["counts"]
+    widths = [b - a for a, b in zip(edges[:-1], edges[1:])]
+    ax.bar(edges[:-1], counts, width=widths, align="edge",
+           color=spec["color"], alpha=0.6, edgecolor="white", linewidth=0.5)
+    if spec.get("kde"):
+        ax.plot(spec["kde"]["x"], spec["kde"]["y"], color=spec["color"], linewidth=2)
+
+
+def _draw_box(ax, spec):
+    parts = ax.bxp(spec["boxes"], patch_artist=True, widths=0.6,
+                   medianprops={"color": "#333333"},
+                   flierprops={"marker": "d", "markersize": 4,
+                               "markerfacecolor": "#555555", "markeredgecolor": "none"})
+    for patch, color in zip(parts["boxes"], spec["colors"]):
+        patch.set_facecolor(color)
+        patch.set_edgecolor("#444444")
+
+
+_DRAW = {"bar": _draw_bar, "histogram": _draw_histogram, "box": _draw_box}
+
+
+def draw_spec(spec: dict):
+    """Draw a chart spec from ``chart_specs`` onto a new figure, without encoding it."""
+    fig, ax = _styled_fig()
+    _DRAW[spec["type"]](ax, spec)
+    ax.set_title(spec["title"], fontsize=14, fontweight="bold")
+    ax.set_xlabel(spec["x_label"])
+    ax.set_ylabel(spec["y_label"])
+    plt.tight_layout()
+    return fig
+
+
+def render_spec(spec: dict, fmt: str = PLOT_FORMAT, dpi: int = PLOT_DPI) -> bytes:
+    """Draw a chart spec from ``chart_specs`` and encode it as ``fmt``."""
+    return _fig_to_bytes(draw_spec(spec), fmt, dpi)
+
+
+def warm_up():
+    """Draw and encode a throwaway chart so fonts and the PNG encoder are loaded."""
+    render_spec({"type": "bar", "title": "warm-up", "x_label": "", "y_label": "",
+                 "labels": ["a"], "values": [1], "colors": ["#4e79a7"]})
@@ -0,0 +1,43 @@
+"""Start-up phase timings, so time-to-first-response can be measured and budgeted.
+
+Import this module before anything heavy: its import time is the reference
+point for every figure it reports.
+"""
+import time
+from contextlib import contextmanager
+
+PROCESS_START = time.perf_counter()
+phases = {}
+_marks = {}
+
+
+def _ms_since(t0):
+    return round((time.perf_counter() - t0) * 1000, 1)
+
+
+@contextmanager
+def phase(name):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = _ms_since(t0)
+
+
+def record(name, started):
+    phases[name] = _ms_since(started)
+
+
+def mark(name):
+    """Record the first time ``name`` happens, relative to process start."""
+    if name not in _marks:
+        _marks[name] = _ms_since(PROCESS_START)
+
+
+def report(budget_ms=None) -> dict:
+    ready = _marks.get("ready")
+    out = {"phases_ms": dict(phases), "marks_ms": dict(_marks)}
+    if budget_ms:
+        out["budget_ms"] = budget_ms
+        out["within_budget"] = ready is not None and ready <= budget_ms
+    return out
@@ -0,0 +1,208 @@
+import numpy as np
+import pandas as pd
+
+from chart_specs import box_stats, box_stats_from_histogram, histogram_quantiles
+
+CATEGORICAL_COLUMNS = ("sex", "class", "embark_town", "survived", "alone", "who", "deck")
+NUMERIC_COLUMNS = ("age", "fare")
+GROUPED_METRICS = ("survived", "age", "fare")
+HISTOGRAM_BINS = {"age": 30, "fare": 40}
+BOX_GROUPS = (("class", "age"), ("class", "fare"))
+GROUP_STATS = ("count", "sum", "mean", "median")
+
+
+def _histograms(df):
+    histograms = {}
+    for col, bins in HISTOGRAM_BINS.items():
+        if col in df.columns:
+            counts, edges = np.histogram(df[col].dropna().to_numpy(dtype=float), bins=bins)
+            histograms[col] = (edges, counts)
+    return histograms
+
+
+def _boxes(df):
+    boxes = {}
+    for by, col in BOX_GROUPS:
+        if by in df.columns and col in df.columns:
+            boxes[(by, col)] = {
+                label: box_stats(values.dropna().to_numpy())
+                for label, values in df.groupby(by, observed=True)[col]
+                if values.notna().any()
+            }
+    return boxes
+
+
+def _plain_index(obj):
+    """``obj`` re-indexed by plain labels, so tables from differently-categorised frames align."""
+    return obj.set_axis(pd.Index(list(obj.index), name=obj.index.name))
+
+
+class StatsSnapshot:
+    """Aggregates over a passenger dataset, computed once and then read-only.
+
+    Handlers read counts, numeric summaries, group-by tables, histograms and
+    box-plot statistics from here instead of re-scanning the data on every
+    request. Build one with ``from_frame`` for an in-memory DataFrame or
+    ``from_aggregator`` for data streamed in chunks; a new snapshot is built
+    for every dataset version and instances are never mutated.
+    """
+
+    def __init__(self, total, counts, groups, numeric, histograms, boxes, exact=True):
+        self.total = total
+        self.counts = counts
+        self.shares = {col: s / s.sum() if s.sum() else s.astype(float) for col, s in counts.items()}
+        self.groups = groups
+        self.numeric = numeric
+        self.histograms = histograms
+        self.boxes = boxes
+        self.exact = exact
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "StatsSnapshot":
+        counts, groups = {}, {}
+        for col in CATEGORICAL_COLUMNS:
+            if col not in df.columns:
+                continue
+            counts[col] = df[col].value_counts()
+            metrics = [m for m in GROUPED_METRICS if m in df.columns and m != col]
+            groups[col] = df.groupby(col, observed=True)[metrics].agg(list(GROUP_STATS))
+
+        numeric = {}
+        for col in NUMERIC_COLUMNS:
+            if col not in df.columns:
+                continue
+            values = df[col].dropna()
+            numeric[col] = {
+                "count": int(values.count()),
+                "sum": float(values.sum()),
+                "mean": float(values.mean()),
+                "median": float(values.median()),
+                "min": float(values.min()),
+                "max": float(values.max()),
+            }
+        return cls(len(df), counts, groups, numeric, _histograms(df), _boxes(df))
+
+    def extend(self, rows: pd.DataFrame, frame: pd.DataFrame) -> "StatsSnapshot":
+        """Snapshot for ``frame``, which is this snapshot's rows followed by ``rows``.
+
+        Counts, sums, means, minima and maxima are updated from ``rows`` alone.
+        Medians, histograms and box plots are order statistics and are
+        recomputed from ``frame``.
+        """
+        counts = {}
+        for col, old in self.counts.items():
+            merged = dict(old.items())
+            for value, n in rows[col].value_counts().items():
+                merged[value] = merged.get(value, 0) + int(n)
+            merged = pd.Series(merged, dtype="int64", name=old.name).rename_axis(old.index.name)
+            counts[col] = merged.sort_values(ascending=False, kind="stable")
+
+        groups = {}
+        for by, old in self.groups.items():
+            metrics = list(dict.fromkeys(metric for metric, _ in old.columns))
+            old = _plain_index(old)
+            new = _plain_index(rows.groupby(by, observed=True)[metrics].agg(["count", "sum"]))
+            medians = _plain_index(frame.groupby(by, observed=True)[metrics].median())
+            table = {}
+            for metric in metrics:
+                count = old[(metric, "count")].astype("int64").add(new[(metric, "count")].astype("int64"), fill_value=0)
+                total = old[(metric, "sum")].astype(float).add(new[(metric, "sum")].astype(float), fill_value=0)
+                table[(metric, "count")] = count
+                table[(metric, "sum")] = total
+                table[(metric, "mean")] = total / count
+                table[(metric, "median")] = medians[metric]
+            groups[by] = pd.DataFrame(table).rename_axis(by)
+
+        numeric = {}
+        for col, old in self.numeric.items():
+            values = rows[col].dropna()
+            count, total = old["count"] + int(values.count()), old["sum"] + float(values.sum())
+            numeric[col] = {
+                "count": count,
+                "sum": total,
+                "mean": total / count if count else float("nan"),
+                "median": float(frame[col].median()),
+                "min": min(old["min"], float(values.min())) if len(values) else old["min"],
+                "max": max(old["max"], float(values.max())) if len(values) else old["max"],
+            }
+        return StatsSnapshot(self.total + len(rows), counts, groups, numeric, _histograms(frame), _boxes(frame))
+
+    @classmethod
+    def from_aggregator(cls, agg) -> "StatsSnapshot":
+        """Snapshot from a ``streaming.Aggregator``; medians and box plots are histogram estimates."""
+        counts = {
+            col: pd.Series(values, dtype="int64").sort_values(ascending=False, kind="stable")
+            for col, values in agg.counts.items()
+        }
+
+        groups = {}
+        for by, per_value in agg.groups.items():
+            rows = {}
+            for value in sorted(per_value):
+                row = {}
+                for metric, (count, total) in per_value[value].items():
+                    if metric == "survived":
+                        median = 1.0 if total * 2 > count else 0.0 if total * 2 < count else 0.5
+                    else:
+                        edges = agg.fine_edges(metric)
+                        median = histogram_quantiles(edges, agg.group_hist[by][value][metric], [0.5])[0]
+                    row.update({
+                        (metric, "count"): count,
+                        (metric, "sum"): total,
+                        (metric, "mean"): total / count if count else float("nan"),
+                        (metric, "median"): median,
+                    })
+                rows[value] = row
+            table = pd.DataFrame.from_dict(rows, orient="index")
+            table.columns = pd.MultiIndex.from_tuples(table.columns)
+            table.index.name = by
+            groups[by] = table
+
+        numeric, histograms = {}, {}
+        for col, acc in agg.numeric.items():
+            edges, fine = agg.fine_edges(col), agg.hist[col]
+            numeric[col] = {
+                "count": acc["count"],
+                "sum": acc["sum"],
+                "mean": acc["sum"] / acc["count"] if acc["count"] else float("nan"),
+                "median": histogram_quantiles(edges, fine, [0.5])[0],
+                "min": acc["min"],
+                "max": acc["max"],
+            }
+            bins = HISTOGRAM_BINS[col]
+            histograms[col] = (edges[:: len(fine) // bins], fine.reshape(bins, -1).sum(axis=1))
+
+        boxes = {}
+        for by, col in BOX_GROUPS:
+            if by in agg.group_hist and col in agg.numeric:
+                acc, edges = agg.numeric[col], agg.fine_edges(col)
+                boxes[(by, col)] = {
+                    value: box_stats_from_histogram(edges, per_metric[col], acc["min"], acc["max"])
+                    for value, per_metric in sorted(agg.group_hist[by].items())
+                    if per_metric[col].sum()
+                }
+        return cls(agg.rows, counts, groups, numeric, histograms, boxes, exact=False)
+
+    def count(self, col, value):
+        return int(self.counts[col].get(value, 0))
+
+    def share(self, col, value):
+        return float(self.shares[col].get(value, 0.0))
+
+    def value_counts(self, col):
+        return self.counts[col]
+
+    def summary(self, col, stat):
+        return self.numeric[col][stat]
+
+    def group(self, by, metric, stat="mean"):
+        """Per-group ``stat`` of ``metric``, e.g. ``group("sex", "survived")`` for survival rates."""
+        return self.groups[by][(metric, stat)]
+
+    def histogram(self, col):
+        """(bin edges, counts) for the display histogram of a numeric column."""
+        return self.histograms[col]
+
+    def box(self, by, col):
+        """Box-plot statistics of ``col`` for each value of ``by``."""
+        return self.boxes[(by, col)]
@@ -0,0 +1,213 @@
+"""Chunked aggregation for passenger datasets too large to hold in memory.
+
+``aggregate_file`` reads a CSV (or a columnar cache directory) in fixed-size
+chunks and folds each chunk into an ``Aggregator``; memory stays bounded by
+the chunk size no matter how many rows the file has. The result feeds
+``StatsSnapshot.from_aggregator``. Counts, sums, means and group rates are
+exact; medians, histograms and box plots come from fixed-width fine bins.
+"""
+import json, os, sys, time
+import numpy as np
+import pandas as pd
+
+import dataset_loader
+from stats import CATEGORICAL_COLUMNS, GROUPED_METRICS, HISTOGRAM_BINS, NUMERIC_COLUMNS
+
+FINE_BINS = 1200  # a multiple of every display bin count, so fine bins rebin exactly
+DEFAULT_CHUNK_ROWS = 250_000
+USED_COLUMNS = tuple(dict.fromkeys(CATEGORICAL_COLUMNS + NUMERIC_COLUMNS + GROUPED_METRICS))
+
+assert all(FINE_BINS % bins == 0 for bins in HISTOGRAM_BINS.values())
+
+
+class Aggregator:
+    """Mergeable running aggregates over passenger chunks.
+
+    ``ranges`` maps each numeric column to its (min, max) so every chunk bins
+    into the same fine histogram edges; ``aggregate_file`` finds them in a
+    first pass.
+    """
+
+    def __init__(self, ranges: dict, fine_bins: int = FINE_BINS):
+        self.ranges = {col: (float(lo), float(hi)) for col, (lo, hi) in ranges.items()}
+        self.fine_bins = fine_bins
+        self.rows = 0
+        self.counts = {}      # col -> {value: count}
+        self.numeric = {}     # col -> {"count", "sum", "min", "max"}
+        self.hist = {col: np.zeros(fine_bins, dtype=np.int64) for col in self.ranges}
+        self.groups = {}      # by -> {value: {metric: [count, sum]}}
+        self.group_hist = {}  # by -> {value: {col: fine counts}}, only for BOX_GROUPS and medians
+
+    def fine_edges(self, col):
+        lo, hi = self.ranges[col]
+        return np.linspace(lo, hi if hi > lo else lo + 1, self.fine_bins + 1)
+
+    def _bin(self, col, values):
+        lo, hi = self.ranges[col]
+        width = (hi - lo if hi > lo else 1) / self.fine_bins
+        # np.histogram puts the maximum into the last bin; so does the clip.
+        return np.clip(((values - lo) / width).astype(np.int64), 0, self.fine_bins - 1)
+
+    def update(self, chunk: pd.DataFrame):
+        self.rows += len(chunk)
+        numeric_values = {}
+        for col in NUMERIC_COLUMNS:
+            if col not in chunk.columns:
+                continue
+            values = chunk[col].to_numpy(dtype=float)
+            valid = ~np.isnan(values)
+            numeric_values[col] = (values, valid)
+            present = values[valid]
+            acc = self.numeric.setdefault(col, {"count": 0, "sum": 0.0, "min": np.inf, "max": -np.inf})
+            if len(present):
+                acc["count"] += len(present)
+                acc["sum"] += float(present.sum())
+                acc["min"] = min(acc["min"], float(present.min()))
+                acc["max"] = max(acc["max"], float(present.max()))
+                self.hist[col] += np.bincount(self._bin(col, present), minlength=self.fine_bins)
+
+        for by in CATEGORICAL_COLUMNS:
+            if by not in chunk.columns:
+                continue
+            codes, labels = pd.factorize(chunk[by], sort=True)
+            if not len(labels):
+                continue
+            present = codes >= 0
+            per_label = np.bincount(codes[present], minlength=len(labels))
+            counts = self.counts.setdefault(by, {})
+            for label, n in zip(labels.tolist(), per_label.tolist()):
+                counts[label] = counts.get(label, 0) + n
+
+            group = self.groups.setdefault(by, {})
+            hists = self.group_hist.setdefault(by, {})
+            for metric in GROUPED_METRICS:
+                if metric == by or metric not in chunk.columns:
+                    continue
+                if metric in numeric_values:
+                    values, valid = numeric_values[metric]
+                else:
+                    values = chunk[metric].to_numpy(dtype=float)
+                    valid = ~np.isnan(values)
+                keep = present & valid
+                n = np.bincount(codes[keep], minlength=len(labels))
+                s = np.bincount(codes[keep], weights=values[keep], minlength=len(labels))
+                binned = None
+                if metric in self.ranges:
+                    # One bincount over (group, bin) pairs gives every group's histogram at once.
+                    flat = codes[keep] * self.fine_bins + self._bin(metric, values[keep])
+                    binned = np.bincount(flat, minlength=len(labels) * self.fine_bins).reshape(len(labels), -1)
+                for i, label in enumerate(labels.tolist()):
+                    acc = group.setdefault(label, {}).setdefault(metric, [0, 0.0])
+                    acc[0] += int(n[i])
+                    acc[1] += float(s[i])
+                    if binned is not None:
+                        target = hists.setdefault(label, {}).setdefault(
+                            metric, np.zeros(self.fine_bins, dtype=np.int64))
+                        target += binned[i]
+        return self
+
+    def merge(self, other: "Aggregator"):
+        """Fold ``other`` (built with the same ranges) into this aggregator."""
+        if other.ranges != self.ranges or other.fine_bins != self.fine_bins:
+            raise ValueError("cannot merge aggregators with different bin ranges")
+        self.rows += other.rows
+        for col, counts in other.counts.items():
+            mine = self.counts.setdefault(col, {})
+            for label, n in counts.items():
+                mine[label] = mine.get(label, 0) + n
+        for col, acc in other.numeric.items():
+            mine = self.numeric.setdefault(col, {"count": 0, "sum": 0.0, "min": np.inf, "max": -np.inf})
+            mine["count"] += acc["count"]
+            mine["sum"] += acc["sum"]
+            mine["min"] = min(mine["min"], acc["min"])
+            mine["max"] = max(mine["max"], acc["max"])
+        for col, hist in other.hist.items():
+            self.hist[col] += hist
+        for by, per_label in other.groups.items():
+            for label, metrics in per_label.items():
+                for metric, (n, s) in metrics.items():
+                    acc = self.groups.setdefault(by, {}).setdefault(label, {}).setdefault(metric, [0, 0.0])
+                    acc[0] += n
+                    acc[1] += s
+        for by, per_label in other.group_hist.items():
+            for label, metrics in per_label.items():
+                for metric, hist in metrics.items():
+                    target = self.group_hist.setdefault(by, {}).setdefault(label, {}).setdefault(
+                        metric, np.zeros(self.fine_bins, dtype=np.int64))
+                    target += hist
+        return self
+
+
+def _columns_in(path):
+    header = pd.read_csv(path, nrows=0).columns
+    return [c for c in header if c.strip().lower() in USED_COLUMNS]
+
+
+def iter_chunks(path, chunksize=DEFAULT_CHUNK_ROWS):
+    """Yield DataFrame chunks of the used columns from a CSV file or a columnar cache directory."""
+    if os.path.isdir(path):
+        cached = dataset_loader.read_cache(path)
+        if cached is None:
+            raise FileNotFoundError(f"no columnar cache in {path}")
+        df = cached[0]
+        # Slices of a memory-mapped frame only page in the rows they touch.
+        df = df[[c for c in df.columns if c in USED_COLUMNS]]
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+        return
+    for chunk in pd.read_csv(path, usecols=_columns_in(path), chunksize=chunksize):
+        chunk.columns = [c.strip().lower() for c in chunk.columns]
+        yield chunk
+
+
+def numeric_ranges(path, chunksize=DEFAULT_CHUNK_ROWS):
+    ranges = {}
+    for chunk in iter_chunks(path, chunksize):
+        for col in NUMERIC_COLUMNS:
+            if col in chunk.columns:
+                values = chunk[col].to_numpy(dtype=float)
+                values = values[~np.isnan(values)]
+                if len(values):
+                    lo, hi = ranges.get(col, (np.inf, -np.inf))
+                    ranges[col] = (min(lo, float(values.min())), max(hi, float(values.max())))
+    return ranges
+
+
+def aggregate_file(path, chunksize=DEFAULT_CHUNK_ROWS, ranges=None) -> Aggregator:
+    """Two passes over ``path``: numeric ranges (unless given), then the aggregates."""
+    agg = Aggregator(ranges or numeric_ranges(path, chunksize))
+    for chunk in iter_chunks(path, chunksize):
+        agg.update(chunk)
+    return agg
+
+
+def _peak_rss_mb():
+    """Peak resident set size of this process, or None where ``resource`` is missing (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+if __name__ == "__main__":
+    import argparse
+    from stats import StatsSnapshot
+
+    parser = argparse.ArgumentParser(description="Aggregate a passenger file in bounded memory.")
+    parser.add_argument("path", nargs="?", default=dataset_loader.DEFAULT_CSV)
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    stats = StatsSnapshot.from_aggregator(aggregate_file(args.path, args.chunk_rows))
+    print(json.dumps({
+        "rows": stats.total,
+        "seconds": round(time.perf_counter() - t0, 2),
+        "peak_rss_mb": _peak_rss_mb(),
+        "survival_rate": round(stats.share("survived", 1), 4),
+        "age": {k: round(v, 3) for k, v in stats.numeric["age"].items()},
+        "fare": {k: round(v, 3) for k, v in stats.numeric["fare"].items()},
+        "survival_by_class": stats.group("class", "survived").round(4).to_dict(),
+    }, indent=2, default=str))
@@ -0,0 +1,14 @@
+import os, sys, tempfile
+
+# Before anything imports agent: render in-process, no SQLite answer cache or on-disk charts, no LLM,
+# and a throwaway columnar cache so tests never touch the checked-out one.
+os.environ.update(
+    RENDER_WORKERS="0",
+    ANSWER_CACHE_PATH="",
+    CHART_CACHE_WARM="0",
+    CHART_CACHE_DIR="",
+    HUGGINGFACEHUB_API_TOKEN="",
+    DATASET_WATCH_INTERVAL="0",
+    DATASET_CACHE_DIR=tempfile.mkdtemp(prefix="titanic-test-cache-"),
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
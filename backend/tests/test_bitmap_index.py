@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+import bitmap_index
+import dataset_loader
+import query_plan
+
+QUESTIONS = (
+    "how many women in 3rd class survived",
+    "number of men travelling alone by port",
+    "average fare of women in 3rd class who embarked at southampton",
+    "median age of survivors by class",
+    "total fare paid by passengers in first class",
+    "oldest passenger in second class",
+    "survival rate of children by class",
+    "percentage of men who survived",
+    "how many passengers older than 60 survived",
+    "average age of passengers on deck c",
+)
+
+
+@pytest.fixture(scope="module")
+def frame():
+    return dataset_loader.load_dataset()
+
+
+@pytest.fixture(scope="module")
+def index(frame):
+    return bitmap_index.build(frame)
+
+
+@pytest.mark.parametrize("pairs", [
+    (("sex", "female"),),
+    (("sex", "female"), ("class", "Third")),
+    (("sex", "male"), ("class", "First"), ("embark_town", "Cherbourg"), ("alone", True)),
+    (("class", "Fourth"),),
+])
+def test_select_counts_and_sums_match_pandas_masks(frame, index, pairs):
+    mask = np.ones(len(frame), dtype=bool)
+    for column, value in pairs:
+        mask &= (frame[column] == value).to_numpy(dtype=bool)
+    words = index.select(pairs)
+    assert index.count(words) == int(mask.sum())
+    assert np.array_equal(index.mask(words), mask)
+    fare = frame["fare"].to_numpy(dtype=float, na_value=np.nan)[mask]
+    total, known = index.sum(words, "fare")
+    assert total == pytest.approx(float(np.nansum(fare)))
+    assert known == int((~np.isnan(fare)).sum())
+
+
+@pytest.mark.parametrize("question", QUESTIONS)
+def test_plans_answer_the_same_with_and_without_the_index(frame, index, question):
+    plan = query_plan.QueryPlanner().plan(question)
+    assert plan is not None
+    assert query_plan.run(plan, frame, index) == query_plan.run(plan, frame)
@@ -0,0 +1,39 @@
+import agent
+import dataset_loader
+from chart_cache import ChartCache
+
+
+def test_get_or_render_renders_each_key_once_and_persists(tmp_path):
+    renders = []
+
+    def render():
+        renders.append(1)
+        return ("text", b"png")
+
+    cache = ChartCache(max_entries=2, disk_dir=str(tmp_path))
+    key = ("_age_histogram", "v1", "png", 110)
+    assert cache.get_or_render(key, render) == cache.get_or_render(key, render) == ("text", b"png")
+    assert len(renders) == 1 and (cache.hits, cache.misses) == (1, 1)
+
+    restarted = ChartCache(disk_dir=str(tmp_path))
+    assert restarted.get(key) == ("text", b"png")
+
+
+def test_chart_handlers_miss_after_the_dataset_version_changes():
+    frame, version = dataset_loader.load_versioned(agent.CSV_PATH)
+    ds = agent._make_dataset("chart-cache-test", frame, version)
+    token = agent._active_dataset.set(ds)
+    try:
+        first = agent._age_histogram(agent.SPEC_FORMAT)
+        assert agent._age_histogram(agent.SPEC_FORMAT) is first
+        assert (ds.charts.hits, ds.charts.misses) == (1, 1)
+    finally:
+        agent._active_dataset.reset(token)
+
+    token = agent._active_dataset.set(ds._replace(version=version + "-changed"))
+    try:
+        agent._age_histogram(agent.SPEC_FORMAT)
+    finally:
+        agent._active_dataset.reset(token)
+    assert (ds.charts.hits, ds.charts.misses) == (1, 2)
+    assert {key[1] for key, _ in ds.charts.items()} == {version, version + "-changed"}
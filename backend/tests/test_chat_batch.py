@@ -0,0 +1,41 @@
+import threading
+
+from fastapi.testclient import TestClient
+
+import agent
+import main
+
+
+def test_duplicate_intents_compute_once_and_results_keep_input_order(monkeypatch):
+    calls, lock = [], threading.Lock()
+    compute = agent._compute
+
+    def counting(question, match, *args):
+        with lock:
+            calls.append(match.handler.__name__ if match.kind == "intent" else match.kind)
+        return compute(question, match, *args)
+
+    monkeypatch.setattr(agent, "_compute", counting)
+    questions = [
+        "What was the average ticket fare?",
+        "how many survived",
+        "average fare",
+        "Were there aliens on board?",
+        "",
+        "what was the mean fare paid",
+        "how many survived",
+    ]
+    with TestClient(main.app) as client:
+        response = client.post("/chat/batch", json={"questions": questions})
+    assert response.status_code == 200
+    results = response.json()["results"]
+
+    assert [r["question"] for r in results] == questions
+    assert [r["intent"] for r in results] == [
+        "_avg_fare", "_survival_count", "_avg_fare", "assumption", None, "_avg_fare", "_survival_count",
+    ]
+    assert sorted(calls) == ["_avg_fare", "_survival_count"]
+    fares = [r["answer"] for r in results if r["intent"] == "_avg_fare"]
+    assert len(set(fares)) == 1 and "32.20" in fares[0]
+    assert all(r["shared"] for r in results if r["intent"] in ("_avg_fare", "_survival_count"))
+    assert "aliens" in results[3]["answer"] and "clear question" in results[4]["answer"]
@@ -0,0 +1,41 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+QUESTION = "What was the average ticket fare?"
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(main.app) as c:
+        yield c
+
+
+def test_get_revalidates_with_304(client):
+    first = client.get("/chat", params={"question": QUESTION})
+    assert first.status_code == 200
+    assert first.headers["etag"].startswith('W/"')
+    assert "max-age" in first.headers["cache-control"]
+
+    again = client.get("/chat", params={"question": QUESTION.lower()}, headers={"If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304 and again.content == b""
+
+
+def test_post_never_answers_304(client):
+    first = client.post("/chat", json={"question": QUESTION})
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert client.post("/chat", json={"question": QUESTION}, headers={"If-None-Match": etag}).status_code == 412
+    assert client.post("/chat", json={"question": QUESTION}, headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_etag_depends_on_mode(client):
+    image = client.get("/chat", params={"question": QUESTION, "mode": "image"}).headers["etag"]
+    spec = client.get("/chat", params={"question": QUESTION, "mode": "spec"}, headers={"If-None-Match": image})
+    assert spec.status_code == 200 and spec.headers["etag"] != image
+
+
+def test_profiled_requests_are_not_cached(client):
+    r = client.get("/chat", params={"question": QUESTION, "profile": "1"})
+    assert r.status_code == 200 and r.headers["cache-control"] == "no-store" and "etag" not in r.headers
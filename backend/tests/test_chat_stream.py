@@ -0,0 +1,56 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import agent
+import main
+from answer_cache import AnswerCache
+
+QUESTION = "Show me a histogram of passenger ages"
+
+
+class WordChain:
+    """Streams the computed result back a word at a time."""
+
+    async def astream(self, inputs):
+        for word in inputs["result"].split(" "):
+            yield word + " "
+
+
+def _events(client, **body):
+    with client.stream("POST", "/chat/stream", json={"question": QUESTION, **body}) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        text = "".join(response.iter_text())
+    events = []
+    for block in filter(None, text.split("\n\n")):
+        fields = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(agent, "answer_cache", AnswerCache())
+    monkeypatch.setattr(agent, "response_chain", WordChain())
+    monkeypatch.setattr(agent, "_polishing_enabled", lambda: True)
+    with TestClient(main.app) as c:
+        yield c
+
+
+@pytest.mark.parametrize("mode, chart_event", [("image", "plot"), ("spec", "chart")])
+def test_events_arrive_raw_tokens_answer_chart_done(client, mode, chart_event):
+    events = _events(client, mode=mode)
+    names = [name for name, _ in events]
+    tokens = names.count("token")
+    assert tokens > 1
+    assert names == ["raw"] + ["token"] * tokens + ["answer", chart_event, "done"]
+
+    raw = events[0][1]["text"]
+    streamed = "".join(payload["text"] for name, payload in events if name == "token")
+    assert streamed.strip() == raw and events[-3][1]["text"] == streamed.strip()
+    if chart_event == "plot":
+        assert events[-2][1]["url"].startswith("/plots/")
+    else:
+        assert events[-2][1]["type"] == "histogram"
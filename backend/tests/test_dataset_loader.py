@@ -0,0 +1,19 @@
+import dataset_loader
+
+
+def test_cache_dir_is_per_path(tmp_path):
+    a, b = tmp_path / "a" / "titanic.csv", tmp_path / "b" / "titanic.csv"
+    assert dataset_loader._cache_dir(str(a)) != dataset_loader._cache_dir(str(b))
+
+
+def test_rewriting_the_cache_leaves_mapped_frames_alone(tmp_path):
+    csv = tmp_path / "titanic.csv"
+    frame = dataset_loader._read_csv(dataset_loader.DEFAULT_CSV)
+    frame.to_csv(csv, index=False)
+    old, _ = dataset_loader.load_versioned(str(csv))
+    fares = old["fare"].to_numpy().copy()
+
+    frame.head(50).assign(fare=1.0).to_csv(csv, index=False)
+    new, _ = dataset_loader.load_versioned(str(csv), use_cache=True)
+    assert len(new) == 50 and (new["fare"] == 1.0).all()
+    assert (old["fare"].to_numpy() == fares).all()
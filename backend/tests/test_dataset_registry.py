@@ -0,0 +1,57 @@
+import pytest
+
+from dataset_registry import DatasetRegistry
+
+
+def _registry(budget, sizes):
+    loaded = []
+
+    def loader(name, source):
+        loaded.append(name)
+        return f"{name} from {source}"
+
+    registry = DatasetRegistry(loader, lambda dataset: sizes[dataset.split()[0]], budget)
+    for name in sizes:
+        registry.register(name, f"{name}.csv")
+    return registry, loaded
+
+
+def _loaded(registry):
+    return [entry["name"] for entry in registry.stats()["loaded"]]
+
+
+def test_least_recently_used_dataset_is_evicted_over_budget():
+    registry, loaded = _registry(100, {"a": 40, "b": 40, "c": 40})
+    registry.get("a")
+    registry.get("b")
+    assert registry.get("a") == "a from a.csv"  # a is now the most recent
+    registry.get("c")
+    assert _loaded(registry) == ["a", "c"]
+    assert registry.evictions == 1 and registry.peek("b") is None
+
+    registry.get("b")  # reloads b and evicts a, now the least recently used
+    assert loaded == ["a", "b", "c", "b"] and _loaded(registry) == ["c", "b"]
+    assert registry.stats()["used_bytes"] <= 100
+
+
+def test_peek_does_not_count_as_a_use():
+    registry, _ = _registry(100, {"a": 40, "b": 40, "c": 40})
+    registry.get("a")
+    registry.get("b")
+    registry.peek("a")
+    registry.get("c")
+    assert _loaded(registry) == ["b", "c"]
+
+
+def test_dataset_over_budget_on_its_own_stays_loaded():
+    registry, _ = _registry(100, {"a": 40, "huge": 150})
+    registry.get("a")
+    assert registry.get("huge") == "huge from huge.csv"
+    assert _loaded(registry) == ["huge"]
+
+
+def test_unknown_names_raise_key_error():
+    registry, loaded = _registry(100, {"a": 40})
+    with pytest.raises(KeyError):
+        registry.get("b")
+    assert loaded == []
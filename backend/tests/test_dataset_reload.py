@@ -0,0 +1,50 @@
+import os, shutil
+
+import pandas as pd
+import pytest
+
+import agent
+
+
+@pytest.fixture
+def csv_copy(tmp_path):
+    path = tmp_path / "titanic.csv"
+    shutil.copy(agent.CSV_PATH, path)
+    return str(path)
+
+
+def _rewrite(path, frame):
+    frame.to_csv(path + ".new", index=False)
+    os.replace(path + ".new", path)
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10 ** 9))
+
+
+def test_reload_keeps_old_frame_and_carries_only_unchanged_charts(csv_copy):
+    agent.datasets.register("rewrite", csv_copy)
+    old = agent.ensure_dataset("rewrite")
+    fare_mean = float(old.df["fare"].mean())
+    for question in ("fare by class", "age histogram"):
+        agent._detect_and_run(question, dataset="rewrite")
+    assert {key[0] for key, _ in old.charts.items()} >= {"_fare_by_class", "_age_histogram"}
+
+    frame = pd.read_csv(csv_copy)
+    frame["fare"] = frame["fare"] * 2
+    _rewrite(csv_copy, frame)
+    assert agent.refresh_dataset("rewrite") == "reload"
+
+    new = agent.ensure_dataset("rewrite")
+    assert float(old.df["fare"].mean()) == pytest.approx(fare_mean)
+    assert float(new.df["fare"].mean()) == pytest.approx(fare_mean * 2)
+    carried = {key[0] for key, _ in new.charts.items()}
+    assert "_age_histogram" in carried
+    assert "_fare_by_class" not in carried
+
+
+def test_shorter_rewrite_leaves_old_frame_readable(csv_copy):
+    agent.datasets.register("shrink", csv_copy)
+    old = agent.ensure_dataset("shrink")
+    rows, total = len(old.df), float(old.df["fare"].sum())
+    _rewrite(csv_copy, pd.read_csv(csv_copy).head(100))
+    assert agent.refresh_dataset("shrink") == "reload"
+    assert len(agent.ensure_dataset("shrink").df) == 100
+    assert len(old.df) == rows and float(old.df["fare"].sum()) == pytest.approx(total)
@@ -0,0 +1,61 @@
+import pytest
+
+import agent
+from intent_matcher import IntentMatcher, KeywordAutomaton
+
+QUESTIONS = [
+    "What percentage of passengers were male?", "Show me a histogram of passenger ages",
+    "average fare", "What was the average age?", "how many survived", "survival rate by gender",
+    "survival rate by class", "box plot of age by class", "fare by class", "how many passengers in each class",
+    "Which port did most people embark from?", "total passengers", "percentage of female passengers",
+    "fare distribution", "plot the ages", "Did women survive more often than men?", "survival rate",
+    "proportion of males", "How many dogs were on board?", "Were there aliens on the Titanic?",
+    "What is the weather in Southampton?", "who is the captain", "tell me about the dataset", "",
+    "Show the class chart of ticket categories", "what's the GDP of england", "ufo sightings by class",
+] + [text for texts in agent.INTENT_EXAMPLES.values() for text in texts]
+
+
+def _keyword_loop(question):
+    """The linear scan the matcher replaced: out-of-scope terms first, then the first intent rule that holds."""
+    q = question.lower()
+    for term in agent.ASSUMPTION_KEYWORDS:
+        if term in q:
+            return "assumption", None
+    for term in agent.OUT_OF_SCOPE_KEYWORDS:
+        if term in q:
+            return "out_of_scope", None
+    for kw_all, kw_any, handler in agent.INTENT_MAP:
+        if all(k in q for k in kw_all) and (not kw_any or any(k in q for k in kw_any)):
+            return "intent", handler
+    return "fallback", None
+
+
+@pytest.mark.parametrize("question", QUESTIONS)
+def test_matcher_routes_like_the_keyword_loop(question):
+    matcher = IntentMatcher(agent.INTENT_MAP, agent.OUT_OF_SCOPE_KEYWORDS, agent.ASSUMPTION_KEYWORDS)
+    match = matcher.classify(question)
+    assert (match.kind, match.handler) == _keyword_loop(question)
+
+
+def test_router_only_answers_what_the_rules_leave_open():
+    for question in QUESTIONS:
+        expected = _keyword_loop(question)
+        match = agent._matcher.classify(question)
+        if expected[0] != "fallback":
+            assert (match.kind, match.handler, match.score) == (*expected, None), question
+    assert agent._matcher.classify("histgram of pasenger ages").handler is agent._age_histogram
+
+
+def test_router_never_overrides_a_bare_rule():
+    # (["surviv"], [], _survival_count) has no any-of keywords; a wording closer to another
+    # intent's examples still goes to the rule's handler.
+    question = "did the survivors include more women or men"
+    assert agent._router.route(question)[0] not in (None, agent._survival_count)
+    match = agent._matcher.classify(question)
+    assert (match.kind, match.handler, match.score) == ("intent", agent._survival_count, None)
+
+
+def test_automaton_finds_overlapping_substrings():
+    automaton = KeywordAutomaton(["surviv", "viv", "class", "ass"])
+    found = sorted((start, automaton.keywords[idx]) for start, idx in automaton.iter_matches("survival by class"))
+    assert found == [(0, "surviv"), (3, "viv"), (12, "class"), (14, "ass")]
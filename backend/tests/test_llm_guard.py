@@ -0,0 +1,62 @@
+import threading
+
+from llm_guard import LLMGuard
+
+
+def _guard(probe=lambda timeout: None, **kwargs):
+    options = dict(max_timeout=10.0, min_timeout=0.1, failure_threshold=3, cooldown=0.05, min_samples=5)
+    options.update(kwargs)
+    return LLMGuard(probe, **options)
+
+
+def test_opens_after_consecutive_failures_only():
+    guard = _guard(probe=lambda timeout: threading.Event().wait(60), cooldown=60)
+    guard.failure()
+    guard.failure()
+    guard.success(0.2)
+    guard.failure()
+    guard.failure()
+    assert guard.allow()
+    guard.failure()
+    assert not guard.allow() and guard.stats()["times_opened"] == 1
+    guard.stop()
+
+
+def test_probe_closes_the_circuit_once_the_endpoint_recovers():
+    recovered = threading.Event()
+    closed = threading.Event()
+
+    def probe(timeout):
+        if not recovered.is_set():
+            raise RuntimeError("still down")
+        closed.set()
+
+    guard = _guard(probe=probe)
+    for _ in range(3):
+        guard.failure()
+    assert guard.is_open
+    threading.Event().wait(0.2)
+    assert guard.is_open and guard.probes >= 1
+    recovered.set()
+    assert closed.wait(2)
+    for _ in range(100):
+        if guard.allow():
+            break
+        threading.Event().wait(0.01)
+    assert guard.allow() and guard.failures == 0
+    guard.stop()
+
+
+def test_timeout_adapts_to_successes_and_backs_off_on_timeouts():
+    guard = _guard(failure_threshold=100)
+    for _ in range(10):
+        guard.success(0.2)
+    assert guard.timeout() < 1.0
+    guard.failure(timed_out=True)
+    assert guard.timeout() == guard.max_timeout
+
+    errors = _guard(failure_threshold=100)
+    for _ in range(10):
+        errors.success(0.2)
+    errors.failure()
+    assert errors.timeout() < 1.0
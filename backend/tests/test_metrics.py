@@ -0,0 +1,9 @@
+import metrics
+
+
+def test_label_values_are_escaped():
+    counter = metrics.Counter("test_escaped_labels", "Label escaping.", ["dataset"])
+    counter.labels('C:\\data\\"titanic"\nv2').inc()
+    line = counter.render()[-1]
+    assert line == 'test_escaped_labels_total{dataset="C:\\\\data\\\\\\"titanic\\"\\nv2"} 1'
+    assert "\n" not in line
@@ -0,0 +1,18 @@
+import pytest
+
+from main import _negotiate_format
+
+
+@pytest.mark.parametrize("accept, expected", [
+    ("", "png"),
+    ("*/*", "webp"),
+    ("image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8", "webp"),  # Chrome's image default
+    ("image/png,image/svg+xml;q=0.9", "png"),
+    ("image/svg+xml", "svg"),
+    ("image/svg+xml,image/png;q=0.5", "svg"),
+    ("image/webp;q=0,image/png;q=0.4,image/*;q=0.3", "png"),
+    ("text/html", "png"),
+    ("image/png;q=bogus,image/svg+xml", "svg"),
+])
+def test_negotiate_format(accept, expected):
+    assert _negotiate_format(accept) == expected
@@ -0,0 +1,96 @@
+import threading, time
+
+import agent
+
+
+def test_polishing_check_never_builds_the_chain_inline(monkeypatch):
+    release = threading.Event()
+
+    def slow_build():
+        release.wait(5)
+
+    monkeypatch.setattr(agent, "HF_TOKEN", "token")
+    monkeypatch.setattr(agent, "response_chain", None)
+    monkeypatch.setattr(agent, "_chain_built", False)
+    monkeypatch.setattr(agent, "_chain_thread", None)
+    monkeypatch.setattr(agent, "build_response_chain", slow_build)
+
+    started = time.perf_counter()
+    assert agent._polishing_enabled() is False
+    assert agent._polishing_enabled() is False
+    assert time.perf_counter() - started < 0.5
+    assert agent._chain_thread is not None and agent._chain_thread.is_alive()
+    release.set()
+    agent._chain_thread.join(5)
+
+
+def test_a_timed_out_batch_is_one_failure(monkeypatch):
+    import asyncio
+    from llm_guard import LLMGuard
+
+    class SlowChain:
+        async def abatch(self, inputs, return_exceptions=False):
+            await asyncio.sleep(5)
+
+    guard = LLMGuard(lambda timeout: None, max_timeout=0.05, min_timeout=0.01, failure_threshold=5, cooldown=60)
+    monkeypatch.setattr(agent, "llm_guard", guard)
+    monkeypatch.setattr(agent, "response_chain", SlowChain())
+    monkeypatch.setattr(agent, "_polishing_enabled", lambda: True)
+
+    pairs = [(f"question {i}", f"result {i}") for i in range(8)]
+    answers = asyncio.run(agent._apolish_batch(pairs))
+    assert answers == [raw for _, raw in pairs]
+    assert guard.failures == 1 and guard.allow()
+    guard.stop()
+
+
+def test_async_paths_keep_answer_cache_io_off_the_event_loop(monkeypatch):
+    import asyncio
+
+    class SlowCache:
+        """Stands in for a SQLite file another worker has locked."""
+
+        def __init__(self):
+            self.threads = set()
+
+        def get(self, question, raw_result):
+            self.threads.add(threading.get_ident())
+            time.sleep(0.2)
+            return None
+
+        def put(self, question, raw_result, answer):
+            self.threads.add(threading.get_ident())
+            time.sleep(0.2)
+
+    class Chain:
+        async def ainvoke(self, inputs):
+            return f"Polished: {inputs['result']}"
+
+        async def abatch(self, inputs, return_exceptions=False):
+            return [f"Polished: {item['result']}" for item in inputs]
+
+    cache = SlowCache()
+    monkeypatch.setattr(agent, "answer_cache", cache)
+    monkeypatch.setattr(agent, "response_chain", Chain())
+    monkeypatch.setattr(agent, "_polishing_enabled", lambda: True)
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        beat = asyncio.create_task(ticker())
+        single = await agent._apolish("average fare", "The average fare is 32.20.")
+        batch = await agent._apolish_batch([("average age", "29.7"), ("average fare", "32.2")])
+        beat.cancel()
+        return single, batch, ticks, threading.get_ident()
+
+    single, batch, ticks, loop_thread = asyncio.run(main())
+    assert single == "Polished: The average fare is 32.20."
+    assert batch == ["Polished: 29.7", "Polished: 32.2"]
+    assert loop_thread not in cache.threads
+    assert ticks >= 20  # the loop kept running through ~0.8 s of cache waits
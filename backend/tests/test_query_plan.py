@@ -0,0 +1,62 @@
+import pytest
+
+import agent
+from query_plan import Plan, QueryPlanner
+
+
+@pytest.mark.parametrize("question, plan", [
+    ("average fare of women in 3rd class",
+     Plan("mean", "fare", (("class", "==", "Third"), ("sex", "==", "female")))),
+    ("how many passengers older than 60 survived",
+     Plan("count", filters=(("age", ">", 60.0), ("survived", "==", 1)))),
+    ("survival rate of children by class",
+     Plan("share", filters=(("who", "==", "child"),), condition=(("survived", "==", 1),), group_by="class")),
+    ("number of men travelling alone by port",
+     Plan("count", filters=(("alone", "==", True), ("sex", "==", "male")), group_by="embark_town")),
+    ("percentage of women who survived",
+     Plan("share", filters=(("sex", "==", "female"),), condition=(("survived", "==", 1),))),
+    ("median age on deck c", Plan("median", "age", (("deck", "==", "C"),))),
+    ("total fare paid in first class", Plan("sum", "fare", (("class", "==", "First"),))),
+    ("tell me a joke", None),
+])
+def test_question_shapes_plan(question, plan):
+    assert QueryPlanner().plan(question) == plan
+
+
+def test_questions_of_one_shape_share_a_template():
+    planner = QueryPlanner()
+    women = planner.plan("average fare of women in 3rd class")
+    men = planner.plan("Average fare of men in first class?")
+    assert (planner.hits, planner.misses, len(planner)) == (1, 1, 1)
+    assert men.filters == (("class", "==", "First"), ("sex", "==", "male")) and women != men
+    assert planner.plan("tell me a joke") is None and planner.plan("tell me a joke") is None
+    assert (planner.hits, planner.misses) == (2, 2)
+
+
+def test_cache_size_bounds_the_templates():
+    planner = QueryPlanner(cache_size=2)
+    for question in ("average fare of women", "median age of men", "how many survived by class"):
+        planner.plan(question)
+    assert len(planner) == 2
+
+
+@pytest.mark.parametrize("question, kind, handler", [
+    # A keyword rule matched and the plan neither filters nor groups: the intent keeps its chart.
+    ("survival rate", "intent", agent._survival_by_gender),
+    ("what was the survival rate", "intent", agent._survival_by_gender),
+    ("average fare", "intent", agent._avg_fare),
+    ("survival rate by class", "intent", agent._survival_by_class),
+    # A fuzzy guess gives way to the handler that answers the plan exactly.
+    ("how many passengers", "intent", agent._total_passengers),
+    # Filters or a group-by the matched handler would ignore go to the planner.
+    ("survival rate of children", "plan", None),
+    ("how many women survived", "plan", None),
+    ("average fare of women in 3rd class", "plan", None),
+])
+def test_plans_claim_only_questions_a_handler_would_answer_wrongly(question, kind, handler):
+    match = agent._plan_or_match(question)
+    assert match.kind == kind
+    if handler is not None:
+        assert match.handler is handler
+    else:
+        assert match.plan is not None
@@ -0,0 +1,11 @@
+import importlib, sys
+
+import streaming
+
+
+def test_imports_and_reports_without_the_resource_module(monkeypatch):
+    monkeypatch.setitem(sys.modules, "resource", None)  # as on Windows: importing it raises ImportError
+    reloaded = importlib.reload(streaming)
+    assert reloaded._peak_rss_mb() is None
+    monkeypatch.delitem(sys.modules, "resource")
+    assert importlib.reload(streaming)._peak_rss_mb() > 0
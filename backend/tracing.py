@@ -0,0 +1,104 @@
+"""Opt-in span tracing for a single request.
+
+``trace(name)`` starts a tree for the current context; ``span(name)`` opens a
+child of whatever span is active and does nothing when no trace is running,
+so the hooks can stay on the request path. Work handed to a thread pool keeps
+its place in the tree when the callable is wrapped with ``bind``. Durations
+measured elsewhere (e.g. inside a render worker process) are attached with
+``record``.
+
+A finished tree renders as nested JSON (``Span.to_dict``) or as folded stacks
+(``Span.folded``), one ``a;b;c <microseconds>`` line per path, which
+flamegraph.pl, speedscope and inferno read directly.
+"""
+import contextvars, os, re, time
+from contextlib import contextmanager
+
+_current = contextvars.ContextVar("trace_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "start", "seconds", "children")
+
+    def __init__(self, name, start=None, seconds=None):
+        self.name = name
+        self.start = time.perf_counter() if start is None else start
+        self.seconds = seconds
+        self.children = []
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.start
+
+    def to_dict(self, origin=None) -> dict:
+        origin = self.start if origin is None else origin
+        out = {"name": self.name, "start_ms": round((self.start - origin) * 1000, 3),
+               "ms": round((self.seconds or 0.0) * 1000, 3)}
+        if self.children:
+            out["children"] = [child.to_dict(origin) for child in self.children]
+        return out
+
+    def folded(self, prefix="") -> list:
+        """Folded-stack lines with each frame's self time in microseconds."""
+        path = f"{prefix};{self.name}" if prefix else self.name
+        own = (self.seconds or 0.0) - sum(child.seconds or 0.0 for child in self.children)
+        lines = [f"{path} {max(int(own * 1e6), 0)}"]
+        for child in self.children:
+            lines.extend(child.folded(path))
+        return lines
+
+
+@contextmanager
+def trace(name):
+    root = Span(name)
+    token = _current.set(root)
+    try:
+        yield root
+    finally:
+        root.finish()
+        _current.reset(token)
+
+
+@contextmanager
+def span(name):
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name)
+    parent.children.append(child)
+    token = _current.set(child)
+    try:
+        yield child
+    finally:
+        child.finish()
+        _current.reset(token)
+
+
+def record(name, seconds, parent=None, start=None):
+    """Attach an already-measured duration under ``parent`` (default: the active span).
+
+    ``start`` defaults to ``seconds`` before now, i.e. work that just ended.
+    """
+    parent = parent or _current.get()
+    if parent is not None:
+        start = time.perf_counter() - seconds if start is None else start
+        child = Span(name, start=start, seconds=seconds)
+        parent.children.append(child)
+        return child
+
+
+def bind(fn):
+    """``fn`` run inside a copy of the current context, so executor threads join the active trace."""
+    if _current.get() is None:
+        return fn
+    context = contextvars.copy_context()
+    return lambda *args: context.run(fn, *args)
+
+
+def dump_folded(root: Span, directory: str) -> str:
+    os.makedirs(directory, exist_ok=True)
+    label = re.sub(r"[^A-Za-z0-9_.-]+", "_", root.name).strip("_")[:40] or "request"
+    path = os.path.join(directory, f"{int(time.time() * 1000)}-{label}.folded")
+    with open(path, "w") as fh:
+        fh.write("\n".join(root.folded()) + "\n")
+    return path
@@ -1,17 +1,60 @@
 import streamlit as st
 import requests
-import base64
+import json
+import threading
+from collections import OrderedDict
 from datetime import datetime
 
-BACKEND = "https://titanic-backend-emeb.onrender.com/chat"
+BACKEND_ROOT = "https://titanic-backend-emeb.onrender.com"
+BACKEND = f"{BACKEND_ROOT}/chat"
+STREAM_ENDPOINT = f"{BACKEND}/stream"
+# "spec" asks the backend for chart data and draws it here; "image" gets a rendered PNG/WebP.
+CHART_MODE = "spec"
+# Answers kept locally with their ETags; asking again only costs a conditional GET.
+ANSWER_CACHE_SIZE = 128
+# The session keeps at most this many messages / serialized bytes, dropping the oldest first,
+# and draws only the newest HISTORY_PAGE messages until the user asks for earlier ones.
+HISTORY_MAX_MESSAGES = 200
+HISTORY_MAX_BYTES = 2_000_000
+HISTORY_PAGE = 20
 
 st.set_page_config(page_title="Titanic AI Chatbot", layout="centered", page_icon="🚢")
 
 # ── Theme state ──────────────────────────────────────────────────────
 if "dark_mode" not in st.session_state:
     st.session_state.dark_mode = True
-if "history" not in st.session_state:
+
+
+# ── Chat history ─────────────────────────────────────────────────────
+def reset_history():
     st.session_state.history = []
+    st.session_state.history_bytes = 0
+    st.session_state.history_dropped = 0
+    st.session_state.history_visible = HISTORY_PAGE
+
+
+if "history_visible" not in st.session_state:
+    reset_history()
+
+
+def add_message(msg):
+    """Append ``msg`` to the history, dropping the oldest messages past either cap."""
+    msg["bytes"] = len(json.dumps(msg, default=str))
+    history = st.session_state.history
+    history.append(msg)
+    st.session_state.history_bytes += msg["bytes"]
+    while len(history) > 1 and (len(history) > HISTORY_MAX_MESSAGES
+                                or st.session_state.history_bytes > HISTORY_MAX_BYTES):
+        st.session_state.history_bytes -= history.pop(0)["bytes"]
+        st.session_state.history_dropped += 1
+
+
+def ask(question):
+    add_message({"role": "user", "text": question, "time": datetime.now().strftime("%H:%M")})
+    st.session_state.history_visible = HISTORY_PAGE  # a new turn scrolls back to the tail
+    st.session_state.pending = question
+    st.rerun()
+
 
 dark = st.session_state.dark_mode
 
@@ -416,29 +459,174 @@ with st.sidebar:
     ]
     for ex in examples:
         if st.button(ex, key=f"ex_{ex}"):
-            st.session_state.history.append(
-                {"role": "user", "text": ex, "time": datetime.now().strftime("%H:%M")}
-            )
-            try:
-                resp = requests.post(BACKEND, json={"question": ex}, timeout=60)
-                data = resp.json()
-            except Exception as e:
-                data = {"answer": f"⚠ Cannot reach the backend. ({e})", "plot": None}
-            st.session_state.history.append(
-                {
-                    "role": "bot",
-                    "text": data["answer"],
-                    "plot": data.get("plot"),
-                    "time": datetime.now().strftime("%H:%M"),
-                }
-            )
-            st.rerun()
+            ask(ex)
 
     st.divider()
     if st.button("🗑️  Clear chat", key="clear"):
-        st.session_state.history = []
+        reset_history()
         st.rerun()
 
+# ── Streaming helpers ────────────────────────────────────────────────
+def bot_bubble(text, time):
+    bot_html = text.replace("\n", "<br>")
+    return f"""
+            <div class='msg-row'>
+                <div class='msg-avatar bot-av'>🚢</div>
+                <div>
+                    <div class='msg-bubble bot-msg'>{bot_html}</div>
+                    <div class='msg-meta'><span class='msg-time'>{time}</span></div>
+                </div>
+            </div>"""
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def fetch_plot(url):
+    """Chart bytes for a /plots/{hash} URL; the hash makes the URL safe to cache forever."""
+    resp = requests.get(f"{BACKEND_ROOT}{url}", headers={"Accept": "image/webp,image/png"}, timeout=30)
+    resp.raise_for_status()
+    return resp.content
+
+
+def vega_spec(chart):
+    """Translate a backend chart spec into a Vega-Lite spec."""
+    base = {"title": chart["title"], "height": 320}
+    x_title, y_title = chart["x_label"], chart["y_label"]
+    if chart["type"] == "bar":
+        rows = [{"label": l, "value": v, "color": c}
+                for l, v, c in zip(chart["labels"], chart["values"], chart["colors"])]
+        return {**base, "data": {"values": rows}, "mark": "bar", "encoding": {
+            "x": {"field": "label", "type": "nominal", "sort": None, "title": x_title, "axis": {"labelAngle": 0}},
+            "y": {"field": "value", "type": "quantitative", "title": y_title},
+            "color": {"field": "color", "type": "nominal", "scale": None},
+        }}
+    if chart["type"] == "histogram":
+        edges = chart["edges"]
+        bins = [{"start": a, "end": b, "count": c} for a, b, c in zip(edges[:-1], edges[1:], chart["counts"])]
+        layers = [{"data": {"values": bins}, "mark": {"type": "bar", "color": chart["color"], "opacity": 0.6}, "encoding": {
+            "x": {"field": "start", "type": "quantitative", "bin": "binned", "title": x_title},
+            "x2": {"field": "end"},
+            "y": {"field": "count", "type": "quantitative", "title": y_title},
+        }}]
+        if chart.get("kde"):
+            kde = [{"x": x, "y": y} for x, y in zip(chart["kde"]["x"], chart["kde"]["y"])]
+            layers.append({"data": {"values": kde}, "mark": {"type": "line", "color": chart["color"]}, "encoding": {
+                "x": {"field": "x", "type": "quantitative"}, "y": {"field": "y", "type": "quantitative"},
+            }})
+        return {**base, "layer": layers}
+    boxes = [{**box, "color": color} for box, color in zip(chart["boxes"], chart["colors"])]
+    fliers = [{"label": box["label"], "value": v} for box in chart["boxes"] for v in box["fliers"]]
+    x = {"field": "label", "type": "nominal", "sort": None, "title": x_title, "axis": {"labelAngle": 0}}
+    return {**base, "layer": [
+        {"data": {"values": boxes}, "mark": "rule", "encoding": {
+            "x": x, "y": {"field": "whislo", "type": "quantitative", "title": y_title}, "y2": {"field": "whishi"}}},
+        {"data": {"values": boxes}, "mark": {"type": "bar", "size": 40}, "encoding": {
+            "x": x, "y": {"field": "q1", "type": "quantitative"}, "y2": {"field": "q3"},
+            "color": {"field": "color", "type": "nominal", "scale": None}}},
+        {"data": {"values": boxes}, "mark": {"type": "tick", "color": "#333", "size": 40}, "encoding": {
+            "x": x, "y": {"field": "med", "type": "quantitative"}}},
+        {"data": {"values": fliers}, "mark": {"type": "point", "size": 12, "color": "#555"}, "encoding": {
+            "x": x, "y": {"field": "value", "type": "quantitative"}}},
+    ]}
+
+
+def sse_events(resp):
+    """Parse a text/event-stream response into (event, payload) pairs."""
+    event, data = "message", []
+    for line in resp.iter_lines(decode_unicode=True):
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+
+
+@st.cache_resource
+def answer_cache():
+    """(question, mode) -> {"etag", "message"}, shared by every session of this frontend,
+    plus the lock its users hold: each session runs on its own thread."""
+    return OrderedDict(), threading.Lock()
+
+
+def _answer_key(question):
+    # Same normalization as the backend's ETag, so equal keys mean equal ETags.
+    return " ".join(question.lower().split()).rstrip("?!. "), CHART_MODE
+
+
+def remember_answer(question, etag, message):
+    (cache, lock), key = answer_cache(), _answer_key(question)
+    with lock:
+        cache[key] = {"etag": etag, "message": message}
+        cache.move_to_end(key)
+        while len(cache) > ANSWER_CACHE_SIZE:
+            cache.popitem(last=False)
+
+
+def cached_answer(question):
+    """A locally cached answer revalidated with If-None-Match; None if there is none.
+
+    A 304 reuses the cached message, a 200 replaces it. If the backend cannot
+    be reached the cached message is shown as is.
+    """
+    cache, lock = answer_cache()
+    with lock:
+        entry = cache.get(_answer_key(question))
+    if entry is None:
+        return None
+    time = datetime.now().strftime("%H:%M")
+    try:
+        resp = requests.get(BACKEND, params={"question": question, "mode": CHART_MODE},
+                            headers={"If-None-Match": entry["etag"]}, timeout=60)
+    except Exception:
+        return {**entry["message"], "role": "bot", "time": time}
+    if resp.status_code == 304:
+        return {**entry["message"], "role": "bot", "time": time}
+    if resp.status_code != 200:
+        return None
+    body = resp.json()
+    message = {"text": body["answer"], "plot": body.get("plot_url"), "chart": body.get("chart")}
+    remember_answer(question, resp.headers.get("ETag"), message)
+    return {**message, "role": "bot", "time": time}
+
+
+def stream_answer(question):
+    """Show the answer as it streams in and return the finished bot message."""
+    placeholder = st.empty()
+    time = datetime.now().strftime("%H:%M")
+    placeholder.markdown(bot_bubble("Analyzing…", time), unsafe_allow_html=True)
+    text, polished, plot, chart = "", "", None, None
+    try:
+        body = {"question": question, "mode": CHART_MODE}
+        with requests.post(STREAM_ENDPOINT, json=body, stream=True, timeout=60) as resp:
+            if resp.status_code != 200:
+                return {"role": "bot", "text": f"Backend error: {resp.text}", "plot": None, "time": time}
+            etag = resp.headers.get("ETag")
+            resp.encoding = "utf-8"
+            for event, payload in sse_events(resp):
+                if event == "raw":
+                    text = payload["text"]
+                elif event == "token":
+                    polished += payload["text"]
+                    text = polished
+                elif event == "answer":
+                    text = payload["text"]
+                elif event == "plot":
+                    plot = payload["url"]
+                elif event == "chart":
+                    chart = payload
+                elif event == "done":
+                    break
+                placeholder.markdown(bot_bubble(text, time), unsafe_allow_html=True)
+    except Exception as e:
+        text = f"⚠ Cannot reach the backend. ({e})"
+    else:
+        if etag:
+            remember_answer(question, etag, {"text": text, "plot": plot, "chart": chart})
+    return {"role": "bot", "text": text, "plot": plot, "chart": chart, "time": time}
+
+
 # ── Main chat area ───────────────────────────────────────────────────
 st.markdown("<div style='max-width:780px;margin:0 auto;'>", unsafe_allow_html=True)
 st.markdown(
@@ -455,6 +643,30 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
+def render_message(msg):
+    if msg["role"] == "user":
+        st.markdown(
+            f"""
+        <div class='msg-row user'>
+            <div class='msg-avatar user-av'>U</div>
+            <div>
+                <div class='msg-bubble user-msg'>{msg["text"]}</div>
+                <div class='msg-meta'><span class='msg-time'>{msg["time"]}</span></div>
+            </div>
+        </div>""",
+            unsafe_allow_html=True,
+        )
+        return
+    st.markdown(bot_bubble(msg["text"], msg["time"]), unsafe_allow_html=True)
+    if msg.get("chart"):
+        st.vega_lite_chart(vega_spec(msg["chart"]), width="stretch")
+    elif msg.get("plot"):
+        try:
+            st.image(fetch_plot(msg["plot"]), width="stretch")  # cached by the URL's content hash
+        except Exception:
+            pass
+
+
 if not st.session_state.history:
     st.markdown(
         f"""
@@ -467,63 +679,28 @@ if not st.session_state.history:
         unsafe_allow_html=True,
     )
 else:
-    for msg in st.session_state.history:
-        if msg["role"] == "user":
-            st.markdown(
-                f"""
-            <div class='msg-row user'>
-                <div class='msg-avatar user-av'>U</div>
-                <div>
-                    <div class='msg-bubble user-msg'>{msg["text"]}</div>
-                    <div class='msg-meta'><span class='msg-time'>{msg["time"]}</span></div>
-                </div>
-            </div>""",
-                unsafe_allow_html=True,
-            )
-        else:
-            bot_html = msg["text"].replace("\n", "<br>")
-            st.markdown(
-                f"""
-            <div class='msg-row'>
-                <div class='msg-avatar bot-av'>🚢</div>
-                <div>
-                    <div class='msg-bubble bot-msg'>{bot_html}</div>
-                    <div class='msg-meta'><span class='msg-time'>{msg["time"]}</span></div>
-                </div>
-            </div>""",
-                unsafe_allow_html=True,
-            )
-            if msg.get("plot"):
-                try:
-                    img_bytes = base64.b64decode(msg["plot"])
-                    st.image(img_bytes, width="stretch")
-                except Exception:
-                    pass
+    # Only the tail is drawn, so a rerun costs the same however long the session gets.
+    history = st.session_state.history
+    visible = history[-st.session_state.history_visible:]
+    hidden = len(history) - len(visible)
+    if st.session_state.history_dropped:
+        st.caption(f"{st.session_state.history_dropped} older messages were removed to keep this session light.")
+    if hidden and st.button(f"Show {min(hidden, HISTORY_PAGE)} earlier messages ({hidden} hidden)", key="history_more"):
+        st.session_state.history_visible += HISTORY_PAGE
+        st.rerun()
+    for msg in visible:
+        render_message(msg)
+
+pending = st.session_state.pop("pending", None)
+if pending:
+    add_message(cached_answer(pending) or stream_answer(pending))
 
 st.markdown("</div></div>", unsafe_allow_html=True)
 
+if pending:
+    st.rerun()
+
 user_text = st.chat_input("Ask about the Titanic dataset…")
 
 if user_text:
-    st.session_state.history.append(
-        {"role": "user", "text": user_text, "time": datetime.now().strftime("%H:%M")}
-    )
-    try:
-        with st.spinner("Analyzing…"):
-            resp = requests.post(BACKEND, json={"question": user_text}, timeout=60)
-            if resp.status_code != 200:
-                data = {"answer": f"Backend error: {resp.text}", "plot": None}
-            else:
-                data = resp.json()
-    except Exception as e:
-        data = {"answer": f"⚠ Cannot reach the backend. ({e})", "plot": None}
-
-    st.session_state.history.append(
-        {
-            "role": "bot",
-            "text": data["answer"],
-            "plot": data.get("plot"),
-            "time": datetime.now().strftime("%H:%M"),
-        }
-    )
-    st.rerun()
+    ask(user_text)